@@ -0,0 +1,96 @@
+# async_db.py
+# Async-вариант работы с БД (включается DB_ASYNC=1).
+# SQLite -> aiosqlite, PostgreSQL -> asyncpg; адрес берётся из того же DATABASE_URL.
+# Здесь только пользователи и сессии: расписание обработчики читают из ScheduleIndex в памяти.
+import uuid
+from sqlalchemy import select, delete, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from init_db import DATABASE_URL, SQL_ECHO, DEFAULT_TENANT, pool_options, User, UserSession
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def to_async_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет async-драйвера для {backend}")
+    return u.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    """Движок создаётся при первом обращении: без DB_ASYNC=1 драйвер не нужен."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        url = to_async_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, echo=SQL_ECHO, **pool_options(url))
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+
+async def dispose_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _AsyncSessionLocal = None
+
+
+# ===================== Пользователи и сессии =====================
+async def get_user_by_telegram(telegram_id: int):
+    """Вернуть User по telegram_id (через таблицу user_sessions) одним запросом."""
+    async with AsyncSessionLocal() as s:
+        result = await s.execute(
+            select(User)
+            .join(UserSession, UserSession.user_id == User.id)
+            .where(UserSession.telegram_id == str(telegram_id))
+            .limit(1)
+        )
+        return result.scalars().first()
+
+
+async def create_user_session(user_id: str, telegram_id: int, tenant_id: str = DEFAULT_TENANT):
+    """Создаёт/обновляет сессию: один telegram_id => одна сессия.
+       Возвращает True/False."""
+    async with AsyncSessionLocal() as s:
+        try:
+            await s.execute(delete(UserSession).where(UserSession.telegram_id == str(telegram_id)))
+            s.add(UserSession(id=str(uuid.uuid4()), tenant_id=tenant_id, user_id=user_id,
+                              telegram_id=str(telegram_id)))
+            await s.commit()
+            return True
+        except Exception:
+            await s.rollback()
+            return False
+
+
+async def clear_user_session(telegram_id: int):
+    """Удаляет сессию по telegram_id. Возвращает True, если удалил."""
+    async with AsyncSessionLocal() as s:
+        result = await s.execute(delete(UserSession).where(UserSession.telegram_id == str(telegram_id)))
+        await s.commit()
+        return bool(result.rowcount)
+
+
+async def get_user_by_login(login: str):
+    async with AsyncSessionLocal() as s:
+        result = await s.execute(select(User).where(User.login == login).limit(1))
+        return result.scalars().first()
+
+
+async def update_password_hash(user_id: str, password_hash: str):
+    async with AsyncSessionLocal() as s:
+        await s.execute(update(User).where(User.id == user_id).values(password_hash=password_hash))
+        await s.commit()
+
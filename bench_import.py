@@ -0,0 +1,139 @@
+# bench_import.py
+# Сравнение старого импорта (df.iterrows() + ORM-объект на строку) и пакетного
+# импорта из schedule_import.py на синтетическом листе. Запускается на временной
+# SQLite-базе, рабочую БД не трогает:
+#   python bench_import.py [число_строк]
+import os
+import sys
+import time
+import random
+import tempfile
+import datetime as _dt
+from collections import Counter
+
+_tmpdir = tempfile.mkdtemp(prefix="schedule_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import uuid
+import pandas as pd
+from init_db import Base, engine, SessionLocal, User, Schedule
+from schedule_import import to_time, normalize_class_name, replace_schedule
+
+engine.echo = False
+
+WEEKDAYS = ["ПН", "ВТ", "СР", "ЧТ", "ПТ"]
+TEACHERS = [f"Учитель {i}" for i in range(60)]
+
+
+def make_users():
+    s = SessionLocal()
+    for i, name in enumerate(TEACHERS):
+        s.add(User(login=f"t{i}", password_hash="-", role="teacher", name_tuter=name,
+                   is_junior=i % 2 == 0, is_senior=i % 2 == 1))
+    s.commit()
+    s.close()
+
+
+def make_sheet(n_rows, seed=1):
+    """Синтетический лист: разные типы в ячейках, как их отдаёт pd.read_excel."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        h = rnd.randint(8, 16)
+        start = _dt.time(h, rnd.choice([0, 15, 30, 45]))
+        rows.append({
+            "Time start": start if i % 3 else start.strftime("%H:%M"),
+            "Time end": _dt.time(h + 1, start.minute) if i % 7 else None,
+            "Cabinet": rnd.choice([101, 102.0, "Спортзал", None]),
+            "Teacher": rnd.choice(TEACHERS + ["Нет такого", None] + ["все"] * (i % 500 == 0)),
+            "Class name": rnd.choice([5, 6.0, "7А", "8 Б", "9,0"]),
+            "Weekday": rnd.choice(WEEKDAYS),
+            "Subject": rnd.choice(["Математика", "Физика", " История ", 11]),
+        })
+    df = pd.DataFrame(rows)
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    return df
+
+
+def legacy_import(s, df):
+    """Прежний цикл из handle_document — эталон для сравнения."""
+    s.query(Schedule).delete()
+    s.commit()
+    for _, row in df.iterrows():
+        ts = to_time(row.get('time_start'))
+        te = to_time(row.get('time_end')) if 'time_end' in df.columns else None
+        class_name_normalized = normalize_class_name(row.get('class_name'))
+        teacher_value = row.get('teacher')
+        teacher_value = None if pd.isna(teacher_value) else str(teacher_value).strip()
+        teachers = []
+        if teacher_value:
+            tv = teacher_value.lower()
+            if tv == "все":
+                teachers = s.query(User).filter(User.role == 'teacher').all()
+            elif tv == "младшая школа":
+                teachers = s.query(User).filter(User.role == 'teacher', User.is_junior == True).all()
+            elif tv == "старшая школа":
+                teachers = s.query(User).filter(User.role == 'teacher', User.is_senior == True).all()
+            else:
+                t = s.query(User).filter(User.role == 'teacher', User.name_tuter == teacher_value).first()
+                teachers = [t] if t else []
+        for t in (teachers or [None]):
+            s.add(Schedule(
+                id=str(uuid.uuid4()),
+                time_start=ts.hour * 60 + ts.minute if ts else None,
+                time_end=te.hour * 60 + te.minute if te else None,
+                cabinet=None if pd.isna(row.get('cabinet')) else str(row.get('cabinet')).strip(),
+                teacher=t.name_tuter if t else None,
+                class_name=class_name_normalized,
+                weekday=str(row.get('weekday')).strip() if not pd.isna(row.get('weekday')) else None,
+                subject=str(row.get('subject')).strip() if not pd.isna(row.get('subject')) else None
+            ))
+    s.commit()
+
+
+def new_import(s, df):
+    replace_schedule(s, df)
+    s.commit()
+
+
+def stored_rows():
+    s = SessionLocal()
+    try:
+        rows = s.query(Schedule.time_start, Schedule.time_end, Schedule.cabinet, Schedule.teacher,
+                       Schedule.class_name, Schedule.weekday, Schedule.subject).all()
+        return Counter(tuple(r) for r in rows)
+    finally:
+        s.close()
+
+
+def timed(func, df):
+    s = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        func(s, df)
+        return time.perf_counter() - t0
+    finally:
+        s.close()
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    Base.metadata.create_all(bind=engine)
+    make_users()
+    df = make_sheet(n_rows)
+
+    legacy_s = timed(legacy_import, df)
+    legacy_rows = stored_rows()
+    new_s = timed(new_import, df)
+    new_rows = stored_rows()
+
+    print(f"Строк в листе: {n_rows}, записей в schedules: {sum(new_rows.values())}")
+    print(f"iterrows + ORM:   {legacy_s:.2f} с")
+    print(f"пакетный импорт:  {new_s:.2f} с")
+    print(f"ускорение:        x{legacy_s / new_s:.1f}")
+    print("Строки совпадают" if legacy_rows == new_rows else "ОШИБКА: строки отличаются")
+    return 0 if legacy_rows == new_rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
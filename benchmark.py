@@ -0,0 +1,186 @@
+# benchmark.py
+# Бенчмарк горячих путей бота на синтетической школе и временной SQLite-базе.
+# Результаты — JSON, чтобы сравнивать прогоны между собой:
+#   python benchmark.py --out bench.json
+#   python benchmark.py --compare bench.json      # код выхода 1 при регрессии
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+
+_tmpdir = tempfile.mkdtemp(prefix="schedule_benchmark_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import pandas as pd
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+import main
+from init_db import Base, engine
+from fakes import FakeRequest, message_update, seed_school, school_names, school_sheet, WEEKDAYS
+
+engine.echo = False
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(50) * 1000,
+        "p95_ms": pct(95) * 1000,
+        "p99_ms": pct(99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "ops_per_s": len(ordered) / total if total else None,
+    }
+
+
+def measure(func, iterations):
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+async def measure_async(func, iterations):
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        await func(i)
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def bench_lookups(classes, teachers, teacher_ids, student_ids, iterations):
+    rnd = random.Random(1)
+    all_ids = teacher_ids + student_ids
+    rows = main.get_schedule_for_class(classes[0], "ПН")
+    date_obj = pd.Timestamp("2025-09-01").date()
+    return {
+        "get_user_by_telegram": measure(lambda i: main.get_user_by_telegram(rnd.choice(all_ids)), iterations),
+        "get_schedule_for_class": measure(
+            lambda i: main.get_schedule_for_class(rnd.choice(classes), rnd.choice(WEEKDAYS)), iterations),
+        "get_schedule_for_teacher": measure(
+            lambda i: main.get_schedule_for_teacher(rnd.choice(teachers), rnd.choice(WEEKDAYS)), iterations),
+        "format_schedule_with_header": measure(
+            lambda i: main.format_schedule_with_header(rows, "student", date_obj), iterations),
+    }
+
+
+async def bench_menu(teacher_ids, student_ids, iterations):
+    """Полный путь: Update -> обработчики из main.add_handlers -> FakeRequest."""
+    rnd = random.Random(2)
+    request = FakeRequest()
+    app = ApplicationBuilder().token("1:bench").request(request).get_updates_request(FakeRequest()).build()
+    main.add_handlers(app)
+    all_ids = teacher_ids + student_ids
+    buttons = ["На сегодня", "На завтра", "ПН", "ВТ", "СР", "ЧТ", "ПТ"]
+
+    async def press(text):
+        update = Update.de_json(message_update(rnd.choice(all_ids), text), app.bot)
+        await app.process_update(update)
+
+    async with app:
+        return {
+            "handle_menu_choice_day": await measure_async(lambda i: press(rnd.choice(buttons)), iterations),
+            "handle_menu_choice_week": await measure_async(lambda i: press("На неделю"), max(iterations // 5, 10)),
+        }
+
+
+def bench_import(sizes):
+    """import_schedule_file на файлах разного размера (строк листа)."""
+    results = {}
+    for size in sizes:
+        n_classes = max(1, size // 30)
+        rows = school_sheet(n_classes, max(5, n_classes))[:size]
+        path = os.path.join(_tmpdir, f"import_{size}.xlsx")
+        pd.DataFrame(rows).to_excel(path, index=False)
+        samples = []
+        for _ in range(2):
+            t0 = time.perf_counter()
+            main.import_schedule_file(path)
+            samples.append(time.perf_counter() - t0)
+        results[str(size)] = {"rows": len(rows), "seconds": min(samples), "rows_per_s": len(rows) / min(samples)}
+    return results
+
+
+def run(args):
+    Base.metadata.create_all(bind=engine)
+    teacher_ids, student_ids = seed_school(args.classes, args.teachers)
+    classes, teachers = school_names(args.classes, args.teachers)
+    main.load_schedule()
+
+    results = {
+        "meta": {
+            "classes": args.classes,
+            "teachers": args.teachers,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "lookups": bench_lookups(classes, teachers, teacher_ids, student_ids, args.iterations),
+        "handlers": asyncio.run(bench_menu(teacher_ids, student_ids, args.iterations)),
+    }
+    if args.import_sizes:
+        results["import"] = bench_import(args.import_sizes)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Список регрессий: p95 (или время импорта) выросло больше чем на threshold."""
+    regressions = []
+    for group in ("lookups", "handlers"):
+        for name, cur in current.get(group, {}).items():
+            base = baseline.get(group, {}).get(name)
+            if base and base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + threshold):
+                regressions.append(f"{group}.{name}: p95 {base['p95_ms']:.3f} -> {cur['p95_ms']:.3f} мс")
+    for size, cur in current.get("import", {}).items():
+        base = baseline.get("import", {}).get(size)
+        if base and cur["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append(f"import.{size}: {base['seconds']:.2f} -> {cur['seconds']:.2f} с")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих путей schedule_bot")
+    parser.add_argument("--classes", type=int, default=40)
+    parser.add_argument("--teachers", type=int, default=60)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--import-sizes", type=int, nargs="*", default=[1000, 10000, 50000])
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый рост, доля (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for r in regressions:
+            print("РЕГРЕССИЯ", r, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,85 @@
+# blocking.py
+# Синхронные вызовы (SQLAlchemy, bcrypt, pandas) из async-обработчиков
+# выполняются в ограниченных пулах потоков, чтобы не останавливать event loop.
+import os
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# bcrypt отпускает GIL, поэтому отдельного пула потоков достаточно; он меньше
+# DB-пула, чтобы поток логинов не мог занять все ядра
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", "2"))
+
+
+class BlockingPool:
+    """Пул потоков фиксированного размера со счётчиками очереди."""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.queued = 0        # ждут свободного потока
+        self.running = 0       # выполняются сейчас
+        self.completed = 0
+        self.max_queued = 0
+
+    def _call(self, func):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        # contextvars переносятся в поток (как в asyncio.to_thread) — по ним
+        # metrics.py относит SQL-запросы к обрабатываемому update
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, self._call, functools.partial(ctx.run, func, *args, **kwargs)
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "max_queued": self.max_queued,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+db_pool = BlockingPool("db", DB_POOL_SIZE)
+hash_pool = BlockingPool("hash", HASH_POOL_SIZE)
+
+
+async def run_db(func, *args, **kwargs):
+    """Запросы к БД и разбор файлов расписания."""
+    return await db_pool.run(func, *args, **kwargs)
+
+
+async def run_hash(func, *args, **kwargs):
+    """Проверка и вычисление хешей паролей."""
+    return await hash_pool.run(func, *args, **kwargs)
+
+
+def blocking_stats():
+    return {p.name: p.stats() for p in (db_pool, hash_pool)}
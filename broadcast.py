@@ -0,0 +1,165 @@
+# broadcast.py
+# Утренняя рассылка расписания всем привязанным пользователям через очередь отправки
+# с учётом лимитов Telegram (~30 сообщений/с на бота, ~1/с в один чат).
+import os
+import time
+import asyncio
+from collections import defaultdict, namedtuple
+from dotenv import load_dotenv
+from telegram.error import RetryAfter, TelegramError
+
+from init_db import SessionLocal, User, UserSession
+
+load_dotenv()
+
+# "07:30" — включает ежедневную рассылку по будням; не задано — рассылки нет
+DAILY_BROADCAST_TIME = os.getenv("DAILY_BROADCAST_TIME")
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))          # сообщений в секунду на бота
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1"))  # секунд между сообщениями в чат
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+Recipient = namedtuple("Recipient", ["telegram_id", "tenant_id", "role", "name_tuter"])
+BroadcastReport = namedtuple(
+    "BroadcastReport",
+    ["recipients", "unique_texts", "sent", "failed", "retries", "elapsed", "throughput"],
+)
+
+
+def load_recipients(tenant=None):
+    """Все привязанные telegram_id учителей и учеников (всех школ или одной) одним запросом,
+       кроме отключивших рассылку."""
+    s = SessionLocal()
+    try:
+        q = (
+            s.query(UserSession.telegram_id, User.tenant_id, User.role, User.name_tuter)
+            .join(User, User.id == UserSession.user_id)
+            .filter(User.role.in_(("teacher", "student")), UserSession.daily_broadcast == True)
+        )
+        if tenant is not None:
+            q = q.filter(User.tenant_id == tenant)
+        rows = q.all()
+        return [Recipient(*r) for r in rows]
+    finally:
+        s.close()
+
+
+def group_by_text(recipients, render):
+    """{текст: [chat_id, ...]} — одинаковые сообщения (один класс/учитель школы) отрисовываются один раз.
+       render вернул None — этим получателям ничего не отправляется (например, праздник в школе)."""
+    texts = {}
+    groups = defaultdict(list)
+    for r in recipients:
+        key = (r.tenant_id, r.role, r.name_tuter)
+        if key not in texts:
+            texts[key] = render(r.tenant_id, r.role, r.name_tuter)
+        if texts[key] is not None:
+            groups[texts[key]].append(r.telegram_id)
+    return dict(groups)
+
+
+class RateLimiter:
+    """Общий лимит сообщений в секунду + минимальный интервал для одного чата.
+       После flood-wait (RetryAfter) пауза действует на все отправки."""
+
+    def __init__(self, rate=BROADCAST_RATE, chat_interval=BROADCAST_CHAT_INTERVAL):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.chat_interval = chat_interval
+        self._next_slot = 0.0
+        self._chat_next = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id):
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._chat_next.get(chat_id, 0.0))
+            self._next_slot = start + self.interval
+            self._chat_next[chat_id] = start + self.chat_interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class SendQueue:
+    """Очередь отправки: несколько воркеров забирают (chat_id, text) и шлют через bot."""
+
+    def __init__(self, bot, limiter=None, workers=BROADCAST_WORKERS, max_retries=BROADCAST_MAX_RETRIES,
+                 parse_mode="HTML"):
+        self.bot = bot
+        self.limiter = limiter or RateLimiter()
+        self.workers = workers
+        self.max_retries = max_retries
+        self.parse_mode = parse_mode
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def _send(self, chat_id, text):
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=self.parse_mode)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    break
+                self.retries += 1
+                self.limiter.pause(e.retry_after)
+            except TelegramError:
+                break  # бот заблокирован, чат не найден и т.п. — повтор не поможет
+        self.failed += 1
+
+    async def _worker(self, queue):
+        while True:
+            item = await queue.get()
+            try:
+                await self._send(*item)
+            except Exception as e:
+                # любая другая ошибка — сообщение потеряно, но воркер живёт: иначе queue.join() не дождётся
+                self.failed += 1
+                print(f"Рассылка: ошибка отправки в {item[0]}: {e!r}")
+            finally:
+                queue.task_done()
+
+    async def run(self, groups):
+        queue = asyncio.Queue()
+        for text, chat_ids in groups.items():
+            for chat_id in chat_ids:
+                queue.put_nowait((chat_id, text))
+        tasks = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        try:
+            await queue.join()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def broadcast(bot, recipients, render, send_queue=None):
+    """Рассылает render(tenant_id, role, name_tuter) каждому получателю. Возвращает BroadcastReport."""
+    started = time.monotonic()
+    groups = group_by_text(recipients, render)
+    send_queue = send_queue or SendQueue(bot)
+    await send_queue.run(groups)
+    elapsed = time.monotonic() - started
+    return BroadcastReport(
+        recipients=len(recipients),
+        unique_texts=len(groups),
+        sent=send_queue.sent,
+        failed=send_queue.failed,
+        retries=send_queue.retries,
+        elapsed=elapsed,
+        throughput=send_queue.sent / elapsed if elapsed > 0 else 0.0,
+    )
+
+
+def format_report(report):
+    return (
+        f"Рассылка: получателей {report.recipients}, разных текстов {report.unique_texts}, "
+        f"отправлено {report.sent}, ошибок {report.failed}, повторов {report.retries}, "
+        f"за {report.elapsed:.1f} с ({report.throughput:.1f} сообщ./с)"
+    )
@@ -0,0 +1,76 @@
+# check_startup.py
+# Бюджет времени старта: `import main` + build_app() в свежем интерпретаторе.
+# Заодно проверяет, что импорт не тянет pandas/openpyxl и ничего не создаёт на диске.
+#   python check_startup.py                  # код выхода 1, если бюджет превышен
+#   STARTUP_BUDGET_MS=800 python check_startup.py --runs 10
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+# эти модули нужны только при загрузке расписания
+LAZY_MODULES = ("pandas", "numpy", "openpyxl", "schedule_import")
+
+PROBE = """
+import os, sys, json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+app = main.build_app("1:startup-check")
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "build_ms": (t2 - t1) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+    "uploads_created": os.path.isdir(main.UPLOADS_DIR),
+}))
+"""
+
+
+def probe():
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE % (LAZY_MODULES,)],
+        cwd=here, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check_startup(runs=5, budget_ms=STARTUP_BUDGET_MS):
+    """Возвращает True, если медиана import+build укладывается в budget_ms и импорт без побочных эффектов."""
+    uploads_existed = os.path.isdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+    results = [probe() for _ in range(runs)]
+    total = statistics.median(r["import_ms"] + r["build_ms"] for r in results)
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    build_ms = statistics.median(r["build_ms"] for r in results)
+
+    ok = True
+    fits = total <= budget_ms
+    print(("OK   " if fits else "FAIL ") + f"старт {total:.0f} мс (import {import_ms:.0f} + build_app {build_ms:.0f}), "
+          f"бюджет {budget_ms:.0f} мс, медиана из {runs}")
+    ok = ok and fits
+
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    print(("OK   " if not loaded else "FAIL ") + "ленивые модули: " + (", ".join(loaded) or "не загружены"))
+    ok = ok and not loaded
+
+    if not uploads_existed:
+        created = any(r["uploads_created"] for r in results)
+        print(("OK   " if not created else "FAIL ") + "import main не создаёт uploads/")
+        ok = ok and not created
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка времени старта бота")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+    sys.exit(0 if check_startup(args.runs, args.budget_ms) else 1)
@@ -1,65 +1,31 @@
+# create_schedule.py
+# Загрузка расписания из файла без бота: тот же разбор, проверка накладок и запись,
+# что и при отправке файла администратором (время хранится в минутах от полуночи).
+#   python create_schedule.py                               # uploads/schedule.xlsx
+#   python create_schedule.py path/to/schedule.csv --tenant school2 --reject-conflicts
 import os
-import pandas as pd
-from sqlalchemy import create_engine, Column, String, Time
-from sqlalchemy.orm import sessionmaker, declarative_base
-import datetime
-import uuid
+import argparse
 
-# --- Настройка базы данных ---
-Base = declarative_base()
-DB_FILE = "schedule.db"
-engine = create_engine(f"sqlite:///{DB_FILE}", echo=True)
-Session = sessionmaker(bind=engine)
-session = Session()
+from init_db import DEFAULT_TENANT
 
-# --- Модель таблицы ---
-class Schedule(Base):
-    __tablename__ = 'schedules'
-    id = Column(String, primary_key=True)
-    time_start = Column(Time)
-    time_end = Column(Time)
-    cabinet = Column(String)
-    teacher = Column(String)
-    class_name = Column(String)
-    weekday = Column(String)
-    subject = Column(String)
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "schedule.xlsx")
 
-# --- Создание таблицы если нет ---
-Base.metadata.create_all(engine)
 
-# --- Очистка таблицы ---
-def clear_table():
-    session.query(Schedule).delete()
-    session.commit()
-    print("Таблица schedules очищена")
-
-# --- Путь к файлу Excel ---
-file_path = os.path.join(os.path.dirname(__file__), "uploads", "schedule.xlsx")
-
-# --- Загрузка расписания ---
-def upload_schedule(file_path):
-    df = pd.read_excel(file_path)
-
-    # Преобразуем только если не datetime.time
-    df['time_start'] = df['time_start'].apply(lambda x: x if isinstance(x, datetime.time) else pd.to_datetime(x).time())
-    df['time_end'] = df['time_end'].apply(lambda x: x if isinstance(x, datetime.time) else pd.to_datetime(x).time())
-
-    for _, row in df.iterrows():
-        schedule = Schedule(
-        id=str(uuid.uuid4()),  # генерируем уникальный id
-        time_start=row['time_start'],
-        time_end=row['time_end'],
-        cabinet=row['cabinet'],
-        teacher=row['teacher'],
-        class_name=row['class_name'],
-        weekday=row['weekday'],
-        subject=row['subject']
-    )
-        session.add(schedule)
-    session.commit()
-    print("Расписание загружено")
-
-# --- Основной запуск ---
 if __name__ == "__main__":
-    clear_table()
-    upload_schedule(file_path)
+    parser = argparse.ArgumentParser(description="Загрузка расписания из .xlsx/.csv")
+    parser.add_argument("path", nargs="?", default=DEFAULT_FILE)
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--reject-conflicts", action="store_true",
+                        help="не загружать, если в расписании есть накладки")
+    args = parser.parse_args()
+
+    from main import import_schedule_file
+    from schedule_import import format_import_result
+    from schedule_conflicts import ScheduleConflictError
+
+    try:
+        result = import_schedule_file(args.path, tenant=args.tenant,
+                                      on_conflict="reject" if args.reject_conflicts else "warn")
+    except ScheduleConflictError as e:
+        raise SystemExit(str(e))
+    print(format_import_result(result))
@@ -1,6 +1,7 @@
 # create_user_universal.py
-from init_db import SessionLocal, User
-from passlib.hash import bcrypt
+import re
+from init_db import SessionLocal, User, DEFAULT_TENANT
+from passwords import hash_password
 
 # --- Подключаемся к базе ---
 session = SessionLocal()
@@ -15,13 +16,18 @@ if user_type not in ("admin", "teacher", "student"):
 login = input("Логин: ").strip()
 password = input("Пароль: ").strip()
 role = user_type
+tenant_id = input(f"Школа (tenant_id) [{DEFAULT_TENANT}]: ").strip() or DEFAULT_TENANT
+if not re.fullmatch(r"[\w-]+", tenant_id):
+    print("tenant_id: только буквы, цифры, _ и -")
+    exit()
 
 # --- Создаём объект пользователя в зависимости от роли ---
 if user_type == "student":
     name_tuter = input("Имя пользователя: ").strip()
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role=role,
         name_tuter=name_tuter
     )
@@ -30,8 +36,9 @@ elif user_type == "teacher":
     is_junior = int(input("is_junior (0/1): ").strip())
     is_senior = int(input("is_senior (0/1): ").strip())
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role=role,
         name_tuter=name_tuter,
         is_junior=is_junior,
@@ -39,8 +46,9 @@ elif user_type == "teacher":
     )
 else:  # admin
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role=role
     )
 
@@ -1,5 +1,6 @@
-from init_db import SessionLocal, User
-from passlib.hash import bcrypt
+import re
+from init_db import SessionLocal, User, DEFAULT_TENANT
+from passwords import hash_password
 from sqlalchemy.exc import IntegrityError
 
 session = SessionLocal()
@@ -12,12 +13,17 @@ if user_type not in ("admin", "teacher", "student"):
 login = input("Логин: ").strip()
 password = input("Пароль: ").strip()
 role = user_type
+tenant_id = input(f"Школа (tenant_id) [{DEFAULT_TENANT}]: ").strip() or DEFAULT_TENANT
+if not re.fullmatch(r"[\w-]+", tenant_id):
+    print("tenant_id: только буквы, цифры, _ и -")
+    exit()
 
 if user_type == "student":
     name_tuter = input("Имя пользователя: ").strip()
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role=role,
         name_tuter=name_tuter
     )
@@ -29,8 +35,9 @@ elif user_type == "teacher":
         print("Ошибка: введите 0 или 1 для is_junior и is_senior")
         exit()
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role=role,
         name_tuter=name_tuter,
         is_junior=int(is_junior),
@@ -38,8 +45,9 @@ elif user_type == "teacher":
     )
 else:  # admin
     new_user = User(
+        tenant_id=tenant_id,
         login=login,
-        password_hash=bcrypt.hash(password),
+        password_hash=hash_password(password),
         role='admin',
         name_tuter='Admin',
     )
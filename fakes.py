@@ -0,0 +1,141 @@
+# fakes.py
+# Заглушки Telegram для бенчмарков и нагрузочных прогонов: бот работает без сети,
+# все вызовы Bot API записываются в FakeRequest.calls.
+import json
+import time
+import uuid
+import asyncio
+import itertools
+from sqlalchemy import insert
+from telegram.request import BaseRequest
+
+from init_db import SessionLocal, User, UserSession, Schedule, DEFAULT_TENANT, to_minutes
+
+
+class FakeRequest(BaseRequest):
+    """Транспорт Bot API без сети. files — содержимое файлов для download_to_drive по file_id."""
+
+    def __init__(self, files=None, latency=0.0):
+        self.calls = []
+        self.files = files or {}
+        self.latency = latency
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            return 200, self.files[url.rsplit("/", 1)[-1]]
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append((name, params))
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "schedule_bot"}
+        elif name in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": params.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": params["chat_id"], "type": "private"},
+                "text": params.get("text", ""),
+            }
+        elif name == "getFile":
+            result = {"file_id": params["file_id"], "file_unique_id": params["file_id"],
+                      "file_path": params["file_id"]}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+_update_ids = itertools.count(1)
+
+
+def message_update(telegram_id, text=None, document=None):
+    """JSON входящего сообщения (как его присылает Telegram) — для Update.de_json."""
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": telegram_id, "type": "private"},
+        "from": {"id": telegram_id, "is_bot": False, "first_name": "user"},
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if document is not None:
+        message["document"] = document
+    return {"update_id": message["message_id"], "message": message}
+
+
+# ===================== Синтетическая школа =====================
+WEEKDAYS = ["ПН", "ВТ", "СР", "ЧТ", "ПТ"]
+LESSON_TIMES = [("08:30", "09:15"), ("09:25", "10:10"), ("10:30", "11:15"), ("11:35", "12:20"),
+                ("12:30", "13:15"), ("13:25", "14:10"), ("14:20", "15:05"), ("15:15", "16:00")]
+SUBJECTS = ["Математика", "Русский язык", "Физика", "История", "Биология", "Химия", "Английский", "Литература"]
+
+
+def school_names(n_classes, n_teachers):
+    classes = [f"{5 + i // 4}{'АБВГ'[i % 4]}" if i < 28 else f"К{i}" for i in range(n_classes)]
+    teachers = [f"Учитель {i}" for i in range(n_teachers)]
+    return classes, teachers
+
+
+def school_sheet(n_classes, n_teachers, lessons_per_day=6):
+    """Строки листа расписания (как в загружаемом Excel) на полную неделю."""
+    classes, teachers = school_names(n_classes, n_teachers)
+    rows = []
+    for d_i, day in enumerate(WEEKDAYS):
+        for c_i, class_name in enumerate(classes):
+            for l_i in range(lessons_per_day):
+                start, end = LESSON_TIMES[l_i % len(LESSON_TIMES)]
+                rows.append({
+                    "time_start": start,
+                    "time_end": end,
+                    "cabinet": str(100 + (c_i + l_i) % 60),
+                    "teacher": teachers[(c_i * 7 + l_i + d_i) % len(teachers)],
+                    "class_name": class_name,
+                    "weekday": day,
+                    "subject": SUBJECTS[(c_i + l_i + d_i) % len(SUBJECTS)],
+                })
+    return rows
+
+
+def seed_school(n_classes, n_teachers, password_hash="-", tenant=DEFAULT_TENANT, id_offset=0):
+    """Создаёт учителей, по одному ученику на класс, привязанные сессии и расписание школы tenant.
+       Для второй школы в той же базе нужен другой id_offset (логины и telegram_id не должны совпасть).
+       Возвращает (telegram_id учителей, telegram_id учеников)."""
+    classes, teachers = school_names(n_classes, n_teachers)
+    prefix = "" if tenant == DEFAULT_TENANT else f"{tenant}_"
+    s = SessionLocal()
+    try:
+        teacher_ids, student_ids = [], []
+        for i, name in enumerate(teachers):
+            u = User(tenant_id=tenant, login=f"{prefix}teacher{i}", password_hash=password_hash, role="teacher",
+                     name_tuter=name, is_junior=i % 2 == 0, is_senior=i % 2 == 1)
+            s.add(u)
+            s.flush()
+            tid = 100000 + id_offset + i
+            s.add(UserSession(tenant_id=tenant, user_id=u.id, telegram_id=str(tid)))
+            teacher_ids.append(tid)
+        for i, class_name in enumerate(classes):
+            u = User(tenant_id=tenant, login=f"{prefix}student{i}", password_hash=password_hash, role="student",
+                     name_tuter=class_name)
+            s.add(u)
+            s.flush()
+            tid = 200000 + id_offset + i
+            s.add(UserSession(tenant_id=tenant, user_id=u.id, telegram_id=str(tid)))
+            student_ids.append(tid)
+        s.execute(insert(Schedule), [dict(row, id=str(uuid.uuid4()), tenant_id=tenant,
+                                          time_start=to_minutes(row["time_start"]),
+                                          time_end=to_minutes(row["time_end"]))
+                                     for row in school_sheet(n_classes, n_teachers)])
+        s.commit()
+        return teacher_ids, student_ids
+    finally:
+        s.close()
@@ -0,0 +1,147 @@
+# import_worker.py
+# Загрузка расписания в фоне: обработчик сразу освобождается, а ход импорта
+# показывается в одном сообщении, которое периодически редактируется.
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from telegram.error import BadRequest, TelegramError
+
+from blocking import run_db
+
+load_dotenv()
+
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "2"))
+# блокировка, которую не обновляли дольше этого, считается брошенной (процесс упал посреди
+# импорта); идущий импорт обновляет её каждые IMPORT_PROGRESS_INTERVAL
+IMPORT_LOCK_TIMEOUT = float(os.getenv("IMPORT_LOCK_TIMEOUT", "3600"))
+# Что делать с накладками (учитель/класс/кабинет заняты дважды в одно время):
+#   warn   — загружать и добавлять отчёт к результату (по умолчанию)
+#   ask    — не загружать и показать отчёт; файл с подписью IMPORT_FORCE_CAPTION загружается всё равно
+#   reject — не загружать никогда
+IMPORT_CONFLICTS = os.getenv("IMPORT_CONFLICTS", "warn")
+# подпись к файлу, с которой при IMPORT_CONFLICTS=ask расписание загружается несмотря на накладки
+IMPORT_FORCE_CAPTION = os.getenv("IMPORT_FORCE_CAPTION", "принять")
+
+
+def conflict_policy(caption):
+    """on_conflict для sync_schedule по настройке и подписи к файлу."""
+    if IMPORT_CONFLICTS == "ask":
+        forced = (caption or "").strip().lower() == IMPORT_FORCE_CAPTION.lower()
+        return "warn" if forced else "reject"
+    return "reject" if IMPORT_CONFLICTS == "reject" else "warn"
+
+
+class ImportLock:
+    """Один импорт на развёртывание. Файл-флаг создаётся атомарно (O_EXCL), поэтому
+       работает и между несколькими процессами бота с общим каталогом uploads."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self, owner: str) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._remove_if_stale():
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{owner}\n{time.time()}\n")
+            return True
+        return False
+
+    def holder(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.readline().strip() or None
+        except OSError:
+            return None
+
+    def touch(self):
+        """Отметка «импорт жив»: по mtime файла _remove_if_stale отличает долгий импорт от брошенного."""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_if_stale(self):
+        try:
+            if time.time() - os.path.getmtime(self.path) < IMPORT_LOCK_TIMEOUT:
+                return False
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def format_progress(progress):
+    return (
+        f"Загрузка расписания: {progress.stage}\n"
+        f"Прочитано строк: {progress.rows_parsed}\n"
+        f"Записано строк: {progress.rows_written}\n"
+        f"Прошло: {progress.elapsed:.0f} с"
+    )
+
+
+async def _edit(message, text, final=False):
+    """Правит сообщение о ходе импорта. Сбой правки прогресса не критичен; итоговый текст
+       (final) тогда уходит новым сообщением — данные уже записаны, админ должен это увидеть."""
+    try:
+        await message.edit_text(text)
+    except TelegramError as e:
+        if not final or (isinstance(e, BadRequest) and "not modified" in e.message.lower()):
+            return
+        try:
+            await message.get_bot().send_message(chat_id=message.chat_id, text=text)
+        except TelegramError as e:
+            print(f"Импорт: не удалось сообщить результат в чат {message.chat_id}: {e}")
+
+
+def _load_schedule_import():
+    # модуль тянет pandas; первая загрузка импортирует его в пуле, не останавливая event loop
+    import schedule_import
+    return schedule_import
+
+
+async def run_import_job(status_message, download, import_func, lock):
+    """Скачивает файл, запускает import_func(progress) в пуле потоков и обновляет
+       status_message, пока импорт идёт. Блокировку lock освобождает в любом случае."""
+    try:
+        schedule_import = await run_db(_load_schedule_import)
+        progress = schedule_import.ImportProgress()
+        progress.stage = "скачивание файла"
+        await _edit(status_message, format_progress(progress))
+        await download()
+
+        task = asyncio.ensure_future(run_db(import_func, progress))
+        last_text = None
+        while not task.done():
+            await asyncio.wait({task}, timeout=IMPORT_PROGRESS_INTERVAL)
+            lock.touch()
+            text = format_progress(progress)
+            if not task.done() and text != last_text:
+                await _edit(status_message, text)
+                last_text = text
+        try:
+            result = task.result()
+        except schedule_import.ScheduleConflictError as e:
+            text = str(e)
+            if IMPORT_CONFLICTS == "ask":
+                text += f"\nИсправьте файл или отправьте его ещё раз с подписью «{IMPORT_FORCE_CAPTION}», чтобы загрузить как есть."
+            await _edit(status_message, text, final=True)
+            return
+        await _edit(status_message, f"{schedule_import.format_import_result(result)}\nВремя: {progress.elapsed:.1f} с",
+                    final=True)
+    except Exception as e:
+        await _edit(status_message, f"Ошибка при загрузке: {e}", final=True)
+    finally:
+        lock.release()
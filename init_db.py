@@ -1,18 +1,66 @@
 import uuid
-from sqlalchemy import create_engine, Column, String, Enum, Boolean
+from sqlalchemy import create_engine, Column, String, Enum, Boolean, Index, Integer, true
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from passlib.hash import bcrypt
 import os
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, DateTime, Date
+from sqlalchemy.engine import make_url
 from sqlalchemy.sql import func
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/schedule_bot.db")
+
+# Настройки пула соединений (общие для синхронного и async-движка)
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "10"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+SQL_POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "1800"))  # секунды
+# DB_ASYNC=1 — обработчики ходят в БД через async-движок (см. async_db.py)
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+# Школа (tenant), к которой относятся записи без явного tenant_id: однопользовательская
+# установка и все данные, созданные до перехода на несколько школ в одной базе
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+# SQL_ECHO=1 — печатать каждый SQL-запрос (только для отладки: вывод сам по себе тормозит бота)
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+
+
+def pool_options(url):
+    """Параметры пула для create_engine/create_async_engine."""
+    opts = {"pool_pre_ping": True, "pool_recycle": SQL_POOL_RECYCLE}
+    u = make_url(url)
+    # SQLite в памяти живёт в одном соединении — размер пула к нему не применяется
+    if not (u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:")):
+        opts.update(pool_size=SQL_POOL_SIZE, max_overflow=SQL_MAX_OVERFLOW)
+    return opts
+
+
+# Время урока хранится целым числом минут от полуночи (08:30 -> 510): компактно в индексе,
+# сравнивается и сортируется как число. "ЧЧ:ММ" — только на входе и при отрисовке.
+def to_minutes(value):
+    """"ЧЧ:ММ" (или "ЧЧ:ММ:СС" из столбцов Time) -> минуты от полуночи; целое и None — как есть.
+       ValueError, если формат другой."""
+    if value is None or isinstance(value, int):
+        return value
+    parts = str(value).strip().split(":")
+    if len(parts) < 2:
+        raise ValueError(f"неверное время: {value}")
+    hours, minutes = int(parts[0]), int(parts[1])
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"неверное время: {value}")
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes):
+    """Минуты от полуночи -> "ЧЧ:ММ" ("" для None)."""
+    if minutes is None:
+        return ""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine)
 
 
@@ -21,6 +69,8 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
+    # логин уникален на всю базу: по нему при входе определяется школа пользователя
     login = Column(String, nullable=False, unique=True)
     password_hash = Column(String, nullable=False)
     role = Column(String, nullable=False)  # "admin", "teacher", "student"
@@ -29,6 +79,11 @@ class User(Base):
     is_junior = Column(Boolean, default=False)  
     is_senior = Column(Boolean, default=False)
 
+    # login уже проиндексирован через unique; этот индекс — для выборки учителей школы при импорте
+    __table_args__ = (
+        Index("ix_users_tenant_role_name_tuter", "tenant_id", "role", "name_tuter"),
+    )
+
 
 
 # Таблица расписания
@@ -36,21 +91,77 @@ class Schedule(Base):
     __tablename__ = "schedules"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    time_start = Column(String, nullable=False)
-    time_end = Column(String, nullable=True)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
+    time_start = Column(Integer, nullable=False)  # минуты от полуночи, см. to_minutes
+    time_end = Column(Integer, nullable=True)
     cabinet = Column(String, nullable=True)
     teacher = Column(String, nullable=True)
     class_name = Column(String, nullable=True)
     weekday = Column(Enum("ПН", "ВТ", "СР", "ЧТ", "ПТ", name="weekday_enum"), nullable=False)
     subject = Column(String, nullable=True) 
-      
+    # "odd"/"even" — урок только по нечётным/чётным неделям; None — каждую неделю
+    week_parity = Column(String, nullable=True)
+
+    # покрывают get_schedule_for_teacher/get_schedule_for_class: фильтр + ORDER BY time_start;
+    # tenant_id первым — они же обслуживают загрузку расписания одной школы
+    __table_args__ = (
+        Index("ix_schedules_tenant_weekday_teacher_time", "tenant_id", "weekday", "teacher", "time_start"),
+        Index("ix_schedules_tenant_weekday_class_time", "tenant_id", "weekday", "class_name", "time_start"),
+    )
+
+
+# Изменения расписания на конкретную дату поверх недельного:
+# schedule_id задан — урок schedule_id в этот день отменён (поля скопированы из него),
+# schedule_id пуст — в этот день добавлен урок с указанными полями. Замена = отмена + добавление.
+class ScheduleOverride(Base):
+    __tablename__ = "schedule_overrides"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
+    date = Column(Date, nullable=False)
+    schedule_id = Column(String, nullable=True)
+    time_start = Column(Integer, nullable=False)
+    time_end = Column(Integer, nullable=True)
+    cabinet = Column(String, nullable=True)
+    teacher = Column(String, nullable=True)
+    class_name = Column(String, nullable=True)
+    subject = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_schedule_overrides_tenant_date_class", "tenant_id", "date", "class_name"),
+    )
+
+
+# Праздники и каникулы: в дни с date_start по date_end включительно уроков нет
+class Holiday(Base):
+    __tablename__ = "holidays"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
+    date_start = Column(Date, nullable=False)
+    date_end = Column(Date, nullable=False)
+    title = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_holidays_tenant_end", "tenant_id", "date_end"),
+    )
+
+
 class UserSession(Base):
     __tablename__ = "user_sessions"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     telegram_id = Column(String, nullable=False, unique=True, index=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # False — пользователь отключил утреннюю рассылку командой /notify off
+    daily_broadcast = Column(Boolean, nullable=False, default=True, server_default=true())
+
+    # получатели рассылки одной школы
+    __table_args__ = (
+        Index("ix_user_sessions_tenant_user", "tenant_id", "user_id"),
+    )
 
 
 def init_db():
@@ -0,0 +1,291 @@
+# loadtest.py
+# Нагрузочный прогон: виртуальные пользователи шлют синтетические Update (вход, кнопки меню,
+# неделя, загрузка файла) через обработчики main.add_handlers. Сеть не нужна — Bot API
+# подменён FakeRequest, база — временная SQLite (или пустая база из --database-url).
+#   python loadtest.py --users 200 --concurrency 50 --rate 300 --duration 30
+#   python loadtest.py --database-url postgresql+psycopg2://bot@localhost/loadtest --json out.json
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from collections import defaultdict
+from telegram import Update
+
+ACTIONS = ("menu_day", "week", "login", "upload")
+DAY_BUTTONS = ["На сегодня", "На завтра", "ПН", "ВТ", "СР", "ЧТ", "ПТ"]
+ADMIN_ID = 900000
+PASSWORD = "loadtest"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон schedule_bot")
+    parser.add_argument("--users", type=int, default=200, help="виртуальных пользователей (учителя + ученики)")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременно обрабатываемых update")
+    parser.add_argument("--rate", type=float, default=0, help="целевой поток действий в секунду (0 — без ограничения)")
+    parser.add_argument("--duration", type=float, default=20, help="длительность прогона, с")
+    parser.add_argument("--mix", default="menu_day=70,week=15,login=14,upload=1",
+                        help="доли действий, например menu_day=70,week=15,login=14,upload=1")
+    parser.add_argument("--upload-rows", type=int, default=2000, help="строк в загружаемом файле")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="стоимость bcrypt у тестовых паролей")
+    parser.add_argument("--database-url", help="пустая база вместо временной SQLite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="куда записать итог в JSON")
+    return parser.parse_args()
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise SystemExit(f"Неизвестное действие в --mix: {name}. Возможные: {', '.join(ACTIONS)}")
+        weights[name] = float(value)
+    return weights
+
+
+def summarize(samples):
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+class LoopLagMonitor:
+    """Раз в interval засыпает и меряет, насколько позже запланированного проснулся.
+       Большое запаздывание — event loop занят синхронной работой."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class Pacer:
+    """Общий темп действий: не чаще rate в секунду на все виртуальные пользователи."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class LoadTest:
+    def __init__(self, args, app, request, users, csv_bytes):
+        self.args = args
+        self.app = app
+        self.request = request
+        self.users = users  # [(telegram_id, login)]
+        self.csv_bytes = csv_bytes
+        self.rnd = random.Random(args.seed)
+        weights = parse_mix(args.mix)
+        self.actions = list(weights)
+        self.weights = [weights[a] for a in self.actions]
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.updates = 0
+        self.uploads = 0
+        self._failed = set()  # update_id, на которых обработчик упал
+
+    async def on_error(self, update, context):
+        if getattr(update, "update_id", None) is not None:
+            self._failed.add(update.update_id)
+
+    async def send(self, telegram_id, text=None, document=None):
+        from fakes import message_update
+
+        update = Update.de_json(message_update(telegram_id, text, document), self.app.bot)
+        self.updates += 1
+        await self.app.process_update(update)
+        return update.update_id not in self._failed
+
+    async def do_action(self, action):
+        """True, если все update действия обработаны без исключений."""
+        telegram_id, login = self.rnd.choice(self.users)
+        if action == "menu_day":
+            return await self.send(telegram_id, self.rnd.choice(DAY_BUTTONS))
+        if action == "week":
+            return await self.send(telegram_id, "На неделю")
+        if action == "login":
+            # три update одного диалога — подряд, как их прислал бы человек
+            return (await self.send(telegram_id, "/login")
+                    and await self.send(telegram_id, login)
+                    and await self.send(telegram_id, PASSWORD))
+        if action == "upload":
+            self.uploads += 1
+            file_id = f"upload{self.uploads}"
+            self.request.files[file_id] = self.csv_bytes
+            return await self.send(ADMIN_ID, document={
+                "file_id": file_id, "file_unique_id": file_id,
+                "file_name": f"schedule_{self.uploads}.csv", "file_size": len(self.csv_bytes),
+            })
+
+    async def worker(self, pacer, deadline):
+        while time.monotonic() < deadline:
+            await pacer.wait()
+            if time.monotonic() >= deadline:
+                break
+            action = self.rnd.choices(self.actions, self.weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ok = await self.do_action(action)
+            except Exception:
+                ok = False
+            if not ok:
+                self.errors[action] += 1
+            self.latency[action].append(time.perf_counter() - t0)
+
+    async def run(self):
+        import main
+        from init_db import DEFAULT_TENANT
+
+        self.app.add_error_handler(self.on_error)
+        monitor = LoopLagMonitor()
+        pacer = Pacer(self.args.rate)
+        async with self.app:
+            await self.app.start()  # иначе фоновые задачи импорта (create_task) не отслеживаются
+            monitor.start()
+            started = time.monotonic()
+            deadline = started + self.args.duration
+            await asyncio.gather(*(self.worker(pacer, deadline) for _ in range(self.args.concurrency)))
+            elapsed = time.monotonic() - started
+            # дожидаемся фонового импорта, чтобы он не оборвался на выходе
+            while main.import_lock_for(DEFAULT_TENANT).holder() is not None:
+                await asyncio.sleep(0.1)
+            await monitor.stop()
+            await self.app.stop()
+
+        total = sum(len(v) for v in self.latency.values())
+        errors = sum(self.errors.values())
+        return {
+            "config": {k: v for k, v in vars(self.args).items() if k != "json"},
+            "elapsed_s": elapsed,
+            "actions": total,
+            "updates": self.updates,
+            "actions_per_s": total / elapsed if elapsed else 0.0,
+            "updates_per_s": self.updates / elapsed if elapsed else 0.0,
+            "error_rate": errors / total if total else 0.0,
+            "bot_api_calls": len(self.request.calls),
+            "latency": {a: dict(summarize(self.latency[a]), errors=self.errors[a]) for a in self.actions},
+            "loop_lag": summarize(monitor.samples),
+        }
+
+
+def setup(args):
+    """База, пользователи и Application с FakeRequest. Возвращает LoadTest."""
+    tmpdir = tempfile.mkdtemp(prefix="schedule_loadtest_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'loadtest.db')}"
+
+    import pandas as pd
+    from passlib.hash import bcrypt
+    from telegram.ext import ApplicationBuilder
+
+    import main
+    from init_db import Base, engine, SessionLocal, User, UserSession
+    from metrics import TimedRequest
+    from fakes import FakeRequest, seed_school, school_sheet
+
+    engine.echo = False
+    main.UPLOADS_DIR = tmpdir
+
+    Base.metadata.create_all(bind=engine)
+    n_classes = max(1, args.users // 3)
+    n_teachers = max(1, args.users - n_classes)
+    password_hash = bcrypt.using(rounds=args.bcrypt_rounds).hash(PASSWORD)
+    teacher_ids, student_ids = seed_school(n_classes, n_teachers, password_hash=password_hash)
+    s = SessionLocal()
+    try:
+        admin = User(login="loadtest_admin", password_hash=password_hash, role="admin", name_tuter="Администратор")
+        s.add(admin)
+        s.flush()
+        s.add(UserSession(user_id=admin.id, telegram_id=str(ADMIN_ID)))
+        s.commit()
+    finally:
+        s.close()
+    main.load_schedule()
+
+    users = [(tid, f"teacher{i}") for i, tid in enumerate(teacher_ids)]
+    users += [(tid, f"student{i}") for i, tid in enumerate(student_ids)]
+    csv_bytes = pd.DataFrame(school_sheet(n_classes, n_teachers)[:args.upload_rows]).to_csv(index=False).encode("utf-8")
+
+    request = FakeRequest(latency=args.api_latency / 1000)
+    app = (
+        ApplicationBuilder()
+        .token("1:loadtest")
+        .request(TimedRequest(request))
+        .get_updates_request(FakeRequest())
+        .build()
+    )
+    main.add_handlers(app)
+    return LoadTest(args, app, request, users, csv_bytes)
+
+
+def print_report(report):
+    print(f"Прогон {report['elapsed_s']:.1f} с: действий {report['actions']} "
+          f"({report['actions_per_s']:.1f}/с), update {report['updates']} ({report['updates_per_s']:.1f}/с), "
+          f"ошибок {report['error_rate']:.2%}, вызовов Bot API {report['bot_api_calls']}")
+    print(f"{'действие':<10} {'n':>7} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'max мс':>9} {'ошибок':>7}")
+    for name, row in report["latency"].items():
+        if not row["n"]:
+            continue
+        print(f"{name:<10} {row['n']:>7} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['max_ms']:>9.1f} {row['errors']:>7}")
+    lag = report["loop_lag"]
+    if lag["n"]:
+        print(f"Задержка event loop: p50 {lag['p50_ms']:.1f} мс, p99 {lag['p99_ms']:.1f} мс, max {lag['max_ms']:.1f} мс")
+
+
+def main_cli():
+    args = parse_args()
+    test = setup(args)
+    report = asyncio.run(test.run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
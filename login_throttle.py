@@ -0,0 +1,193 @@
+# login_throttle.py
+# Защита входа от перебора: счётчики неудачных попыток по telegram_id и по логину
+# с экспоненциальной задержкой и ограничение числа одновременных проверок bcrypt.
+# Счётчики живут в процессе. У воркеров за router.py ключ tg:<id> всегда попадает к одному
+# воркеру, а ключ login:<логин> — нет: без общего хранилища N воркеров дали бы N× попыток
+# на один логин. Поэтому при PERSISTENCE_URL счётчики входа хранятся и в общем StateStore
+# (main.py задаёт login_throttle.store), и каждая проверка пароля сначала читает их оттуда.
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from blocking import HASH_POOL_SIZE
+
+load_dotenv()
+
+LOGIN_FREE_ATTEMPTS = int(os.getenv("LOGIN_FREE_ATTEMPTS", "3"))        # неудач без задержки
+LOGIN_BACKOFF_BASE = float(os.getenv("LOGIN_BACKOFF_BASE", "5"))        # секунд после первой «платной» неудачи
+LOGIN_BACKOFF_MAX = float(os.getenv("LOGIN_BACKOFF_MAX", "900"))
+LOGIN_FAILURE_TTL = float(os.getenv("LOGIN_FAILURE_TTL", "3600"))      # счётчик забывается после тишины
+LOGIN_THROTTLE_SIZE = int(os.getenv("LOGIN_THROTTLE_SIZE", "100000"))
+# JSON-файл, чтобы счётчики пережили перезапуск; не задан — только в памяти
+LOGIN_THROTTLE_FILE = os.getenv("LOGIN_THROTTLE_FILE")
+# как часто фоновая задача бота (main.save_login_throttle_job) пишет файл, если счётчики менялись
+LOGIN_THROTTLE_SAVE_INTERVAL = float(os.getenv("LOGIN_THROTTLE_SAVE_INTERVAL", "10"))
+# сколько проверок пароля может ждать/выполняться в пуле hash; остальным — «попробуйте позже»
+LOGIN_MAX_PENDING_HASHES = int(os.getenv("LOGIN_MAX_PENDING_HASHES", str(HASH_POOL_SIZE * 4)))
+# пространство имён счётчиков в общем StateStore (persistence.py)
+STORE_NAMESPACE = "login_throttle"
+
+
+def backoff_seconds(failures, free=LOGIN_FREE_ATTEMPTS, base=LOGIN_BACKOFF_BASE, cap=LOGIN_BACKOFF_MAX):
+    """0 для первых free неудач, дальше base, 2*base, 4*base ... но не больше cap."""
+    if failures < free:
+        return 0.0
+    return min(cap, base * 2 ** (failures - free))
+
+
+class LoginThrottle:
+    """Ключи — ("tg", telegram_id) и ("login", логин). Запись: [неудач, время последней неудачи].
+       Проверка делается до запроса в БД и до bcrypt, поэтому заблокированная попытка ничего не стоит."""
+
+    def __init__(self, path=LOGIN_THROTTLE_FILE, maxsize=LOGIN_THROTTLE_SIZE, store=None):
+        self.path = path
+        self.maxsize = maxsize
+        self.store = store  # общий для воркеров StateStore; None — счётчики только у процесса
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def keys(telegram_id, login):
+        keys = [f"tg:{telegram_id}"]
+        if login:
+            keys.append(f"login:{login.strip().lower()}")
+        return keys
+
+    def _entry(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and now - entry[1] > LOGIN_FAILURE_TTL:
+            del self._data[key]
+            return None
+        return entry
+
+    def retry_after(self, telegram_id, login=None, now=None):
+        """Сколько секунд ещё ждать (0 — попытка разрешена). Отказ учитывается в stats."""
+        now = time.time() if now is None else now
+        wait = 0.0
+        with self._lock:
+            for key in self.keys(telegram_id, login):
+                entry = self._entry(key, now)
+                if entry is not None:
+                    wait = max(wait, entry[1] + backoff_seconds(entry[0]) - now)
+            if wait > 0:
+                self.rejected += 1
+        return max(0.0, wait)
+
+    def failure(self, telegram_id, login=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.failures += 1
+            for key in self.keys(telegram_id, login):
+                entry = self._entry(key, now)
+                self._data[key] = [(entry[0] if entry else 0) + 1, now]
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def success(self, telegram_id, login=None):
+        with self._lock:
+            self.successes += 1
+            for key in self.keys(telegram_id, login):
+                if self._data.pop(key, None) is not None:
+                    self._dirty = True
+
+    # ---------- общее хранилище ----------
+    def pull(self, telegram_id, login=None):
+        """Заменяет счётчики ключей значениями из self.store — учитываются неудачи,
+           набранные на других воркерах. Обращается к хранилищу: только из пула потоков."""
+        now = time.time()
+        for key in self.keys(telegram_id, login):
+            entry = self.store.get(STORE_NAMESPACE, key)
+            expired = entry is not None and now - entry[1] > LOGIN_FAILURE_TTL
+            with self._lock:
+                if entry is None or expired:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = list(entry)
+                    self._data.move_to_end(key)
+            if expired:
+                self.store.delete(STORE_NAMESPACE, key)
+
+    def push(self, telegram_id, login=None):
+        """Записывает счётчики ключей в self.store после неудачи или успешного входа."""
+        for key in self.keys(telegram_id, login):
+            with self._lock:
+                entry = self._data.get(key)
+                entry = list(entry) if entry is not None else None
+            if entry is None:
+                self.store.delete(STORE_NAMESPACE, key)
+            else:
+                self.store.save(STORE_NAMESPACE, key, entry)
+
+    # ---------- персистентность ----------
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for key, (count, last) in sorted(saved.items(), key=lambda kv: kv[1][1]):
+                if now - last <= LOGIN_FAILURE_TTL:
+                    self._data[key] = [count, last]
+
+    def save_if_dirty(self):
+        """Записывает счётчики, если они менялись после прошлой записи. Пишет файл —
+           из обработчиков не вызывается, только из фоновой задачи в пуле потоков."""
+        if self.path and self._dirty:
+            self.save()
+
+    def save(self):
+        """Атомарно (через временный файл) записывает счётчики в self.path."""
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = dict(self._data)
+            self._dirty = False
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path)
+
+    def stats(self):
+        with self._lock:
+            return {"tracked": len(self._data), "failures": self.failures,
+                    "successes": self.successes, "rejected": self.rejected}
+
+
+class HashGate:
+    """Не больше limit проверок пароля одновременно (в очереди пула hash и в работе).
+       Все вызовы — из event loop, поэтому достаточно простого счётчика."""
+
+    def __init__(self, limit=LOGIN_MAX_PENDING_HASHES):
+        self.limit = limit
+        self.pending = 0
+        self.rejected = 0
+
+    def try_enter(self) -> bool:
+        if self.pending >= self.limit:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def leave(self):
+        self.pending -= 1
+
+    def stats(self):
+        return {"limit": self.limit, "pending": self.pending, "rejected": self.rejected}
+
+
+login_throttle = LoginThrottle()
+hash_gate = HashGate()
@@ -1,19 +1,34 @@
 import os
-import datetime
-import pandas as pd
+import re
+import logging
+import math
+import time
 import uuid
 from dotenv import load_dotenv
-from passlib.hash import bcrypt
-from sqlalchemy import asc
 from telegram import ReplyKeyboardMarkup, Update
-from datetime import timedelta
+from telegram.request import HTTPXRequest
+from datetime import datetime, timedelta, time as dt_time
 
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, filters,
     ConversationHandler, ContextTypes
 )
 
-from init_db import SessionLocal, User, Schedule, UserSession
+from init_db import SessionLocal, User, Schedule, UserSession, DB_ASYNC, DEFAULT_TENANT, to_minutes, format_minutes
+from schedule_index import get_schedule_index, reload_schedule_index, reload_all_schedule_indexes, reload_schedule_calendar
+from schedule_calendar import (
+    DATE_FORMAT, parse_date, parse_date_range, set_lesson_change, add_holiday, delete_holidays,
+)
+from schedule_reader import SUPPORTED_EXTENSIONS, LEGACY_EXCEL_MESSAGE
+from import_worker import ImportLock, run_import_job, conflict_policy
+from blocking import run_db, run_hash
+from user_cache import user_cache, snapshot_user
+from render_cache import render_caches, RENDER_CACHE_WARM
+from broadcast import DAILY_BROADCAST_TIME, load_recipients, broadcast, format_report
+from login_throttle import login_throttle, hash_gate, LOGIN_THROTTLE_FILE, LOGIN_THROTTLE_SAVE_INTERVAL
+from passwords import verify_and_update
+from persistence import make_persistence, get_state_store, publish_schedule_version, load_schedule_versions
+from metrics import instrument_handler, tag_tenant, PASSWORD_VERIFY_SECONDS, TimedRequest, start_metrics_server, METRICS_PORT
 
 
 # ===================== Утилиты для работы с пользователями =====================
@@ -29,14 +44,14 @@ def get_user_by_telegram(telegram_id: int):
     finally:
         s.close()
 
-def create_user_session(user_id: str, telegram_id: int):
+def create_user_session(user_id: str, telegram_id: int, tenant_id: str = DEFAULT_TENANT):
     """Создаёт/обновляет сессию: один telegram_id => одна сессия.
        Возвращает True/False."""
     s = SessionLocal()
     try:
         # если этот telegram_id уже привязан к другому user — удалим старую запись
         s.query(UserSession).filter_by(telegram_id=str(telegram_id)).delete()
-        us = UserSession(id=str(uuid.uuid4()), user_id=user_id, telegram_id=str(telegram_id))
+        us = UserSession(id=str(uuid.uuid4()), tenant_id=tenant_id, user_id=user_id, telegram_id=str(telegram_id))
         s.add(us)
         s.commit()
         return True
@@ -57,6 +72,16 @@ def clear_user_session(telegram_id: int):
     finally:
         s.close()
 
+def set_daily_broadcast(telegram_id: int, enabled: bool):
+    """Включает/отключает утреннюю рассылку для чата. False — чат не привязан."""
+    s = SessionLocal()
+    try:
+        updated = s.query(UserSession).filter_by(telegram_id=str(telegram_id)).update({"daily_broadcast": enabled})
+        s.commit()
+        return bool(updated)
+    finally:
+        s.close()
+
 def get_user_by_login(login: str):
     s = SessionLocal()
     try:
@@ -66,17 +91,79 @@ def get_user_by_login(login: str):
 
 
 
-def verify_password(user, password: str) -> bool:
+def update_password_hash(user_id: str, password_hash: str):
+    s = SessionLocal()
+    try:
+        s.query(User).filter_by(id=user_id).update({"password_hash": password_hash})
+        s.commit()
+    finally:
+        s.close()
+
+
+def verify_password(user, password: str):
+    """(пароль верен, новый хеш или None). Новый хеш — если старый не соответствует политике passwords.py."""
     if not user:
-        return False
-    return bcrypt.verify(password, user.password_hash)
+        return False, None
+    t0 = time.perf_counter()
+    try:
+        return verify_and_update(password, user.password_hash)
+    finally:
+        PASSWORD_VERIFY_SECONDS.observe(time.perf_counter() - t0)
+
+
+# Обработчики вызывают БД через эти обёртки: при DB_ASYNC=1 — async-движок
+# (async_db.py), иначе синхронные функции выше в пуле потоков (blocking.py).
+if DB_ASYNC:
+    import async_db
+
+async def db_get_user_by_telegram(telegram_id: int):
+    """Снимок пользователя (user_cache.UserSnapshot) или None; сначала смотрит в кэш."""
+    found, snapshot = user_cache.get(telegram_id)
+    if not found:
+        generation = user_cache.generation
+        if DB_ASYNC:
+            user = await async_db.get_user_by_telegram(telegram_id)
+        else:
+            user = await run_db(get_user_by_telegram, telegram_id)
+        snapshot = snapshot_user(user)
+        user_cache.put(telegram_id, snapshot, generation)
+    if snapshot:
+        tag_tenant(snapshot.tenant_id)
+    return snapshot
+
+async def db_get_user_by_login(login: str):
+    if DB_ASYNC:
+        return await async_db.get_user_by_login(login)
+    return await run_db(get_user_by_login, login)
+
+async def db_update_password_hash(user_id: str, password_hash: str):
+    if DB_ASYNC:
+        return await async_db.update_password_hash(user_id, password_hash)
+    return await run_db(update_password_hash, user_id, password_hash)
+
+async def db_create_user_session(user_id: str, telegram_id: int, tenant_id: str = DEFAULT_TENANT):
+    try:
+        if DB_ASYNC:
+            return await async_db.create_user_session(user_id, telegram_id, tenant_id)
+        return await run_db(create_user_session, user_id, telegram_id, tenant_id)
+    finally:
+        user_cache.invalidate(telegram_id)
+
+async def db_clear_user_session(telegram_id: int):
+    try:
+        if DB_ASYNC:
+            return await async_db.clear_user_session(telegram_id)
+        return await run_db(clear_user_session, telegram_id)
+    finally:
+        user_cache.invalidate(telegram_id)
 
 
 # ===================== Клавиатура =====================
 MAIN_KEYBOARD = [
     ["ПН", "ВТ", "СР"],
     ["ЧТ", "ПТ", "На сегодня"],
-    ["На завтра", "На неделю", "Выйти"]
+    ["На завтра", "На неделю", "Выйти"],
+    ["Следующий урок"],
 ]
 
 def main_keyboard():
@@ -86,8 +173,9 @@ def main_keyboard():
 # ===================== Авторизация =====================
 LOGIN, PASSWORD = range(2)
 
+@instrument_handler("cmd_start")
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = get_user_by_telegram(update.effective_user.id)
+    user = await db_get_user_by_telegram(update.effective_user.id)
     if user:
         await update.message.reply_text(
             f"Вы уже авторизованы как {user.name_tuter} ({user.role})",
@@ -96,7 +184,14 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await update.message.reply_text("Привет. Чтобы продолжить, выполните /login")
 
+def throttled_text(wait):
+    return f"Слишком много неудачных попыток входа. Попробуйте через {math.ceil(wait)} с."
+
 async def cmd_login_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    wait = login_throttle.retry_after(update.effective_user.id)
+    if wait:
+        await update.message.reply_text(throttled_text(wait))
+        return ConversationHandler.END
     await update.message.reply_text("Введите ваш логин:")
     return LOGIN
 
@@ -105,19 +200,55 @@ async def login_receive_login(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text("Введите пароль:")
     return PASSWORD
 
+async def pull_login_throttle(telegram_id, login):
+    """При общем хранилище — счётчики попыток, набранные на других воркерах."""
+    if login_throttle.store is not None:
+        await run_db(login_throttle.pull, telegram_id, login)
+
+async def record_login(telegram_id, login, ok):
+    """Исход проверки пароля в счётчиках; при общем хранилище — сразу и для остальных воркеров."""
+    if ok:
+        login_throttle.success(telegram_id, login)
+    else:
+        login_throttle.failure(telegram_id, login)
+    if login_throttle.store is not None:
+        await run_db(login_throttle.push, telegram_id, login)
+
+@instrument_handler("login_receive_password")
 async def login_receive_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     login = context.user_data.get('login_try')
     password = update.message.text.strip()
-    user = get_user_by_login(login)
+    telegram_id = update.effective_user.id
+    await pull_login_throttle(telegram_id, login)
+    # до запроса в БД и bcrypt: заблокированная попытка не должна ничего стоить
+    wait = login_throttle.retry_after(telegram_id, login)
+    if wait:
+        await update.message.reply_text(throttled_text(wait))
+        return ConversationHandler.END
+    user = await db_get_user_by_login(login)
     if not user:
+        await record_login(telegram_id, login, ok=False)
         await update.message.reply_text("Пользователь с таким логином не найден. Попробуйте /login заново.")
         return ConversationHandler.END
-    if not verify_password(user, password):
+    tag_tenant(user.tenant_id)
+    if not hash_gate.try_enter():
+        await update.message.reply_text("Сервер занят, попробуйте войти через минуту.")
+        return ConversationHandler.END
+    try:
+        ok, new_hash = await run_hash(verify_password, user, password)
+    finally:
+        hash_gate.leave()
+    if not ok:
+        await record_login(telegram_id, login, ok=False)
         await update.message.reply_text("Неверный пароль.")
         return ConversationHandler.END
 
     # после успешной проверки пароля
-    create_user_session(user.id, update.effective_user.id)
+    await record_login(telegram_id, login, ok=True)
+    if new_hash:
+        # хеш в устаревшей схеме/стоимости — заменяем, пока знаем пароль
+        await db_update_password_hash(user.id, new_hash)
+    await db_create_user_session(user.id, update.effective_user.id, user.tenant_id)
     await update.message.reply_text(
         f"Успешно! Вы вошли как {user.name_tuter} ({user.role}).",
         reply_markup=main_keyboard()
@@ -125,20 +256,40 @@ async def login_receive_password(update: Update, context: ContextTypes.DEFAULT_T
     return ConversationHandler.END
 
 async def cmd_logout(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cleared = clear_user_session(update.effective_user.id)
+    cleared = await db_clear_user_session(update.effective_user.id)
     if cleared:
         await update.message.reply_text("Вы вышли. Для входа используйте /login")
     else:
         await update.message.reply_text("Вы не были привязаны к учётной записи.")
 
-login_conv = ConversationHandler(
-    entry_points=[CommandHandler('login', cmd_login_start)],
-    states={
-        LOGIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, login_receive_login)],
-        PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, login_receive_password)],
-    },
-    fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)],
-)
+NOTIFY_USAGE = "Утренняя рассылка расписания: /notify on — включить, /notify off — отключить."
+
+@instrument_handler("cmd_notify")
+async def cmd_notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    choice = context.args[0].lower() if context.args else ""
+    if choice not in ("on", "off"):
+        await update.message.reply_text(NOTIFY_USAGE)
+        return
+    found = await run_db(set_daily_broadcast, update.effective_user.id, choice == "on")
+    if not found:
+        await update.message.reply_text("Сначала выполните /login")
+    elif choice == "on":
+        await update.message.reply_text("Утренняя рассылка включена.")
+    else:
+        await update.message.reply_text("Утренняя рассылка отключена. Включить снова: /notify on")
+
+def make_login_conv(persistent=False):
+    # persistent — состояние диалога и login_try переживают перезапуск (нужна persistence у app)
+    return ConversationHandler(
+        entry_points=[CommandHandler('login', cmd_login_start)],
+        states={
+            LOGIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, login_receive_login)],
+            PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, login_receive_password)],
+        },
+        fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)],
+        name="login_conv",
+        persistent=persistent,
+    )
 
 
 # ===================== Работа с расписанием =====================
@@ -147,98 +298,123 @@ WEEK_MAP_NUM_TO_RU = {1: "ПН", 2: "ВТ", 3: "СР", 4: "ЧТ", 5: "ПТ"}
 def ru_weekday_from_isoweekday(n: int):
     return WEEK_MAP_NUM_TO_RU.get(n)
 
-def get_schedule_for_teacher(teacher_name: str, weekday_ru: str):
-    s = SessionLocal()
-    try:
-        return s.query(Schedule).filter_by(weekday=weekday_ru, teacher=teacher_name).order_by(asc(Schedule.time_start)).all()
-    finally:
-        s.close()
-
-def get_schedule_for_class(class_name: str, weekday_ru: str):
-    s = SessionLocal()
-    try:
-        return s.query(Schedule).filter_by(weekday=weekday_ru, class_name=class_name).order_by(asc(Schedule.time_start)).all()
-    finally:
-        s.close()
-
-
-def format_schedule_rows(rows, role):
-    lines = []
-    
-    for i, r in enumerate(rows, start=1):
-        ts = str(r.time_start or '')
-        te = str(r.time_end or '')
-        period = f"{ts}–{te}" if te else ts
-
-        if role == 'student':
-            parts = [f"{i}. <b>{period}</b> | {r.subject or ''}"]
-            if r.teacher:
-                parts.append(f"📚<b>Преподаватель:</b> {r.teacher}")
-            if r.cabinet:
-                parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
-        elif role == 'teacher':
-            parts = [f"{i}. <b>{period}</b> | {r.subject or ''}"]
-            if r.class_name:
-                parts.append(f"🧒🏼<b>Класс:</b> {r.class_name}")
-            if r.cabinet:
-                parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
+# Меню читает расписание из индекса в памяти (schedule_index.py), а не из БД.
+# Индекс загружается при старте и пересобирается после каждой загрузки файла;
+# изменения на дату и праздники подмешиваются в него без перечитывания расписания.
+def get_schedule_for_teacher(teacher_name: str, weekday_ru: str, tenant: str = DEFAULT_TENANT):
+    """Недельное расписание (без изменений на даты и чередования недель)."""
+    return get_schedule_index(tenant).for_teacher(teacher_name, weekday_ru)
+
+def get_schedule_for_class(class_name: str, weekday_ru: str, tenant: str = DEFAULT_TENANT):
+    return get_schedule_index(tenant).for_class(class_name, weekday_ru)
+
+def get_schedule_for_date(role: str, owner: str, date_obj, tenant: str = DEFAULT_TENANT):
+    """Действующее расписание на дату: праздники, замены, чётность недели."""
+    return get_schedule_index(tenant).for_date(role, owner, date_obj)
+
+
+WEEKDAYS_RU = ["ПН", "ВТ", "СР", "ЧТ", "ПТ"]
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def _tg_len(text: str) -> int:
+    # Telegram считает длину в UTF-16 (эмодзи — 2 единицы)
+    return len(text.encode("utf-16-le")) // 2
+
+# тег и HTML-сущность — неделимые куски, остальное — по символу
+_HTML_TOKEN = re.compile(r"<[^>]*>|&#?\w+;|.", re.S)
+
+def _split_html_line(line, limit):
+    """Строка длиннее limit -> куски не длиннее limit (в UTF-16). Теги и сущности не разрываются:
+       теги, открытые на границе, закрываются в конце куска и открываются заново в следующем."""
+    pieces = []
+    open_tags = []  # (имя, открывающий тег)
+    current, current_len, prefix_len = "", 0, 0
+
+    def closing():
+        return "".join(f"</{name}>" for name, _ in reversed(open_tags))
+
+    for token in _HTML_TOKEN.findall(line):
+        opening = None
+        if token.startswith("</"):
+            name = token[2:-1].strip()
+        elif token.startswith("<") and len(token) > 1 and not token.endswith("/>"):
+            opening = (token[1:-1].split()[0], token)
+        tags = open_tags + [opening] if opening else open_tags
+        tail = sum(len(t[0]) + 3 for t in tags)
+        if current_len + _tg_len(token) + tail > limit and current_len > prefix_len:
+            pieces.append(current + closing())
+            current = "".join(tag for _, tag in open_tags)
+            current_len = prefix_len = _tg_len(current)
+        current += token
+        current_len += _tg_len(token)
+        if opening:
+            open_tags.append(opening)
+        elif token.startswith("</") and open_tags and open_tags[-1][0] == name:
+            open_tags.pop()
+    if current_len > prefix_len:
+        pieces.append(current + closing())
+    return pieces
+
+def pack_messages(blocks, limit=TELEGRAM_MESSAGE_LIMIT, sep="\n\n"):
+    """Склеивает блоки (дни) в как можно меньше сообщений не длиннее limit.
+       Режет только между блоками; блок длиннее limit режется по урокам, затем по строкам
+       (каждая строка — законченный HTML), и только одна огромная строка — посимвольно."""
+    messages = []
+    current = ""
+    for block in blocks:
+        if _tg_len(block) > limit:
+            if sep in block:
+                parts = pack_messages(block.split(sep), limit, sep)
+            elif "\n" in block:
+                parts = pack_messages(block.split("\n"), limit, "\n")
+            else:
+                parts = _split_html_line(block, limit)
+            # блок не помещается целиком — его части идут отдельными сообщениями
+            for m in parts:
+                if current:
+                    messages.append(current)
+                current = m
+            continue
+        candidate = f"{current}{sep}{block}" if current else block
+        if _tg_len(candidate) <= limit:
+            current = candidate
         else:
-            parts = [f"{i}. {period} | {r.subject or ''}"]
-
-        lines.append("\n".join(parts))
-
-    return "\n\n".join(lines) if lines else "Нет занятий на выбранный день."
-
-
-
-def format_schedule_with_header(rows, role, date_obj):
-    weekday_en = date_obj.strftime("%A")
-    weekday_ru = {
-        "Monday": "Понедельник",
-        "Tuesday": "Вторник",
-        "Wednesday": "Среда",
-        "Thursday": "Четверг",
-        "Friday": "Пятница",
-        "Saturday": "Суббота",
-        "Sunday": "Воскресенье",
-    }[weekday_en]
-
-    header = f"<b>{weekday_ru}. {date_obj.strftime('%d.%m')}</b>"
-    schedule_text = format_schedule_rows(rows, role)
-
-    return f"{header}\n{schedule_text}"
+            messages.append(current)
+            current = block
+    if current:
+        messages.append(current)
+    return messages
+
+
+def format_lesson(r, role, prefix=""):
+    # время хранится в минутах — в "ЧЧ:ММ" переводится только здесь
+    ts = format_minutes(r.time_start)
+    te = format_minutes(r.time_end)
+    period = f"{ts}–{te}" if te else ts
+
+    if role == 'student':
+        parts = [f"{prefix}<b>{period}</b> | {r.subject or ''}"]
+        if r.teacher:
+            parts.append(f"📚<b>Преподаватель:</b> {r.teacher}")
+        if r.cabinet:
+            parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
+    elif role == 'teacher':
+        parts = [f"{prefix}<b>{period}</b> | {r.subject or ''}"]
+        if r.class_name:
+            parts.append(f"🧒🏼<b>Класс:</b> {r.class_name}")
+        if r.cabinet:
+            parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
+    else:
+        parts = [f"{prefix}{period} | {r.subject or ''}"]
+    return "\n".join(parts)
 
-from datetime import datetime, timedelta
 
 def format_schedule_rows(rows, role):
-    lines = []
-    
-    for i, r in enumerate(rows, start=1):
-        ts = str(r.time_start or '')
-        te = str(r.time_end or '')
-        period = f"{ts}–{te}" if te else ts
-
-        if role == 'student':
-            parts = [f"{i}. <b>{period}</b> | {r.subject or ''}"]
-            if r.teacher:
-                parts.append(f"📚<b>Преподаватель:</b> {r.teacher}")
-            if r.cabinet:
-                parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
-        elif role == 'teacher':
-            parts = [f"{i}. <b>{period}</b> | {r.subject or ''}"]
-            if r.class_name:
-                parts.append(f"🧒🏼<b>Класс:</b> {r.class_name}")
-            if r.cabinet:
-                parts.append(f"🏫<b>Кабинет:</b> {r.cabinet}")
-        else:
-            parts = [f"{i}. {period} | {r.subject or ''}"]
-
-        lines.append("\n".join(parts))
-
+    lines = [format_lesson(r, role, f"{i}. ") for i, r in enumerate(rows, start=1)]
     return "\n\n".join(lines) if lines else "Нет занятий на выбранный день."
 
 
-def format_schedule_with_header(rows, role, date_obj):
+def format_schedule_with_header(rows, role, date_obj, holiday=None):
     weekday_en = date_obj.strftime("%A")
     weekday_ru = {
         "Monday": "Понедельник",
@@ -251,53 +427,90 @@ def format_schedule_with_header(rows, role, date_obj):
     }[weekday_en]
 
     header = f"<b>{weekday_ru}. {date_obj.strftime('%d.%m')}</b>"
-    schedule_text = format_schedule_rows(rows, role)
+    if holiday is not None:
+        schedule_text = f"Занятий нет: {holiday}" if holiday else "Занятий нет (выходной)."
+    else:
+        schedule_text = format_schedule_rows(rows, role)
 
     return f"{header}\n{schedule_text}"
 
 
+def render_schedule_day(role, owner, date_obj, index=None, tenant=DEFAULT_TENANT):
+    """HTML-расписание на дату для класса/учителя owner школы tenant. Текст зависит только от
+       (role, owner, date) и данных индекса, поэтому берётся из кэша отрисовки школы."""
+    index = index or get_schedule_index(tenant)
+    render_cache = render_caches.for_tenant(index.tenant)
+    key = (role, owner, date_obj)
+    text = render_cache.get(index, key)
+    if text is None:
+        rows = index.for_date(role, owner, date_obj)
+        text = format_schedule_with_header(rows, role, date_obj, index.holiday(date_obj))
+        render_cache.put(index, key, text)
+    return text
+
+
+def warm_render_cache(index):
+    """Заранее отрисовывает текущую неделю для всех учителей и классов из индекса."""
+    today = datetime.today().date()
+    monday = today - timedelta(days=today.isoweekday() - 1)
+    for offset in range(len(WEEKDAYS_RU)):
+        date_obj = monday + timedelta(days=offset)
+        for teacher in index.teachers():
+            render_schedule_day('teacher', teacher, date_obj, index)
+        for class_name in index.classes():
+            render_schedule_day('student', class_name, date_obj, index)
+
+
+def load_schedule(tenant=None):
+    """Пересобирает индекс расписания школы tenant (None — всех школ в базе)
+       и при RENDER_CACHE_WARM=1 прогревает кэш отрисовки."""
+    indexes = reload_all_schedule_indexes() if tenant is None else [reload_schedule_index(tenant)]
+    if RENDER_CACHE_WARM:
+        for index in indexes:
+            warm_render_cache(index)
+    return indexes
+
+
+@instrument_handler("handle_menu_choice")
 async def handle_menu_choice(update: Update, context: ContextTypes.DEFAULT_TYPE): 
     text = update.message.text.strip()
-    user = get_user_by_telegram(update.effective_user.id)
+    user = await db_get_user_by_telegram(update.effective_user.id)
     if not user:
         await update.message.reply_text("Сначала /login")
         return
 
+    index = get_schedule_index(user.tenant_id)
+
     # Сегодня
     if text == "На сегодня":
         date_obj = datetime.today().date()
-        weekday_ru = ru_weekday_from_isoweekday(date_obj.isoweekday())
-        if not weekday_ru:
+        # в выходной показываем расписание, только если на этот день добавлены уроки
+        if not ru_weekday_from_isoweekday(date_obj.isoweekday()) \
+                and not index.for_date(user.role, user.name_tuter, date_obj):
             await update.message.reply_text("Сегодня выходной.")
             return
 
     # Завтра
     elif text == "На завтра":
         date_obj = (datetime.today() + timedelta(days=1)).date()
-        weekday_ru = ru_weekday_from_isoweekday(date_obj.isoweekday())
-        if not weekday_ru:
+        if not ru_weekday_from_isoweekday(date_obj.isoweekday()) \
+                and not index.for_date(user.role, user.name_tuter, date_obj):
             await update.message.reply_text("Завтра выходной.")
             return
 
     # Неделя
     elif text == "На неделю":
-        for offset, d in enumerate(["ПН","ВТ","СР","ЧТ","ПТ"]):
-            # определяем дату для каждого дня
-            today = datetime.today()
-            weekday_num = today.isoweekday()
-            delta = offset - (weekday_num - 1)
-            date_obj = (today + timedelta(days=delta)).date()
-
-            if user.role == 'teacher':
-                rows = get_schedule_for_teacher(user.name_tuter, d)
-            else:
-                rows = get_schedule_for_class(user.name_tuter, d)
-
-            if rows:
-                await update.message.reply_text(
-                    text=format_schedule_with_header(rows, user.role, date_obj),
-                    parse_mode="HTML"
-                )
+        # понедельник текущей недели; дни без уроков пропускаются, праздничные будни показываются
+        monday = datetime.today().date() - timedelta(days=datetime.today().isoweekday() - 1)
+        days = [monday + timedelta(days=offset) for offset in range(7)]
+        blocks = [
+            render_schedule_day(user.role, user.name_tuter, d, index)
+            for d in days
+            if index.for_date(user.role, user.name_tuter, d)
+            or (index.holiday(d) is not None and ru_weekday_from_isoweekday(d.isoweekday()))
+        ]
+        for message in pack_messages(blocks):
+            await update.message.reply_text(text=message, parse_mode="HTML")
         return
 
     # Конкретный день (ПН–ПТ)
@@ -307,7 +520,25 @@ async def handle_menu_choice(update: Update, context: ContextTypes.DEFAULT_TYPE)
         target_num = ["ПН","ВТ","СР","ЧТ","ПТ"].index(text) + 1
         delta = target_num - weekday_num
         date_obj = (today + timedelta(days=delta)).date()
-        weekday_ru = text
+
+    # Текущий и следующий урок
+    elif text == "Следующий урок":
+        if user.role not in ('teacher', 'student'):
+            await update.message.reply_text("Команда доступна только учителям и ученикам.")
+            return
+        now = datetime.now()
+        minute = now.hour * 60 + now.minute
+        current, upcoming = index.lessons_at(user.role, user.name_tuter, now.date(), minute)
+        blocks = []
+        if current:
+            blocks.append(format_lesson(current, user.role, "<b>Сейчас:</b> "))
+        if upcoming:
+            blocks.append(format_lesson(upcoming, user.role, "<b>Далее:</b> "))
+        await update.message.reply_text(
+            text="\n\n".join(blocks) if blocks else "Сегодня уроков больше нет.",
+            parse_mode="HTML",
+        )
+        return
 
     elif text == "Выйти":
         await cmd_logout(update, context)
@@ -316,189 +547,333 @@ async def handle_menu_choice(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Команда не распознана. Используйте кнопки.")
         return
 
-    # Загружаем расписание
-    if user.role == 'teacher':
-        rows = get_schedule_for_teacher(user.name_tuter, weekday_ru)
-    elif user.role == 'student':
-        rows = get_schedule_for_class(user.name_tuter, weekday_ru)
-    else:
+    if user.role not in ('teacher', 'student'):
         await update.message.reply_text("Команда доступна только учителям и ученикам.")
         return
 
     await update.message.reply_text(
-        text=format_schedule_with_header(rows, user.role, date_obj),
+        text=render_schedule_day(user.role, user.name_tuter, date_obj, index),
         parse_mode="HTML"
     )
 
 
 
 # ===================== Загрузка файла расписания (для админа) =====================
+# каталог создаётся при первой загрузке (ImportLock.acquire), а не при импорте модуля
 UPLOADS_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOADS_DIR, exist_ok=True)
 
-import uuid
-import pandas as pd
-from sqlalchemy.orm import Session
 
+def tenant_uploads_dir(tenant):
+    """Свой подкаталог у каждой школы: файлы и блокировки импорта разных школ не пересекаются."""
+    return os.path.join(UPLOADS_DIR, re.sub(r"[^\w-]", "_", tenant))
 
-def normalize_class(value):
-    """Нормализация значения класса"""
-    if pd.isna(value) or str(value).strip() == "":
-        return None
+
+def import_lock_for(tenant):
+    """Одновременно идёт не больше одного импорта на школу; разные школы загружают параллельно."""
+    return ImportLock(os.path.join(tenant_uploads_dir(tenant), ".import.lock"))
+
+
+def import_schedule_file(local_path, progress=None, tenant=DEFAULT_TENANT, on_conflict="warn"):
+    """Разбирает файл и заменяет расписание школы tenant. Выполняется в пуле потоков.
+       on_conflict="reject" — при накладках ScheduleConflictError, расписание не меняется."""
+    # pandas/openpyxl нужны только здесь — загружаются при первой загрузке файла
+    from schedule_reader import read_schedule_chunks
+    from schedule_import import sync_schedule
+
+    # заголовок проверяется сразу, данные читаются потоково по кускам
+    chunks = read_schedule_chunks(local_path)
+
+    s = SessionLocal()
     try:
-        # Если это число, убираем .0
-        return str(int(float(value)))
-    except (ValueError, TypeError):
-        # Если это строка (например, "11А")
-        return str(value).strip()
+        # меняются только отличающиеся строки, всё в одной транзакции
+        result = sync_schedule(s, chunks, progress, tenant, on_conflict)
+        s.commit()
+    except Exception:
+        s.rollback()
+        raise
+    finally:
+        s.close()
+    load_schedule(tenant)
+    publish_schedule_change(tenant)
+    return result
 
 
-def normalize_teacher(value):
-    """Нормализация ФИО преподавателя"""
-    if pd.isna(value) or str(value).strip() == "":
-        return None  # допускаем пустого учителя
-    return str(value).strip()
+def publish_schedule_change(tenant):
+    """Остальные воркеры (PERSISTENCE_URL) увидят новую версию и пересоберут свой индекс."""
+    store = get_state_store()
+    if store is not None:
+        version = uuid.uuid4().hex
+        publish_schedule_version(store, tenant, version)
+        schedule_versions[tenant] = version
 
 
+@instrument_handler("handle_document")
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = get_user_by_telegram(update.effective_user.id)
+    user = await db_get_user_by_telegram(update.effective_user.id)
     if not user or user.role != 'admin':
         await update.message.reply_text("Доступ запрещён. Только администратор может загружать расписание.")
         return
 
     doc = update.message.document
     if not doc:
-        await update.message.reply_text("Отправьте файл .xlsx")
+        await update.message.reply_text("Отправьте файл .xlsx или .csv")
+        return
+    if doc.file_name.lower().endswith(".xls"):
+        await update.message.reply_text(LEGACY_EXCEL_MESSAGE)
         return
-    if not (doc.file_name.endswith(".xlsx") or doc.file_name.endswith(".xls")):
-        await update.message.reply_text("Нужен файл .xlsx")
+    if not doc.file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+        await update.message.reply_text("Нужен файл .xlsx или .csv")
         return
 
-    local_path = os.path.join(UPLOADS_DIR, doc.file_name)
-    file = await doc.get_file()
-    await file.download_to_drive(custom_path=local_path)
+    tenant = user.tenant_id
+    on_conflict = conflict_policy(update.message.caption)
+    import_lock = import_lock_for(tenant)
+    if not import_lock.acquire(owner=user.name_tuter):
+        await update.message.reply_text(
+            f"Уже идёт загрузка расписания ({import_lock.holder() or 'другой администратор'}). "
+            "Дождитесь её окончания."
+        )
+        return
 
-    df = pd.read_excel(local_path)
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    local_path = os.path.join(tenant_uploads_dir(tenant), os.path.basename(doc.file_name))
 
-    required_columns = {'subject', 'weekday', 'time_start', 'class_name'}
-    if not required_columns.issubset(df.columns):
-        raise ValueError(
-            f"В файле нет обязательных колонок: {required_columns - set(df.columns)}. "
-            f"Найдены: {list(df.columns)}"
-        )
+    async def download():
+        file = await doc.get_file()
+        await file.download_to_drive(custom_path=local_path)
 
-    def normalize_class_name(val):
-        """Нормализует значение класса: 9.0 -> '9', 10 -> '10', '9А' остаётся '9А'"""
-        import math
-        if pd.isna(val):
-            return None
-        if isinstance(val, int):
-            return str(val)
-        if isinstance(val, float):
-            if math.isfinite(val) and val.is_integer():
-                return str(int(val))
-            return str(val).strip()
-        s = str(val).strip()
-        try:
-            f = float(s.replace(',', '.'))
-            if f.is_integer():
-                return str(int(f))
-        except Exception:
-            pass
-        return s
-
-    import datetime as _dt
-
-    def to_time(val):
-        if pd.isna(val):
-            return None
-        if hasattr(val, 'time'):
-            return val.time()
-        if isinstance(val, _dt.time):
-            return val
-        try:
-            return pd.to_datetime(val).time()
-        except Exception:
-            return None
+    try:
+        status_message = await update.message.reply_text("Загрузка расписания: в очереди")
+    except Exception:
+        import_lock.release()
+        raise
+    # импорт идёт фоновой задачей: обработчик сразу возвращается, бот отвечает остальным
+    context.application.create_task(
+        run_import_job(
+            status_message, download,
+            lambda progress: import_schedule_file(local_path, progress, tenant, on_conflict),
+            import_lock,
+        ),
+        update=update,
+    )
 
-    s = SessionLocal()
+
+# ===================== Замены и праздники (для админа) =====================
+CHANGE_USAGE = (
+    "Формат:\n"
+    "/change ДД.ММ.ГГГГ класс ЧЧ:ММ предмет | учитель | кабинет — замена (пустое поле — как в расписании)\n"
+    "/change ДД.ММ.ГГГГ класс ЧЧ:ММ - — отмена урока\n"
+    "/change ДД.ММ.ГГГГ класс ЧЧ:ММ — вернуть урок по расписанию"
+)
+HOLIDAY_USAGE = (
+    "Формат:\n"
+    "/holiday ДД.ММ.ГГГГ[-ДД.ММ.ГГГГ] [название] — праздник или каникулы\n"
+    "/holiday ДД.ММ.ГГГГ - — удалить праздник, начинающийся в этот день"
+)
+
+
+async def get_admin(update):
+    user = await db_get_user_by_telegram(update.effective_user.id)
+    if not user or user.role != 'admin':
+        await update.message.reply_text("Доступ запрещён. Команда только для администратора.")
+        return None
+    return user
+
+
+async def apply_calendar_change(tenant):
+    """Подмешивает изменения в индекс школы: недельное расписание не перечитывается."""
+    await run_db(reload_schedule_calendar, tenant)
+    await run_db(publish_schedule_change, tenant)
+
+
+@instrument_handler("cmd_change")
+async def cmd_change(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = await get_admin(update)
+    if not user:
+        return
+    # учитель — ФИО с пробелами, поэтому разбираем текст, а не context.args
+    parts = update.message.text.split(maxsplit=4)
     try:
-        # очищаем старое расписание
-        s.query(Schedule).delete()
-        s.commit()
+        date_obj = parse_date(parts[1])
+        class_name = parts[2]
+        time_start = to_minutes(parts[3])
+    except (IndexError, ValueError):
+        await update.message.reply_text(CHANGE_USAGE)
+        return
+    rest = parts[4].strip() if len(parts) > 4 else ""
+
+    lesson, cancel = None, rest == "-"
+    if rest and not cancel:
+        fields = [f.strip() or None for f in rest.split("|")] + [None, None]
+        lesson = tuple(fields[:3])
+    found = await run_db(set_lesson_change, user.tenant_id, date_obj, class_name, time_start, lesson, cancel)
+    await apply_calendar_change(user.tenant_id)
+
+    day, hhmm = date_obj.strftime(DATE_FORMAT), format_minutes(time_start)
+    if cancel:
+        text = f"{day}, {class_name}, {hhmm}: урок отменён." if found else \
+            f"{day}, {class_name}, {hhmm}: по расписанию урока нет — отменять нечего."
+    elif lesson:
+        text = f"{day}, {class_name}, {hhmm}: замена сохранена" + ("." if found else " (дополнительный урок).")
+    else:
+        text = f"{day}, {class_name}, {hhmm}: урок идёт по расписанию."
+    await update.message.reply_text(text)
 
-        for _, row in df.iterrows():
-            ts = to_time(row.get('time_start'))
-            te = to_time(row.get('time_end')) if 'time_end' in df.columns else None
-            class_name_normalized = normalize_class_name(row.get('class_name'))
-
-            # обработка teacher
-            teacher_value = row.get('teacher')
-            teacher_value = None if pd.isna(teacher_value) else str(teacher_value).strip()
-
-            teachers = []
-            if teacher_value:
-                tv = teacher_value.lower()
-                if tv == "все":
-                    teachers = s.query(User).filter(User.role == 'teacher').all()
-                elif tv == "младшая школа":
-                    teachers = s.query(User).filter(User.role == 'teacher', User.is_junior == True).all()
-                elif tv == "старшая школа":
-                    teachers = s.query(User).filter(User.role == 'teacher', User.is_senior == True).all()
-                else:
-                    t = s.query(User).filter(User.role == 'teacher', User.name_tuter == teacher_value).first()
-                    teachers = [t] if t else []
-
-            # если есть учителя → создаём записи для каждого
-            if teachers:
-                for t in teachers:
-                    sch = Schedule(
-                        id=str(uuid.uuid4()),
-                        time_start=ts.strftime("%H:%M") if ts else None,
-                        time_end=te.strftime("%H:%M") if te else None,
-                        cabinet=None if pd.isna(row.get('cabinet')) else str(row.get('cabinet')).strip(),
-                        teacher=t.name_tuter if t else None,
-                        class_name=class_name_normalized,
-                        weekday=str(row.get('weekday')).strip() if not pd.isna(row.get('weekday')) else None,
-                        subject=str(row.get('subject')).strip() if not pd.isna(row.get('subject')) else None
-                    )
-                    s.add(sch)
-            else:
-                # даже если teacher нет или не найден → сохраняем строку без учителя
-                sch = Schedule(
-                    id=str(uuid.uuid4()),
-                    time_start=ts.strftime("%H:%M") if ts else None,
-                    time_end=te.strftime("%H:%M") if te else None,
-                    cabinet=None if pd.isna(row.get('cabinet')) else str(row.get('cabinet')).strip(),
-                    teacher=None,
-                    class_name=class_name_normalized,
-                    weekday=str(row.get('weekday')).strip() if not pd.isna(row.get('weekday')) else None,
-                    subject=str(row.get('subject')).strip() if not pd.isna(row.get('subject')) else None
-                )
-                s.add(sch)
 
-        s.commit()
-        await update.message.reply_text("Расписание загружено и таблица обновлена.")
-    except Exception as e:
-        s.rollback()
-        await update.message.reply_text(f"Ошибка при загрузке: {e}")
-    finally:
-        s.close()
+@instrument_handler("cmd_holiday")
+async def cmd_holiday(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = await get_admin(update)
+    if not user:
+        return
+    try:
+        date_start, date_end = parse_date_range(context.args[0])
+    except (IndexError, ValueError):
+        await update.message.reply_text(HOLIDAY_USAGE)
+        return
+    title = " ".join(context.args[1:]).strip()
+
+    if title == "-":
+        deleted = await run_db(delete_holidays, user.tenant_id, date_start)
+        text = f"Удалено праздников: {deleted}."
+    else:
+        await run_db(add_holiday, user.tenant_id, date_start, date_end, title or None)
+        period = date_start.strftime(DATE_FORMAT)
+        if date_end != date_start:
+            period += f"–{date_end.strftime(DATE_FORMAT)}"
+        text = f"{period}: занятий нет" + (f" ({title})." if title else ".")
+    await apply_calendar_change(user.tenant_id)
+    await update.message.reply_text(text)
 
 
 
 # ===================== Запуск бота =====================
 load_dotenv()
-TOKEN = os.getenv("BOT_TOKEN")
+logger = logging.getLogger(__name__)
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+# сколько обновлений обрабатывается параллельно (1 — строго по очереди)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "1"))
+# Номер воркера при нескольких процессах за router.py: рассылку ставит только воркер 0
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+# WORKER_INDEX задан — процесс работает за router.py
+SHARDED = os.getenv("WORKER_INDEX") is not None
+# как часто воркер проверяет, не загрузил ли другой воркер новое расписание (секунды)
+SCHEDULE_SYNC_INTERVAL = float(os.getenv("SCHEDULE_SYNC_INTERVAL", "10"))
+
+
+async def daily_broadcast_job(context: ContextTypes.DEFAULT_TYPE):
+    """Утренняя рассылка расписания на сегодня всем привязанным учителям и ученикам всех школ."""
+    date_obj = datetime.today().date()
+    weekday_ru = ru_weekday_from_isoweekday(date_obj.isoweekday())
+    if not weekday_ru:
+        return
+    recipients = await run_db(load_recipients)
+    indexes = {}  # один снимок индекса на школу на всю рассылку
+
+    def render(tenant, role, owner):
+        index = indexes.setdefault(tenant, get_schedule_index(tenant))
+        if not index.for_date(role, owner, date_obj):
+            return None  # праздник или нет уроков — "Нет занятий" не рассылаем
+        return render_schedule_day(role, owner, date_obj, index)
+
+    report = await broadcast(context.bot, recipients, render)
+    logger.info(format_report(report))
+
+
+def schedule_daily_broadcast(app, at=DAILY_BROADCAST_TIME):
+    """Ставит рассылку в job queue на будни в at ("ЧЧ:ММ", локальное время сервера)."""
+    hours, minutes = (int(x) for x in at.split(":"))
+    tz = datetime.now().astimezone().tzinfo
+    app.job_queue.run_daily(
+        daily_broadcast_job,
+        time=dt_time(hours, minutes, tzinfo=tz),
+        days=(1, 2, 3, 4, 5),  # в PTB 20: 0 — воскресенье
+        name="daily_broadcast",
+    )
+
+
+# tenant -> версия расписания в общем хранилище, по которой собран локальный индекс
+schedule_versions = {}
+
+
+async def sync_schedule_job(context: ContextTypes.DEFAULT_TYPE):
+    """Пересобирает индексы школ, расписание которых загрузил другой воркер."""
+    versions = await run_db(load_schedule_versions, get_state_store())
+    for tenant, version in versions.items():
+        if schedule_versions.get(tenant) != version:
+            await run_db(load_schedule, tenant)
+            schedule_versions[tenant] = version
+
+
+async def save_login_throttle_job(context: ContextTypes.DEFAULT_TYPE):
+    """Счётчики попыток входа на диск — в пуле потоков, а не в обработчике неудачного входа."""
+    await run_db(login_throttle.save_if_dirty)
 
-app = ApplicationBuilder().token(TOKEN).build()
 
-app.add_handler(CommandHandler("start", cmd_start))
-app.add_handler(login_conv)
-app.add_handler(CommandHandler("logout", cmd_logout))
-app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu_choice))
+def add_handlers(app):
+    app.add_handler(CommandHandler("start", cmd_start))
+    app.add_handler(make_login_conv(persistent=app.persistence is not None))
+    app.add_handler(CommandHandler("logout", cmd_logout))
+    app.add_handler(CommandHandler("notify", cmd_notify))
+    app.add_handler(CommandHandler("change", cmd_change))
+    app.add_handler(CommandHandler("holiday", cmd_holiday))
+    app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu_choice))
+
+
+async def close_db(app):
+    """post_shutdown: async-движок держит потоки aiosqlite — без dispose процесс не завершится."""
+    if DB_ASYNC:
+        await async_db.dispose_async_engine()
+
+
+def build_app(token=None, persistence=None):
+    if SHARDED and CONCURRENT_UPDATES != 1:
+        # router.py сохраняет порядок обновлений чата только до воркера: параллельная
+        # обработка перемешала бы шаги /login и загрузку файла внутри одного чата
+        raise SystemExit("Воркеру за router.py (задан WORKER_INDEX) нужен CONCURRENT_UPDATES=1")
+    builder = (
+        ApplicationBuilder()
+        .token(token or os.getenv("BOT_TOKEN"))
+        .request(TimedRequest(HTTPXRequest(connection_pool_size=256)))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_shutdown(close_db)
+    )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    app = builder.build()
+    add_handlers(app)
+    if DAILY_BROADCAST_TIME and WORKER_INDEX == 0:
+        schedule_daily_broadcast(app)
+    if get_state_store() is not None:
+        login_throttle.store = get_state_store()  # счётчики попыток входа общие для воркеров
+        app.job_queue.run_repeating(sync_schedule_job, SCHEDULE_SYNC_INTERVAL, name="sync_schedule")
+    if LOGIN_THROTTLE_FILE:
+        app.job_queue.run_repeating(save_login_throttle_job, LOGIN_THROTTLE_SAVE_INTERVAL, name="save_login_throttle")
+    return app
+
+
+def main():
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s", level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # иначе строка лога на каждый запрос к API
+    persistence = make_persistence()
+    app = build_app(persistence=persistence)
+    if get_state_store() is not None:
+        # версии читаются до сборки индексов: загрузка между ними не потеряется
+        schedule_versions.update(load_schedule_versions(get_state_store()))
+    load_schedule()
+    if METRICS_PORT:
+        start_metrics_server()
+
+    print("Бот запущен")
+    try:
+        if BOT_MODE == "webhook":
+            import asyncio
+            from webhook import serve_webhook
+            asyncio.run(serve_webhook(app))
+        else:
+            app.run_polling()
+    finally:
+        login_throttle.save()  # при LOGIN_THROTTLE_FILE — счётчики попыток входа на диск
+
 
-print("Бот запущен")
-app.run_polling()
+if __name__ == "__main__":
+    main()
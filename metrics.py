@@ -0,0 +1,279 @@
+# metrics.py
+# Инструментирование горячих путей: время обработчиков, запросы к БД на один update,
+# задержка вызовов Bot API. Метрики отдаются в формате Prometheus на локальном порту:
+#   METRICS_PORT=9100 python main.py  ->  curl http://127.0.0.1:9100/metrics
+import os
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from telegram.request import BaseRequest
+
+from blocking import blocking_stats
+from user_cache import user_cache
+from render_cache import render_caches
+from schedule_index import index_stats
+from login_throttle import login_throttle, hash_gate
+
+load_dotenv()
+
+# не задан — HTTP-эндпоинт не поднимается (сами метрики всё равно собираются)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# ===================== Типы метрик =====================
+def _labels_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for n, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{n}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {v}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [счётчики по корзинам..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(n, "") for n in self.labelnames))
+        return series[-1] if series else 0
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_labels_text(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels_text(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def _gauge_lines(name, help_text, labelname, values):
+    """values: {значение метки: {поле: число}} -> name_поле{labelname="..."}"""
+    lines = []
+    fields = sorted({f for v in values.values() for f in v})
+    for field in fields:
+        lines += [f"# HELP {name}_{field} {help_text}: {field}", f"# TYPE {name}_{field} gauge"]
+        for label, v in sorted(values.items()):
+            if field in v:
+                lines.append(f"{name}_{field}{_labels_text((labelname,), (label,))} {v[field]}")
+    return lines
+
+
+# tenant — школа пользователя ("" — пользователь ещё не определён, например не вошёл)
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время обработчика", ["handler", "tenant"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках", ["handler", "tenant"])
+DB_QUERY_SECONDS = Histogram("bot_db_query_seconds", "Время одного SQL-запроса")
+DB_QUERIES_PER_UPDATE = Histogram("bot_db_queries_per_update", "SQL-запросов на один update",
+                                  ["handler", "tenant"], buckets=COUNT_BUCKETS)
+DB_SECONDS_PER_UPDATE = Histogram("bot_db_seconds_per_update", "Время в БД на один update",
+                                  ["handler", "tenant"])
+TELEGRAM_API_SECONDS = Histogram("bot_telegram_api_seconds", "Задержка вызова Bot API", ["method"])
+TELEGRAM_API_ERRORS = Counter("bot_telegram_api_errors_total", "Ошибки вызова Bot API", ["method"])
+PASSWORD_VERIFY_SECONDS = Histogram("bot_password_verify_seconds", "Проверка пароля (хеш)")
+
+REGISTRY = [HANDLER_SECONDS, HANDLER_ERRORS, DB_QUERY_SECONDS, DB_QUERIES_PER_UPDATE,
+            DB_SECONDS_PER_UPDATE, TELEGRAM_API_SECONDS, TELEGRAM_API_ERRORS, PASSWORD_VERIFY_SECONDS]
+
+
+def render_metrics():
+    """Текст в формате Prometheus: все метрики REGISTRY + состояние пулов, кэшей и защиты входа."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.collect()
+    lines += _gauge_lines("bot_blocking_pool", "Пул потоков", "pool", blocking_stats())
+    lines += _gauge_lines("bot_cache", "Кэш", "cache", {"user": user_cache.stats()})
+    lines += _gauge_lines("bot_render_cache", "Кэш отрисовки", "tenant", render_caches.stats())
+    lines += _gauge_lines("bot_schedule_index", "Индекс расписания", "tenant", index_stats())
+    lines += _gauge_lines("bot_login", "Защита входа", "guard",
+                          {"throttle": login_throttle.stats(), "hash_gate": hash_gate.stats()})
+    return "\n".join(lines) + "\n"
+
+
+# ===================== Обработчики и БД =====================
+class UpdateStats:
+    __slots__ = ("queries", "db_seconds", "tenant")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.tenant = ""
+
+
+# Статистика текущего update. Запросы из пула потоков попадают сюда, потому что
+# BlockingPool.run переносит contextvars в рабочий поток.
+current_update = contextvars.ContextVar("current_update", default=None)
+
+
+def tag_tenant(tenant):
+    """Относит метрики текущего update к школе (вызывается, когда пользователь определён)."""
+    stats = current_update.get()
+    if stats is not None:
+        stats.tenant = tenant
+
+
+def instrument_handler(name):
+    """Декоратор async-обработчика: время, исключения и SQL-запросы за один вызов."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            stats = UpdateStats()
+            token = current_update.set(stats)
+            t0 = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name, tenant=stats.tenant)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - t0, handler=name, tenant=stats.tenant)
+                DB_QUERIES_PER_UPDATE.observe(stats.queries, handler=name, tenant=stats.tenant)
+                DB_SECONDS_PER_UPDATE.observe(stats.db_seconds, handler=name, tenant=stats.tenant)
+                current_update.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = current_update.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # запрос упал — after_cursor_execute не придёт, убираем его отметку
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+# ===================== Bot API =====================
+class TimedRequest(BaseRequest):
+    """Обёртка над транспортом Bot API (HTTPXRequest, FakeRequest ...), замеряющая каждый вызов."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        api_method = "file" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        t0 = time.perf_counter()
+        try:
+            code, payload = await self.inner.do_request(
+                url, method, request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+        except Exception:
+            TELEGRAM_API_ERRORS.inc(method=api_method)
+            raise
+        finally:
+            TELEGRAM_API_SECONDS.observe(time.perf_counter() - t0, method=api_method)
+        if code >= 400:
+            TELEGRAM_API_ERRORS.inc(method=api_method)
+        return code, payload
+
+
+# ===================== HTTP-эндпоинт =====================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # опрос раз в несколько секунд не должен засорять вывод
+
+
+def start_metrics_server(port=METRICS_PORT, listen=METRICS_LISTEN):
+    """Поднимает /metrics в фоновом потоке — не зависит от режима (polling/webhook)
+       и отвечает, даже когда event loop занят."""
+    server = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Метрики: http://{listen}:{server.server_address[1]}/metrics")
+    return server
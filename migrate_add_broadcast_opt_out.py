@@ -0,0 +1,27 @@
+# migrate_add_broadcast_opt_out.py
+# Столбец user_sessions.daily_broadcast: отказ от утренней рассылки (/notify off).
+# Существующие сессии получают TRUE — рассылка у всех остаётся включённой.
+#   python migrate_add_broadcast_opt_out.py
+from sqlalchemy import inspect, text
+
+from init_db import engine, UserSession
+
+
+def run_migration():
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        if not existing.has_table(UserSession.__tablename__):
+            UserSession.__table__.create(bind=conn)
+            print(f"Таблица {UserSession.__tablename__} создана.")
+            return
+        columns = {c["name"] for c in existing.get_columns(UserSession.__tablename__)}
+        if "daily_broadcast" not in columns:
+            conn.execute(text(
+                f"ALTER TABLE {UserSession.__tablename__} "
+                "ADD COLUMN daily_broadcast BOOLEAN NOT NULL DEFAULT TRUE"
+            ))
+            print(f"{UserSession.__tablename__}: добавлен daily_broadcast.")
+
+
+if __name__ == "__main__":
+    run_migration()
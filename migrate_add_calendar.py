@@ -0,0 +1,29 @@
+# migrate_add_calendar.py
+# Расписание по датам: столбец schedules.week_parity, таблицы schedule_overrides и holidays.
+# Существующие уроки получают week_parity = NULL (каждую неделю) — расписание не меняется.
+#   python migrate_add_calendar.py
+from sqlalchemy import inspect, text
+
+from init_db import engine, Schedule, ScheduleOverride, Holiday
+
+NEW_TABLES = (ScheduleOverride.__table__, Holiday.__table__)
+
+
+def run_migration():
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        if not existing.has_table(Schedule.__tablename__):
+            Schedule.__table__.create(bind=conn)
+            print(f"Таблица {Schedule.__tablename__} создана.")
+        else:
+            columns = {c["name"] for c in existing.get_columns(Schedule.__tablename__)}
+            if "week_parity" not in columns:
+                conn.execute(text(f"ALTER TABLE {Schedule.__tablename__} ADD COLUMN week_parity VARCHAR"))
+                print(f"{Schedule.__tablename__}: добавлен week_parity.")
+        for table in NEW_TABLES:
+            table.create(bind=conn, checkfirst=True)
+            print(f"Таблица {table.name} создана (если ещё не было).")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,84 @@
+# migrate_add_indexes.py
+# Индексы под запросы бота и проверка по EXPLAIN, что запросы ими пользуются.
+# Индексы начинаются с tenant_id, поэтому на старой базе сначала нужен migrate_add_tenants.py;
+# остальные миграции (migrate_add_calendar.py, migrate_time_minutes.py) для проверки не обязательны.
+import sys
+from sqlalchemy import select, asc, inspect
+from init_db import engine, User, Schedule, UserSession
+
+INDEXED_TABLES = (User.__table__, Schedule.__table__, UserSession.__table__)
+
+# Запросы бота и индекс, которым каждый из них должен пользоваться. Выбираются только
+# столбцы, которые есть в базе любой версии начиная с tenant_id (не вся сущность Schedule)
+CHECKED_QUERIES = [
+    (
+        "ix_schedules_tenant_weekday_teacher_time",
+        select(Schedule.id, Schedule.time_start)
+        .where(Schedule.tenant_id == "x", Schedule.weekday == "ПН", Schedule.teacher == "x")
+        .order_by(asc(Schedule.time_start)),
+    ),
+    (
+        "ix_schedules_tenant_weekday_class_time",
+        select(Schedule.id, Schedule.time_start)
+        .where(Schedule.tenant_id == "x", Schedule.weekday == "ПН", Schedule.class_name == "x")
+        .order_by(asc(Schedule.time_start)),
+    ),
+    (
+        "ix_users_tenant_role_name_tuter",
+        select(User.id).where(User.tenant_id == "x", User.role == "teacher", User.name_tuter == "x"),
+    ),
+]
+
+
+def missing_tenant_id():
+    """Таблицы без tenant_id — для них сначала нужен migrate_add_tenants.py."""
+    existing = inspect(engine)
+    return [t.name for t in INDEXED_TABLES if existing.has_table(t.name)
+            and "tenant_id" not in {c["name"] for c in existing.get_columns(t.name)}]
+
+
+def run_migration():
+    # Создаёт недостающие индексы; данные не трогает
+    for table in INDEXED_TABLES:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+            print(f"Индекс {index.name} создан (если ещё не был).")
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + str(compiled)).fetchall()
+    return "\n".join(" ".join(str(c) for c in r) for r in rows)
+
+
+def query_uses_index(conn, index_name, stmt):
+    """(запрос идёт по index_name, план EXPLAIN)."""
+    plan = explain(conn, stmt)
+    used = index_name in plan
+    # на SQLite сортировка, которую закрывает индекс, не даёт шага TEMP B-TREE
+    if engine.dialect.name == "sqlite" and "ORDER BY" in str(stmt):
+        used = used and "TEMP B-TREE" not in plan
+    return used, plan
+
+
+def check_indexes():
+    """Проверяет по EXPLAIN, что запросы бота идут по индексам. Возвращает True, если все.
+       PostgreSQL на почти пустых таблицах может предпочесть Seq Scan — проверять на реальных данных."""
+    ok = True
+    with engine.connect() as conn:
+        for index_name, stmt in CHECKED_QUERIES:
+            used, plan = query_uses_index(conn, index_name, stmt)
+            print(("OK   " if used else "FAIL ") + index_name)
+            print("     " + plan.replace("\n", "\n     "))
+            ok = ok and used
+    return ok
+
+
+if __name__ == "__main__":
+    missing = missing_tenant_id()
+    if missing:
+        print(f"Нет tenant_id в {', '.join(missing)}: сначала выполните migrate_add_tenants.py")
+        sys.exit(1)
+    run_migration()
+    sys.exit(0 if check_indexes() else 1)
@@ -0,0 +1,104 @@
+# migrate_add_tenants.py
+# Переход на несколько школ в одной базе.
+#   python migrate_add_tenants.py
+#       добавляет tenant_id (существующие строки получают DEFAULT_TENANT) и индексы по школе
+#   python migrate_add_tenants.py --import-db sqlite:///school2/schedule_bot.db --tenant school2
+#       переносит пользователей, сессии и расписание отдельной базы школы в общую
+import re
+import sys
+import argparse
+from sqlalchemy import create_engine, inspect, text, insert
+
+from init_db import engine, DEFAULT_TENANT, User, Schedule, UserSession, to_minutes
+
+TENANT_TABLES = (User.__table__, Schedule.__table__, UserSession.__table__)
+# индексы без tenant_id, которые заменены индексами с tenant_id первым столбцом
+OLD_INDEXES = ("ix_users_role_name_tuter", "ix_schedules_weekday_teacher_time", "ix_schedules_weekday_class_time")
+
+
+def run_migration():
+    # Данные не удаляются: только новый столбец со значением по умолчанию и индексы
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for table in TENANT_TABLES:
+            if not existing.has_table(table.name):
+                table.create(bind=conn)
+                print(f"Таблица {table.name} создана.")
+                continue
+            columns = {c["name"] for c in existing.get_columns(table.name)}
+            if "tenant_id" not in columns:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN tenant_id VARCHAR NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+                ))
+                print(f"{table.name}: добавлен tenant_id = '{DEFAULT_TENANT}'.")
+        for name in OLD_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for table in TENANT_TABLES:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+                print(f"Индекс {index.name} создан (если ещё не был).")
+
+
+def _rows(conn, table, columns):
+    names = ", ".join(columns)
+    return [dict(r._mapping) for r in conn.execute(text(f"SELECT {names} FROM {table}"))]
+
+
+def _minutes_or_none(value):
+    try:
+        return to_minutes(value)
+    except ValueError:
+        return None
+
+
+def import_tenant_db(source_url, tenant):
+    """Копирует данные отдельной базы школы в общую под tenant. Пользователи, чей логин
+       уже занят, и их сессии пропускаются (логин уникален на всю базу)."""
+    source = create_engine(source_url)
+    source_tables = set(inspect(source).get_table_names())
+    with source.connect() as src:
+        users = _rows(src, "users", ["id", "login", "password_hash", "role", "name_tuter",
+                                     "is_junior", "is_senior"])
+        schedules = _rows(src, "schedules", ["id", "time_start", "time_end", "cabinet", "teacher",
+                                             "class_name", "weekday", "subject"])
+        sessions = []
+        if "user_sessions" in source_tables:
+            sessions = _rows(src, "user_sessions", ["id", "user_id", "telegram_id"])
+    source.dispose()
+
+    with engine.begin() as conn:
+        taken_logins = {r[0] for r in conn.execute(text("SELECT login FROM users"))}
+        taken_chats = {r[0] for r in conn.execute(text("SELECT telegram_id FROM user_sessions"))}
+        skipped = [u["login"] for u in users if u["login"] in taken_logins]
+        users = [dict(u, tenant_id=tenant) for u in users if u["login"] not in taken_logins]
+        user_ids = {u["id"] for u in users}
+        sessions = [dict(x, tenant_id=tenant) for x in sessions
+                    if x["user_id"] in user_ids and x["telegram_id"] not in taken_chats]
+        # в отдельных базах время могло храниться строкой "ЧЧ:ММ"
+        schedules = [dict(r, tenant_id=tenant, time_start=_minutes_or_none(r["time_start"]),
+                          time_end=_minutes_or_none(r["time_end"])) for r in schedules]
+        schedules = [r for r in schedules if r["time_start"] is not None]
+        # существующее расписание этой школы заменяется, остальные школы не затрагиваются
+        conn.execute(Schedule.__table__.delete().where(Schedule.tenant_id == tenant))
+        for table, rows in ((User.__table__, users), (UserSession.__table__, sessions),
+                            (Schedule.__table__, schedules)):
+            if rows:
+                conn.execute(insert(table), rows)
+
+    print(f"Школа {tenant}: пользователей {len(users)}, сессий {len(sessions)}, строк расписания {len(schedules)}.")
+    if skipped:
+        print(f"Пропущены пользователи с занятыми логинами ({len(skipped)}): {', '.join(sorted(skipped))}")
+    return len(skipped) == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграция на несколько школ в одной базе")
+    parser.add_argument("--import-db", help="URL отдельной базы школы, которую нужно перенести")
+    parser.add_argument("--tenant", help="tenant_id для переносимой школы")
+    args = parser.parse_args()
+
+    run_migration()
+    if args.import_db:
+        if not args.tenant or not re.fullmatch(r"[\w-]+", args.tenant):
+            parser.error("--import-db требует --tenant из букв, цифр, _ и -")
+        sys.exit(0 if import_tenant_db(args.import_db, args.tenant) else 1)
@@ -0,0 +1,115 @@
+# migrate_time_minutes.py
+# Время уроков: строки "ЧЧ:ММ" -> целые минуты от полуночи (schedules и schedule_overrides).
+# Старая таблица не удаляется, а переименовывается в <таблица>_hhmm: откат — удалить новую
+# и переименовать копию обратно. Перед этим нужны migrate_add_tenants.py и migrate_add_calendar.py.
+#   python migrate_time_minutes.py
+#   python migrate_time_minutes.py --drop-backup      # когда бот проверен на новой схеме
+import sys
+import argparse
+from sqlalchemy import MetaData, Table, Integer, inspect, text, select, insert
+
+from init_db import engine, to_minutes, Schedule, ScheduleOverride
+
+TABLES = (Schedule.__table__, ScheduleOverride.__table__)
+BATCH = 5000
+
+
+def backup_name(table):
+    return f"{table.name}_hhmm"
+
+
+def _convert(row, columns):
+    """Строка старой таблицы -> строка новой; None, если время начала не разобрать."""
+    row = {c: row[c] for c in columns}
+    try:
+        row["time_start"] = to_minutes(row["time_start"])
+    except ValueError:
+        return None
+    try:
+        row["time_end"] = to_minutes(row["time_end"])
+    except ValueError:
+        row["time_end"] = None
+    return row if row["time_start"] is not None else None
+
+
+def _copy_rows(conn, source, target, columns):
+    copied = skipped = 0
+    batch = []
+    for row in conn.execute(select(*[source.c[c] for c in columns])).mappings():
+        new_row = _convert(row, columns)
+        if new_row is None:
+            skipped += 1
+            continue
+        batch.append(new_row)
+        if len(batch) >= BATCH:
+            conn.execute(insert(target), batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(target), batch)
+        copied += len(batch)
+    return copied, skipped
+
+
+def migrate_table(existing, table):
+    if not existing.has_table(table.name):
+        table.create(bind=engine)
+        print(f"Таблица {table.name} создана.")
+        return True
+    old_columns = {c["name"]: c["type"] for c in existing.get_columns(table.name)}
+    if isinstance(old_columns["time_start"], Integer):
+        print(f"{table.name}: время уже в минутах.")
+        return True
+    backup = backup_name(table)
+    if existing.has_table(backup):
+        print(f"{table.name}: уже есть {backup} от прошлого запуска — разберитесь с ней вручную.")
+        return False
+
+    # сначала данные копируются в промежуточную таблицу: если копирование прервётся,
+    # старая таблица останется на месте (DDL в SQLite не всегда откатывается вместе с данными)
+    staging = table.to_metadata(MetaData(), name=f"{table.name}_minutes")
+    staging.indexes.clear()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+        staging.create(bind=conn, checkfirst=True)
+        source = Table(table.name, MetaData(), autoload_with=conn)
+        columns = [c.name for c in table.columns if c.name in old_columns]
+        copied, skipped = _copy_rows(conn, source, staging, columns)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {backup}"))
+        # индексы переехали вместе со старой таблицей, а их имена нужны новой
+        for index in table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text(f"ALTER TABLE {staging.name} RENAME TO {table.name}"))
+        for index in table.indexes:
+            index.create(bind=conn)
+
+    print(f"{table.name}: перенесено {copied} строк, копия — {backup}.")
+    if skipped:
+        print(f"{table.name}: {skipped} строк с нераспознанным временем начала остались только в {backup}.")
+    return True
+
+
+def run_migration():
+    existing = inspect(engine)
+    return all([migrate_table(existing, table) for table in TABLES])
+
+
+def drop_backups():
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for table in TABLES:
+            if existing.has_table(backup_name(table)):
+                conn.execute(text(f"DROP TABLE {backup_name(table)}"))
+                print(f"Удалена {backup_name(table)}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Время уроков в минутах от полуночи")
+    parser.add_argument("--drop-backup", action="store_true", help="удалить копии *_hhmm")
+    args = parser.parse_args()
+    if args.drop_backup:
+        drop_backups()
+        sys.exit(0)
+    sys.exit(0 if run_migration() else 1)
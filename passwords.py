@@ -0,0 +1,114 @@
+# passwords.py
+# Политика хеширования паролей: схема и стоимость задаются в .env, старые хеши
+# (другая схема или меньшая стоимость) пересчитываются при успешном входе.
+#   python passwords.py --calibrate               # подобрать стоимость под PASSWORD_VERIFY_BUDGET_MS
+#   python passwords.py --calibrate --target-ms 150
+import os
+import sys
+import time
+import argparse
+import statistics
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# bcrypt | pbkdf2_sha256 | sha256_crypt | argon2 (нужен пакет argon2-cffi)
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+PASSWORD_ROUNDS = os.getenv("PASSWORD_ROUNDS")  # не задано — значение passlib по умолчанию
+# сколько должна занимать одна проверка пароля на этой машине (цель для --calibrate)
+PASSWORD_VERIFY_BUDGET_MS = float(os.getenv("PASSWORD_VERIFY_BUDGET_MS", "250"))
+
+# параметр стоимости у каждой схемы и как от него растёт время
+COST_SETTINGS = {
+    "bcrypt": ("rounds", "log2"),          # +1 — вдвое дольше
+    "pbkdf2_sha256": ("rounds", "linear"),
+    "sha256_crypt": ("rounds", "linear"),
+    "argon2": ("time_cost", "linear"),
+}
+# хеши в этих схемах продолжают проверяться, но при входе заменяются на PASSWORD_SCHEME
+LEGACY_SCHEMES = ["bcrypt"]
+
+
+def make_context(scheme=PASSWORD_SCHEME, rounds=PASSWORD_ROUNDS):
+    if scheme not in COST_SETTINGS:
+        raise ValueError(f"Неизвестная схема хеширования: {scheme}")
+    schemes = [scheme] + [s for s in LEGACY_SCHEMES if s != scheme]
+    settings = {}
+    if rounds:
+        setting, _ = COST_SETTINGS[scheme]
+        # min_rounds: хеш с меньшей стоимостью считается устаревшим и пересчитывается
+        settings[f"{scheme}__{setting}"] = int(rounds)
+        settings[f"{scheme}__min_{setting}"] = int(rounds)
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+pwd_context = make_context()
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(password: str, password_hash: str):
+    """(пароль верен, новый хеш). Новый хеш не None, если старый не соответствует политике."""
+    try:
+        return pwd_context.verify_and_update(password, password_hash)
+    except (ValueError, TypeError):
+        return False, None  # испорченный или неизвестный формат хеша
+
+
+# ===================== Калибровка =====================
+def measure_verify(context, samples=3):
+    password = "calibration-password"
+    password_hash = context.hash(password)
+    times = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        context.verify(password, password_hash)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def calibrate(scheme=PASSWORD_SCHEME, target_ms=PASSWORD_VERIFY_BUDGET_MS):
+    """Наибольшая стоимость, при которой проверка укладывается в target_ms. -> (стоимость, мс)."""
+    setting, growth = COST_SETTINGS[scheme]
+    handler = make_context(scheme).handler(scheme)
+    cost = getattr(handler, f"default_{setting}")
+    elapsed = measure_verify(make_context(scheme, cost)) * 1000
+    if growth == "log2":
+        low, high = handler.min_rounds, handler.max_rounds
+        # шаг вниз/вверх по степеням двойки, пока не окажемся прямо под целью
+        while elapsed > target_ms and cost > low:
+            cost -= 1
+            elapsed = measure_verify(make_context(scheme, cost)) * 1000
+        while cost < high:
+            next_ms = measure_verify(make_context(scheme, cost + 1)) * 1000
+            if next_ms > target_ms:
+                break
+            cost, elapsed = cost + 1, next_ms
+    else:
+        # время линейно по стоимости — пересчитываем пропорционально и проверяем
+        cost = max(1, int(cost * target_ms / elapsed))
+        elapsed = measure_verify(make_context(scheme, cost)) * 1000
+    return cost, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Политика хеширования паролей")
+    parser.add_argument("--calibrate", action="store_true", help="подобрать стоимость под целевое время")
+    parser.add_argument("--scheme", default=PASSWORD_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_VERIFY_BUDGET_MS)
+    args = parser.parse_args()
+
+    if not args.calibrate:
+        handler = pwd_context.handler()
+        setting, _ = COST_SETTINGS[handler.name]
+        print(f"Схема: {handler.name}, {setting}: {getattr(handler, setting, None) or getattr(handler, 'default_' + setting)}")
+        print(f"Проверка пароля: {measure_verify(pwd_context) * 1000:.0f} мс")
+        sys.exit(0)
+
+    cost, elapsed = calibrate(args.scheme, args.target_ms)
+    print(f"Проверка пароля {elapsed:.0f} мс при цели {args.target_ms:.0f} мс. В .env:")
+    print(f"PASSWORD_SCHEME={args.scheme}")
+    print(f"PASSWORD_ROUNDS={cost}")
@@ -0,0 +1,187 @@
+# persistence.py
+# Состояние диалогов (login_conv) и context.user_data вне памяти процесса, чтобы бот
+# переживал перезапуск и несколько воркеров могли подменять друг друга.
+#   PERSISTENCE_URL=sqlite:///data/bot_state.db      — локальный файл (один сервер)
+#   PERSISTENCE_URL=postgresql://.../schedule_bot    — общее хранилище для воркеров на разных машинах
+# Не задан — состояние только в памяти, как раньше.
+import os
+import json
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Text, select, delete, insert
+from telegram.ext import BasePersistence, PersistenceInput
+
+from blocking import run_db
+
+load_dotenv()
+
+PERSISTENCE_URL = os.getenv("PERSISTENCE_URL")
+# как часто Application сбрасывает изменения в хранилище (секунды); при падении воркера
+# теряется не больше этого интервала
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5"))
+
+
+# ===================== Хранилище =====================
+class StateStore:
+    """Интерфейс хранилища: пространства имён со значениями, сериализуемыми в JSON.
+       Для другого общего хранилища (Redis и т.п.) достаточно реализовать эти три метода.
+       Методы синхронные — StorePersistence вызывает их через пул потоков БД."""
+
+    def load(self, namespace) -> dict:
+        """{ключ: значение} всего пространства имён."""
+        raise NotImplementedError
+
+    def get(self, namespace, key):
+        """Значение одного ключа или None. По умолчанию — через load."""
+        return self.load(namespace).get(key)
+
+    def save(self, namespace, key, value):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+
+state_metadata = MetaData()
+bot_state = Table(
+    "bot_state", state_metadata,
+    Column("namespace", String, primary_key=True),
+    Column("key", String, primary_key=True),
+    Column("value", Text, nullable=False),
+)
+
+
+class SQLStateStore(StateStore):
+    """Таблица bot_state в любой базе SQLAlchemy: SQLite-файл для одного сервера,
+       PostgreSQL — общее хранилище для нескольких."""
+
+    def __init__(self, url):
+        self.engine = create_engine(url, pool_pre_ping=True)
+        state_metadata.create_all(self.engine)
+
+    def load(self, namespace):
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(bot_state.c.key, bot_state.c.value)
+                                .where(bot_state.c.namespace == namespace))
+            return {key: json.loads(value) for key, value in rows}
+
+    def get(self, namespace, key):
+        with self.engine.connect() as conn:
+            value = conn.execute(select(bot_state.c.value).where(bot_state.c.namespace == namespace,
+                                                                 bot_state.c.key == key)).scalar()
+        return json.loads(value) if value is not None else None
+
+    def save(self, namespace, key, value):
+        # delete + insert в одной транзакции — переносимый upsert для SQLite и PostgreSQL
+        with self.engine.begin() as conn:
+            conn.execute(delete(bot_state).where(bot_state.c.namespace == namespace,
+                                                 bot_state.c.key == key))
+            conn.execute(insert(bot_state).values(namespace=namespace, key=key,
+                                                  value=json.dumps(value, ensure_ascii=False)))
+
+    def delete(self, namespace, key):
+        with self.engine.begin() as conn:
+            conn.execute(delete(bot_state).where(bot_state.c.namespace == namespace,
+                                                 bot_state.c.key == key))
+
+
+# ===================== Persistence для PTB =====================
+class StorePersistence(BasePersistence):
+    """Хранит user_data и состояния ConversationHandler(persistent=True) в StateStore.
+       chat_data, bot_data и callback_data бот не использует — они не сохраняются.
+       PTB читает данные один раз при старте, а пишет раз в update_interval: поэтому
+       один пользователь в каждый момент должен обслуживаться одним воркером (см. router.py)."""
+
+    def __init__(self, store, update_interval=PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+
+    # ---------- user_data ----------
+    async def get_user_data(self):
+        saved = await run_db(self.store.load, "user_data")
+        return {int(user_id): data for user_id, data in saved.items()}
+
+    async def update_user_data(self, user_id, data):
+        if data:
+            await run_db(self.store.save, "user_data", str(user_id), data)
+        else:
+            await run_db(self.store.delete, "user_data", str(user_id))
+
+    async def drop_user_data(self, user_id):
+        await run_db(self.store.delete, "user_data", str(user_id))
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    # ---------- диалоги ----------
+    async def get_conversations(self, name):
+        saved = await run_db(self.store.load, f"conversation:{name}")
+        # ключ диалога — кортеж (chat_id, user_id), в хранилище — JSON-список
+        return {tuple(json.loads(key)): state for key, state in saved.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        store_key = json.dumps(list(key))
+        if new_state is None:
+            await run_db(self.store.delete, f"conversation:{name}", store_key)
+        else:
+            await run_db(self.store.save, f"conversation:{name}", store_key, new_state)
+
+    # ---------- не используются ----------
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        pass  # каждое изменение уже записано в update_*
+
+
+# ===================== Версии расписания =====================
+def publish_schedule_version(store, tenant, version):
+    """Отмечает в общем хранилище, что расписание школы tenant изменилось."""
+    store.save("schedule_version", tenant, version)
+
+
+def load_schedule_versions(store):
+    """{tenant: версия} — воркеры сравнивают со своими и пересобирают изменившиеся индексы."""
+    return store.load("schedule_version")
+
+
+_state_store = None
+
+
+def get_state_store(url=PERSISTENCE_URL):
+    """Общий StateStore процесса по PERSISTENCE_URL (None, если не задан)."""
+    global _state_store
+    if _state_store is None and url:
+        _state_store = SQLStateStore(url)
+    return _state_store
+
+
+def make_persistence(url=PERSISTENCE_URL):
+    store = get_state_store(url)
+    return StorePersistence(store) if store is not None else None
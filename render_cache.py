@@ -0,0 +1,89 @@
+# render_cache.py
+# Кэш готовых HTML-сообщений с расписанием: (role, класс/учитель, weekday, date) -> текст.
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "20000"))  # на одну школу
+# RENDER_CACHE_WARM=1 — заранее отрисовать текущую неделю после загрузки расписания
+RENDER_CACHE_WARM = os.getenv("RENDER_CACHE_WARM", "0") == "1"
+
+
+class RenderCache:
+    """LRU, привязанный к поколению ScheduleIndex: как только индекс подменён
+       новой загрузкой, все старые тексты считаются недействительными."""
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._generation = -1
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_index(self, index):
+        """False — индекс старее закэшированного (запрос начался до подмены), кэш не трогаем."""
+        if index.generation > self._generation:
+            self._generation = index.generation
+            self._data.clear()
+        return index.generation == self._generation
+
+    def get(self, index, key):
+        with self._lock:
+            text = self._data.get(key) if self._check_index(index) else None
+            if text is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, index, key, text):
+        with self._lock:
+            if not self._check_index(index):
+                return
+            self._data[key] = text
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class RenderCaches:
+    """По RenderCache на школу: загрузка расписания одной школы не сбрасывает тексты
+       остальных, и статистика видна по каждой школе."""
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def for_tenant(self, tenant):
+        cache = self._caches.get(tenant)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.setdefault(tenant, RenderCache(self.maxsize))
+        return cache
+
+    def clear(self):
+        with self._lock:
+            for cache in self._caches.values():
+                cache.clear()
+
+    def stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        return {tenant: cache.stats() for tenant, cache in caches.items()}
+
+
+render_caches = RenderCaches()
@@ -0,0 +1,160 @@
+# router.py
+# Распределение обновлений между несколькими воркерами (main.py в режиме webhook).
+# Telegram шлёт webhook сюда, router выбирает воркер по chat_id и пересылает JSON как есть:
+# все обновления одного чата попадают к одному воркеру и в том порядке, в каком пришли.
+#   WEBHOOK_PORT=8081 WORKER_INDEX=0 BOT_MODE=webhook python main.py
+#   WEBHOOK_PORT=8082 WORKER_INDEX=1 BOT_MODE=webhook python main.py
+#   ROUTER_WORKERS=http://127.0.0.1:8081,http://127.0.0.1:8082 ROUTER_PORT=8080 python router.py
+# Воркер обрабатывает обновления строго по очереди (CONCURRENT_UPDATES=1, по умолчанию;
+# с WORKER_INDEX другое значение не запустится): иначе порядок внутри чата теряется у воркера.
+# Состояние диалогов и счётчики попыток входа воркеры держат в общем хранилище
+# (PERSISTENCE_URL, см. persistence.py и login_throttle.py).
+import os
+import signal
+import asyncio
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+from webhook import WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL, SECRET_HEADER
+
+load_dotenv()
+
+# базовые адреса воркеров; к каждому добавляется WEBHOOK_PATH
+ROUTER_WORKERS = [w.strip().rstrip("/") for w in os.getenv("ROUTER_WORKERS", "").split(",") if w.strip()]
+ROUTER_PORT = int(os.getenv("ROUTER_PORT", "8080"))
+# очередь на воркер; переполнена — отвечаем 503, Telegram повторит доставку позже
+ROUTER_QUEUE_SIZE = int(os.getenv("ROUTER_QUEUE_SIZE", "1000"))
+ROUTER_RETRY_DELAY = float(os.getenv("ROUTER_RETRY_DELAY", "1"))
+ROUTER_MAX_RETRIES = int(os.getenv("ROUTER_MAX_RETRIES", "5"))
+
+
+def chat_id_of(update):
+    """chat_id обновления (или id отправителя, если чата нет — inline-запросы и т.п.)."""
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        sender = value.get("from") or value.get("user")
+        if sender and "id" in sender:
+            return sender["id"]
+    return update.get("update_id", 0)
+
+
+def shard_for(chat_id, n_workers):
+    # остаток от деления стабилен между перезапусками (в отличие от hash() строк)
+    return chat_id % n_workers
+
+
+class WorkerQueue:
+    """Очередь одного воркера с единственным отправителем: порядок пересылки = порядок приёма."""
+
+    def __init__(self, url, secret, maxsize=ROUTER_QUEUE_SIZE):
+        self.url = url
+        self.secret = secret
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.forwarded = 0
+        self.dropped = 0
+
+    async def run(self, session):
+        headers = {SECRET_HEADER: self.secret} if self.secret else {}
+        while True:
+            body = await self.queue.get()
+            for attempt in range(ROUTER_MAX_RETRIES + 1):
+                try:
+                    async with session.post(self.url, data=body, headers=headers) as resp:
+                        if resp.status < 500:
+                            self.forwarded += 1
+                            break
+                except aiohttp.ClientError:
+                    pass
+                # следующее обновление этого воркера ждёт: иначе порядок в чате нарушится
+                await asyncio.sleep(ROUTER_RETRY_DELAY * 2 ** attempt)
+            else:
+                self.dropped += 1
+                print(f"Router: обновление не доставлено на {self.url}")
+            self.queue.task_done()
+
+    def stats(self):
+        return {"url": self.url, "queued": self.queue.qsize(), "forwarded": self.forwarded,
+                "dropped": self.dropped}
+
+
+def build_router_app(workers, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """aiohttp-приложение: POST {path} -> очередь воркера chat_id % len(workers)."""
+    queues = [WorkerQueue(w + path, secret) for w in workers]
+
+    async def handle_update(request):
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="bad json")
+        if not isinstance(update, dict):
+            return web.Response(status=400, text="bad update")
+        queue = queues[shard_for(chat_id_of(update), len(queues))]
+        try:
+            queue.queue.put_nowait(body)
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+        return web.Response()
+
+    async def healthz(request):
+        return web.json_response({"ok": True, "workers": [q.stats() for q in queues]})
+
+    async def start_senders(app):
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        app["senders"] = [asyncio.create_task(q.run(session)) for q in queues]
+        yield
+        for task in app["senders"]:
+            task.cancel()
+        await asyncio.gather(*app["senders"], return_exceptions=True)
+        await session.close()
+
+    webapp = web.Application()
+    webapp.router.add_post(path, handle_update)
+    webapp.router.add_get("/healthz", healthz)
+    webapp.cleanup_ctx.append(start_senders)
+    return webapp
+
+
+async def set_webhook(public_url, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    from telegram import Bot, Update
+
+    async with Bot(os.getenv("BOT_TOKEN")) as bot:
+        await bot.set_webhook(url=public_url.rstrip("/") + path, secret_token=secret,
+                              allowed_updates=Update.ALL_TYPES)
+
+
+async def serve_router(workers=ROUTER_WORKERS, listen=WEBHOOK_LISTEN, port=ROUTER_PORT,
+                       public_url=WEBHOOK_URL, stop_event=None):
+    """Принимает webhook и раздаёт обновления воркерам; работает до stop_event (или SIGINT/SIGTERM)."""
+    if not workers:
+        raise SystemExit("ROUTER_WORKERS не задан")
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    # вебхук Telegram указывает на router; воркерам WEBHOOK_URL задавать не нужно
+    if public_url:
+        await set_webhook(public_url)
+    runner = web.AppRunner(build_router_app(workers))
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    print(f"Router слушает http://{listen}:{port}{WEBHOOK_PATH}, воркеров: {len(workers)}")
+    try:
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve_router())
@@ -0,0 +1,145 @@
+# schedule_calendar.py
+# Расписание по датам: чётность недели, праздники и изменения на конкретный день
+# поверх недельного расписания. Замена урока — одна-две строки в schedule_overrides,
+# а не повторная загрузка всего файла.
+import os
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import or_
+
+from init_db import SessionLocal, Schedule, ScheduleOverride, Holiday, DEFAULT_TENANT
+
+load_dotenv()
+
+WEEKDAYS_BY_ISO = {1: "ПН", 2: "ВТ", 3: "СР", 4: "ЧТ", 5: "ПТ"}
+# Любая дата нечётной недели (например, 1 сентября): от неё отсчитывается чередование.
+# Не задана — чётность по номеру недели ISO.
+WEEK_PARITY_ANCHOR = os.getenv("WEEK_PARITY_ANCHOR")
+# изменения и праздники старше стольких дней не загружаются в индекс
+CALENDAR_HISTORY_DAYS = int(os.getenv("CALENDAR_HISTORY_DAYS", "14"))
+
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def weekday_ru(date_obj):
+    """ПН–ПТ для будней, None для выходных."""
+    return WEEKDAYS_BY_ISO.get(date_obj.isoweekday())
+
+
+def _monday(date_obj):
+    return date_obj - timedelta(days=date_obj.isoweekday() - 1)
+
+
+def week_parity(date_obj, anchor=WEEK_PARITY_ANCHOR):
+    """"odd" или "even" — неделя, в которую попадает date_obj."""
+    if not anchor:
+        return "odd" if date_obj.isocalendar()[1] % 2 else "even"
+    if isinstance(anchor, str):
+        anchor = date.fromisoformat(anchor)
+    weeks = (_monday(date_obj) - _monday(anchor)).days // 7
+    return "odd" if weeks % 2 == 0 else "even"
+
+
+def parse_date(text):
+    return datetime.strptime(text.strip(), DATE_FORMAT).date()
+
+
+def parse_date_range(text):
+    """"ДД.ММ.ГГГГ" или "ДД.ММ.ГГГГ-ДД.ММ.ГГГГ" -> (начало, конец)."""
+    start, _, end = text.partition("-")
+    start = parse_date(start)
+    end = parse_date(end) if end else start
+    if end < start:
+        raise ValueError("конец периода раньше начала")
+    return start, end
+
+
+# ===================== Чтение =====================
+def load_calendar(tenant=DEFAULT_TENANT, since=None):
+    """(изменения, праздники) школы начиная с since (по умолчанию — CALENDAR_HISTORY_DAYS назад)."""
+    since = since or date.today() - timedelta(days=CALENDAR_HISTORY_DAYS)
+    s = SessionLocal()
+    try:
+        overrides = (
+            s.query(ScheduleOverride)
+            .filter(ScheduleOverride.tenant_id == tenant, ScheduleOverride.date >= since)
+            .all()
+        )
+        holidays = (
+            s.query(Holiday)
+            .filter(Holiday.tenant_id == tenant, Holiday.date_end >= since)
+            .all()
+        )
+        s.expunge_all()
+        return overrides, holidays
+    finally:
+        s.close()
+
+
+# ===================== Запись =====================
+def set_lesson_change(tenant, date_obj, class_name, time_start, lesson=None, cancel=False):
+    """Изменение урока класса class_name в time_start (минуты от полуночи) на дату date_obj:
+         lesson=(предмет, учитель, кабинет) — заменить (пустые поля берутся из недельного урока),
+         cancel=True — отменить, иначе — убрать изменения и вернуть недельное расписание.
+       Возвращает число уроков недельного расписания в этом слоте."""
+    s = SessionLocal()
+    try:
+        s.query(ScheduleOverride).filter(
+            ScheduleOverride.tenant_id == tenant,
+            ScheduleOverride.date == date_obj,
+            ScheduleOverride.class_name == class_name,
+            ScheduleOverride.time_start == time_start,
+        ).delete()
+        base = (
+            s.query(Schedule)
+            .filter(
+                Schedule.tenant_id == tenant,
+                Schedule.weekday == weekday_ru(date_obj),
+                Schedule.class_name == class_name,
+                Schedule.time_start == time_start,
+                or_(Schedule.week_parity.is_(None), Schedule.week_parity == week_parity(date_obj)),
+            )
+            .all()
+        )
+        if cancel or lesson:
+            for b in base:
+                s.add(ScheduleOverride(
+                    tenant_id=tenant, date=date_obj, schedule_id=b.id, time_start=b.time_start,
+                    time_end=b.time_end, cabinet=b.cabinet, teacher=b.teacher,
+                    class_name=b.class_name, subject=b.subject,
+                ))
+        if lesson:
+            subject, teacher, cabinet = lesson
+            first = base[0] if base else None
+            s.add(ScheduleOverride(
+                tenant_id=tenant, date=date_obj, schedule_id=None, time_start=time_start,
+                time_end=first.time_end if first else None,
+                cabinet=cabinet or (first.cabinet if first else None),
+                teacher=teacher or (first.teacher if first else None),
+                class_name=class_name,
+                subject=subject or (first.subject if first else None),
+            ))
+        s.commit()
+        return len(base)
+    finally:
+        s.close()
+
+
+def add_holiday(tenant, date_start, date_end, title=None):
+    s = SessionLocal()
+    try:
+        s.add(Holiday(tenant_id=tenant, date_start=date_start, date_end=date_end, title=title))
+        s.commit()
+    finally:
+        s.close()
+
+
+def delete_holidays(tenant, date_start):
+    """Удаляет праздники школы, начинающиеся date_start. Возвращает число удалённых."""
+    s = SessionLocal()
+    try:
+        deleted = s.query(Holiday).filter(Holiday.tenant_id == tenant, Holiday.date_start == date_start).delete()
+        s.commit()
+        return deleted
+    finally:
+        s.close()
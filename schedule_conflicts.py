@@ -0,0 +1,169 @@
+# schedule_conflicts.py
+# Проверка загружаемого расписания на накладки: учитель, класс или кабинет заняты
+# дважды в пересекающиеся интервалы времени. Один проход «сортировка + заметание»
+# по каждому ресурсу целиком на pandas, без попарного сравнения строк.
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from init_db import format_minutes
+
+load_dotenv()
+
+# длительность урока без time_end (минут)
+CONFLICT_DEFAULT_LESSON_MINUTES = int(os.getenv("CONFLICT_DEFAULT_LESSON_MINUTES", "45"))
+CONFLICT_REPORT_LIMIT = int(os.getenv("CONFLICT_REPORT_LIMIT", "15"))  # строк в отчёте
+
+# ресурс -> поля, при совпадении которых строки считаются одним занятием, а не накладкой:
+# учитель ведёт один предмет в одном кабинете у нескольких классов (поток),
+# у класса один предмет с несколькими учителями (подгруппы, раскрытое «все»),
+# в кабинете один предмет у нескольких классов
+CONFLICT_RESOURCES = {
+    "teacher": ("subject", "cabinet"),
+    "class_name": ("subject",),
+    "cabinet": ("subject",),
+}
+RESOURCE_TITLES = {"teacher": "Учитель", "class_name": "Класс", "cabinet": "Кабинет"}
+WEEKDAY_ORDER = {"ПН": 0, "ВТ": 1, "СР": 2, "ЧТ": 3, "ПТ": 4}
+
+# накладка: все строки одного ресурса, цепочкой пересекающиеся по времени
+Conflict = namedtuple(
+    "Conflict", ["resource", "value", "weekday", "week_parity", "start", "end", "lessons"],
+)
+
+
+def _minutes(series):
+    # время уже в минутах (schedule_import.to_minutes); None -> NaN
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _lesson_labels(rows, resource):
+    """Описание каждого занятия — все поля, кроме самого ресурса (строковые операции по колонкам)."""
+    parts = []
+    for field in ("class_name", "subject", "teacher", "cabinet"):
+        if field == resource:
+            continue
+        col = rows[field].astype("string")
+        if field == "cabinet":
+            col = "каб. " + col
+        parts.append(col.fillna(""))
+    label = parts[0].str.cat(parts[1:], sep=" ")
+    return label.str.replace(r"\s+", " ", regex=True).str.strip().tolist()
+
+
+def _codes(series):
+    # строки -> целые коды (None -> -1): сортировка и сравнения дальше идут по int64
+    return pd.factorize(series)[0]
+
+
+def find_conflicts(frame, default_minutes=CONFLICT_DEFAULT_LESSON_MINUTES):
+    """Накладки в нормализованном расписании (колонки SCHEDULE_FIELDS, учителя раскрыты).
+       Для каждого ресурса строки сортируются по (день, чётность, ресурс, начало), и за один
+       проход отмечается строка, которая начинается раньше самого позднего конца предыдущих
+       в своей группе. Возвращает список Conflict."""
+    frame = frame.reset_index(drop=True)
+    start = _minutes(frame["time_start"]).to_numpy(dtype="float64", na_value=np.nan)
+    end = _minutes(frame["time_end"]).to_numpy(dtype="float64", na_value=np.nan)
+    weekday = _codes(frame["weekday"])
+    parity = frame["week_parity"].map({"odd": 1, "even": 2}).fillna(0).to_numpy(dtype="int64")
+    columns = {c: _codes(frame[c]) for c in ("teacher", "class_name", "cabinet", "subject")}
+
+    valid = ~np.isnan(start) & (weekday >= 0)
+    bad_end = np.isnan(end) | (end <= start)
+    end = np.where(bad_end, start + default_minutes, end)
+    # урок «каждую неделю» пересекается и с нечётной, и с чётной неделей
+    dated = np.flatnonzero(valid & (parity != 0))
+    every_week = np.flatnonzero(valid & (parity == 0))
+    rows = np.concatenate([dated, every_week, every_week])
+    parity = np.concatenate([parity[dated], np.full(len(every_week), 1), np.full(len(every_week), 2)])
+    start = start[rows].astype("int64")
+    end = end[rows].astype("int64")
+    weekday = weekday[rows]
+    columns = {c: v[rows] for c, v in columns.items()}
+    span = int(end.max()) + 1 if len(end) else 1
+
+    conflicts = []
+    for resource, same_event in CONFLICT_RESOURCES.items():
+        res = columns[resource]
+        keep = np.flatnonzero(res >= 0)
+        if not len(keep):
+            continue
+        keys = pd.DataFrame({"weekday": weekday[keep], "parity": parity[keep], "res": res[keep],
+                             "start": start[keep], "end": end[keep],
+                             **{f: columns[f][keep] for f in same_event}})
+        keep = keep[~keys.duplicated().to_numpy()]
+        order = keep[np.lexsort((end[keep], start[keep], res[keep], parity[keep], weekday[keep]))]
+        w, p, r, st, en = weekday[order], parity[order], res[order], start[order], end[order]
+
+        # заметание: строка пересекается с группой, если начинается раньше максимального конца до неё
+        new_group = np.r_[True, (w[1:] != w[:-1]) | (p[1:] != p[:-1]) | (r[1:] != r[:-1])]
+        group = np.cumsum(new_group)
+        # накопленный максимум по группам за один проход: группы сдвинуты на span, не смешиваются
+        running_end = np.maximum.accumulate(en + group * span) - group * span
+        overlaps = ~new_group & (st < np.r_[0, running_end[:-1]])
+        if not overlaps.any():
+            continue
+        # цепочка пересекающихся строк — одна накладка; строки цепочки идут подряд
+        cluster = np.cumsum(~overlaps)
+        sizes = np.bincount(cluster)
+        hit = sizes[cluster] > 1
+        cl, hit_rows = cluster[hit], order[hit]
+        bounds = np.flatnonzero(np.r_[True, cl[1:] != cl[:-1], True])
+        cl_start = np.minimum.reduceat(st[hit], bounds[:-1])
+        cl_end = np.maximum.reduceat(en[hit], bounds[:-1])
+        cl_parity = p[hit][bounds[:-1]]
+
+        source = frame.iloc[rows[hit_rows]]
+        values, weekdays = source[resource].tolist(), source["weekday"].tolist()
+        row_ids = rows[hit_rows].tolist()
+        labels = _lesson_labels(source, resource)
+        for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])):
+            conflicts.append(Conflict(
+                resource, values[a], weekdays[a], {1: "odd", 2: "even"}[int(cl_parity[i])],
+                int(cl_start[i]), int(cl_end[i]), tuple(zip(row_ids[a:b], labels[a:b])),
+            ))
+    return _merge_parities(conflicts)
+
+
+def _merge_parities(conflicts):
+    """Накладка из уроков «каждую неделю» найдена дважды (нечётная и чётная) — оставляем одну."""
+    seen = {}
+    for c in conflicts:
+        key = (c.resource, c.value, c.weekday, c.start, c.end, tuple(r for r, _ in c.lessons))
+        if key in seen:
+            seen[key] = seen[key]._replace(week_parity=None)
+        else:
+            seen[key] = c
+    return sorted(
+        (c._replace(lessons=tuple(label for _, label in c.lessons)) for c in seen.values()),
+        key=lambda c: (WEEKDAY_ORDER.get(c.weekday, 9), c.start, c.resource, str(c.value)),
+    )
+
+
+def format_conflicts(conflicts, limit=CONFLICT_REPORT_LIMIT):
+    by_resource = {r: 0 for r in CONFLICT_RESOURCES}
+    for c in conflicts:
+        by_resource[c.resource] += 1
+    counts = ", ".join(f"{RESOURCE_TITLES[r].lower()}: {n}" for r, n in by_resource.items() if n)
+    lines = [f"Найдено накладок: {len(conflicts)} ({counts})."]
+    for c in conflicts[:limit]:
+        week = {"odd": " (нечёт.)", "even": " (чёт.)"}.get(c.week_parity, "")
+        lessons = " / ".join(c.lessons[:3])
+        if len(c.lessons) > 3:
+            lessons += f" и ещё {len(c.lessons) - 3}"
+        lines.append(f"• {RESOURCE_TITLES[c.resource]} {c.value}, {c.weekday}{week} "
+                     f"{format_minutes(c.start)}–{format_minutes(c.end)}: {lessons}")
+    if len(conflicts) > limit:
+        lines.append(f"… и ещё {len(conflicts) - limit}")
+    return "\n".join(lines)
+
+
+class ScheduleConflictError(Exception):
+    """Импорт отклонён из-за накладок; ничего не записано."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__("Расписание не загружено.\n" + format_conflicts(conflicts))
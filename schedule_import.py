@@ -0,0 +1,371 @@
+# schedule_import.py
+import math
+import time
+import uuid
+import datetime as _dt
+from collections import Counter, namedtuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, update, delete
+
+from init_db import User, Schedule, DEFAULT_TENANT
+from schedule_conflicts import find_conflicts, format_conflicts, ScheduleConflictError
+
+
+REQUIRED_COLUMNS = {'subject', 'weekday', 'time_start', 'class_name'}
+SCHEDULE_FIELDS = ['time_start', 'time_end', 'cabinet', 'teacher', 'class_name', 'weekday', 'subject', 'week_parity']
+
+
+# ===================== Нормализация отдельных значений =====================
+def normalize_class_name(val):
+    """Нормализует значение класса: 9.0 -> '9', 10 -> '10', '9А' остаётся '9А'"""
+    if pd.isna(val):
+        return None
+    if isinstance(val, int):
+        return str(val)
+    if isinstance(val, float):
+        if math.isfinite(val) and val.is_integer():
+            return str(int(val))
+        return str(val).strip()
+    s = str(val).strip()
+    try:
+        f = float(s.replace(',', '.'))
+        if f.is_integer():
+            return str(int(f))
+    except Exception:
+        pass
+    return s
+
+
+def to_time(val):
+    if pd.isna(val):
+        return None
+    if hasattr(val, 'time'):
+        return val.time()
+    if isinstance(val, _dt.time):
+        return val
+    try:
+        return pd.to_datetime(val).time()
+    except Exception:
+        return None
+
+
+def to_minutes(val):
+    """Время из ячейки -> минуты от полуночи (формат хранения в schedules)."""
+    t = to_time(val)
+    return t.hour * 60 + t.minute if t else None
+
+
+def to_stripped_str(val):
+    """Текстовая ячейка. Целое число, которое pandas поднял до float из-за пустой
+       ячейки в колонке (101 -> 101.0), пишется без ".0", как и в normalize_class_name."""
+    if pd.isna(val):
+        return None
+    if isinstance(val, float) and math.isfinite(val) and val.is_integer():
+        return str(int(val))
+    return str(val).strip()
+
+
+# необязательная колонка week_parity: урок только по нечётным/чётным неделям
+WEEK_PARITY_VALUES = {
+    "нечет": "odd", "нечёт": "odd", "нечетная": "odd", "нечётная": "odd", "odd": "odd", "1": "odd",
+    "чет": "even", "чёт": "even", "четная": "even", "чётная": "even", "even": "even", "2": "even",
+}
+
+
+def to_week_parity(val):
+    s = normalize_class_name(val)  # 1.0 из Excel -> "1"
+    return WEEK_PARITY_VALUES.get(s.lower().rstrip(".")) if s else None
+
+
+# ===================== Нормализация колонок целиком =====================
+def _map_unique(series, func):
+    """Применяет func только к уникальным значениям колонки и раскладывает
+       результат обратно по строкам. В расписании уникальных значений (времён,
+       классов, кабинетов) на порядки меньше, чем строк."""
+    if series.dtype == object:
+        # 1, 1.0 и True равны между собой при хешировании, а нормализуются по-разному
+        keys = pd.Series(list(zip(series.map(type), series)), index=series.index, dtype=object)
+        codes, uniques = pd.factorize(keys)
+        uniques = [v for _, v in uniques]
+    else:
+        codes, uniques = pd.factorize(series)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:len(uniques)] = [func(v) for v in uniques]
+    mapped[-1] = None  # код -1 (NaN/NaT) попадает сюда
+    return pd.Series(mapped[codes], index=series.index, dtype=object)
+
+
+def _column(df, name, func):
+    if name not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    return _map_unique(df[name], func)
+
+
+def check_columns(columns):
+    if not REQUIRED_COLUMNS.issubset(columns):
+        raise ValueError(
+            f"В файле нет обязательных колонок: {REQUIRED_COLUMNS - set(columns)}. "
+            f"Найдены: {list(columns)}"
+        )
+
+
+def normalize_columns(df):
+    """Приводит имена колонок к виду time_start, class_name, ... и проверяет обязательные."""
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    check_columns(df.columns)
+    return df
+
+
+def normalize_schedule_frame(df):
+    """Возвращает DataFrame с колонками SCHEDULE_FIELDS в том виде, в каком они
+       пишутся в таблицу schedules (teacher — ещё исходное значение из файла)."""
+    return pd.DataFrame({
+        'time_start': _column(df, 'time_start', to_minutes),
+        'time_end': _column(df, 'time_end', to_minutes),
+        'cabinet': _column(df, 'cabinet', to_stripped_str),
+        'teacher': _column(df, 'teacher', to_stripped_str),
+        'class_name': _column(df, 'class_name', normalize_class_name),
+        'weekday': _column(df, 'weekday', to_stripped_str),
+        'subject': _column(df, 'subject', to_stripped_str),
+        'week_parity': _column(df, 'week_parity', to_week_parity),
+    }, index=df.index)
+
+
+# ===================== Учителя =====================
+TEACHER_GROUPS = ("все", "младшая школа", "старшая школа")
+
+ImportResult = namedtuple(
+    "ImportResult",
+    ["inserted", "updated", "deleted", "unchanged", "unknown_teacher_rows", "unknown_teachers", "conflicts"],
+    defaults=((),),
+)
+
+
+class TeacherDirectory:
+    """Все учителя, загруженные одним запросом, и таблицы для раскрытия групп."""
+
+    def __init__(self, teachers):
+        self.groups = {g: [] for g in TEACHER_GROUPS}
+        self.by_name = {}
+        for t in teachers:
+            self.groups["все"].append(t.name_tuter)
+            if t.is_junior:
+                self.groups["младшая школа"].append(t.name_tuter)
+            if t.is_senior:
+                self.groups["старшая школа"].append(t.name_tuter)
+            self.by_name.setdefault(t.name_tuter, t.name_tuter)
+
+    @classmethod
+    def load(cls, s, tenant=DEFAULT_TENANT):
+        return cls(
+            s.query(User.name_tuter, User.is_junior, User.is_senior)
+            .filter(User.tenant_id == tenant, User.role == 'teacher')
+            .all()
+        )
+
+    def resolve(self, teacher_value):
+        """Список учителей для значения из колонки teacher; None — учитель не найден."""
+        tv = teacher_value.lower()
+        if tv in self.groups:
+            return self.groups[tv]
+        name = self.by_name.get(teacher_value)
+        return [name] if name else None
+
+
+def expand_teachers(teachers, frame):
+    """Раскрывает строки с группами учителей ("все", "младшая школа", ...) в строку
+       на каждого учителя. Строки без учителя или с ненайденным учителем
+       сохраняются с teacher = None. Возвращает (frame, {ненайденный учитель: строк})."""
+    resolved = {}
+    unknown = {}
+    counts = frame['teacher'].value_counts()
+    for value, n in counts.items():
+        if not value:
+            continue
+        names = teachers.resolve(value)
+        if names is None:
+            unknown[value] = int(n)
+        resolved[value] = names
+    frame = frame.assign(teacher=frame['teacher'].map(lambda v: resolved.get(v) or [None]))
+    frame = frame.explode('teacher', ignore_index=True)
+    return frame.astype(object).where(frame.notna(), None), unknown
+
+
+# ===================== Запись в БД =====================
+class ImportProgress:
+    """Счётчики импорта. Пишет поток импорта, читает event loop для сообщения о ходе загрузки."""
+
+    def __init__(self):
+        self.stage = "ожидание"
+        self.rows_parsed = 0
+        self.rows_written = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+def _as_chunks(data):
+    """DataFrame или итератор DataFrame-кусков (schedule_reader.read_schedule_chunks)."""
+    return [data] if isinstance(data, pd.DataFrame) else data
+
+
+def iter_schedule_frames(s, data, progress=None, tenant=DEFAULT_TENANT):
+    """Нормализованные куски с раскрытыми учителями школы: (frame, {ненайденный учитель: строк})."""
+    teachers = TeacherDirectory.load(s, tenant)
+    for chunk in _as_chunks(data):
+        if progress:
+            progress.rows_parsed += len(chunk)
+        yield expand_teachers(teachers, normalize_schedule_frame(chunk))
+
+
+def build_schedule_frame(s, data, progress=None, tenant=DEFAULT_TENANT):
+    """Все куски файла одним DataFrame: накладки и сравнение с БД нужны по всей неделе сразу.
+       Память — порядка размера нормализованного расписания (все строки файла после
+       раскрытия групп учителей), а не одного куска."""
+    frames = []
+    unknown = Counter()
+    for frame, chunk_unknown in iter_schedule_frames(s, data, progress, tenant):
+        frames.append(frame)
+        unknown.update(chunk_unknown)
+    if not frames:
+        return pd.DataFrame(columns=SCHEDULE_FIELDS, dtype=object), unknown
+    return pd.concat(frames, ignore_index=True), unknown
+
+
+def to_records(frame, tenant=DEFAULT_TENANT):
+    records = frame[SCHEDULE_FIELDS].to_dict('records')
+    for r in records:
+        r['id'] = str(uuid.uuid4())
+        r['tenant_id'] = tenant
+    return records
+
+
+def replace_schedule(s, data, progress=None, tenant=DEFAULT_TENANT):
+    """Заменяет всё расписание школы: каждый кусок сразу уходит пакетным INSERT.
+       Коммит делает вызывающий, так что удаление и вставка — одна транзакция."""
+    deleted = s.query(Schedule).filter(Schedule.tenant_id == tenant).delete()
+    inserted = 0
+    unknown = Counter()
+    for frame, chunk_unknown in iter_schedule_frames(s, data, progress, tenant):
+        records = to_records(frame, tenant)
+        if records:
+            s.execute(insert(Schedule), records)
+        inserted += len(records)
+        if progress:
+            progress.rows_written = inserted
+        unknown.update(chunk_unknown)
+    return ImportResult(inserted, 0, deleted, 0, sum(unknown.values()), sorted(unknown))
+
+
+# ===================== Инкрементальное обновление =====================
+# Строка расписания однозначно определяется этим ключом; остальные поля — изменяемые
+NATURAL_KEY = ['weekday', 'class_name', 'time_start', 'teacher', 'week_parity']
+VALUE_FIELDS = ['time_end', 'cabinet', 'subject']
+_NULL = "\0"  # None в ключе, чтобы merge сопоставлял пустые значения между собой
+_CHUNK = 500
+IMPORT_WRITE_BATCH = 5000  # строк в одном executemany, между пачками обновляется прогресс
+
+
+def _fill_null(data):
+    # where, а не fillna: время — целые в object-колонках, fillna пытался бы их привести
+    return data.where(data.notna(), _NULL)
+
+
+def _keyed(frame):
+    frame = frame.copy()
+    frame[NATURAL_KEY] = _fill_null(frame[NATURAL_KEY])
+    # одинаковые ключи (например, две подгруппы без учителя) сопоставляются по порядку
+    frame['_n'] = frame.groupby(NATURAL_KEY, sort=False).cumcount()
+    return frame
+
+
+def load_current_schedule(s, tenant=DEFAULT_TENANT):
+    rows = (
+        s.query(Schedule.id, *(getattr(Schedule, f) for f in SCHEDULE_FIELDS))
+        .filter(Schedule.tenant_id == tenant)
+        .all()
+    )
+    return pd.DataFrame(rows, columns=['id'] + SCHEDULE_FIELDS, dtype=object)
+
+
+def diff_schedule(current, new, tenant=DEFAULT_TENANT):
+    """Сравнивает текущее содержимое schedules с новым по NATURAL_KEY.
+       Возвращает (вставки: records, изменения: records с id, удаления: [id], без изменений: int)."""
+    cur = _keyed(current)
+    new = _keyed(new[SCHEDULE_FIELDS])
+    merged = new.merge(cur, on=NATURAL_KEY + ['_n'], how='outer', suffixes=('', '_old'), indicator=True)
+
+    inserted = merged[merged['_merge'] == 'left_only']
+    deleted = merged[merged['_merge'] == 'right_only']
+    both = merged[merged['_merge'] == 'both']
+
+    changed = pd.Series(False, index=both.index)
+    for f in VALUE_FIELDS:
+        changed |= _fill_null(both[f]) != _fill_null(both[f + '_old'])
+    updated = both[changed]
+
+    def records(frame, fields):
+        frame = frame[fields].replace(_NULL, None)
+        return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+    inserts = records(inserted, SCHEDULE_FIELDS)
+    for r in inserts:
+        r['id'] = str(uuid.uuid4())
+        r['tenant_id'] = tenant
+    updates = records(updated, ['id'] + VALUE_FIELDS)
+    return inserts, updates, deleted['id'].tolist(), int(len(both) - len(updated))
+
+
+def sync_schedule(s, data, progress=None, tenant=DEFAULT_TENANT, on_conflict="warn"):
+    """Приводит расписание школы tenant к содержимому файла, меняя только отличающиеся строки;
+       строки других школ не читаются и не меняются.
+       Накладки ищутся до записи: on_conflict="reject" — ScheduleConflictError и ничего не пишется,
+       "warn" — расписание записывается, накладки возвращаются в ImportResult.conflicts.
+       Коммит делает вызывающий: вставки, изменения и удаления — одна транзакция,
+       и читатели ни в какой момент не видят пустого расписания.
+       Память не постоянная: в ней одновременно весь файл (build_schedule_frame), текущее
+       расписание школы из БД и результат сравнения. По куску, не собирая файл целиком,
+       пишет только replace_schedule — полная замена без сравнения и проверки накладок."""
+    progress = progress or ImportProgress()
+    progress.stage = "разбор файла"
+    frame, unknown = build_schedule_frame(s, data, progress, tenant)
+    progress.stage = "проверка накладок"
+    conflicts = find_conflicts(frame)
+    if conflicts and on_conflict == "reject":
+        raise ScheduleConflictError(conflicts)
+    progress.stage = "сравнение"
+    inserts, updates, deletes, unchanged = diff_schedule(load_current_schedule(s, tenant), frame, tenant)
+    progress.stage = "запись"
+    for i in range(0, len(deletes), _CHUNK):
+        s.execute(delete(Schedule).where(Schedule.id.in_(deletes[i:i + _CHUNK])))
+        progress.rows_written += len(deletes[i:i + _CHUNK])
+    if updates:
+        s.execute(update(Schedule), updates)
+        progress.rows_written += len(updates)
+    for i in range(0, len(inserts), IMPORT_WRITE_BATCH):
+        batch = inserts[i:i + IMPORT_WRITE_BATCH]
+        s.execute(insert(Schedule), batch)
+        progress.rows_written += len(batch)
+    return ImportResult(len(inserts), len(updates), len(deletes), unchanged,
+                        sum(unknown.values()), sorted(unknown), conflicts)
+
+
+def format_import_result(result):
+    text = (
+        f"Расписание обновлено: добавлено {result.inserted}, изменено {result.updated}, "
+        f"удалено {result.deleted}, без изменений {result.unchanged}."
+    )
+    if result.unknown_teacher_rows:
+        names = ", ".join(result.unknown_teachers[:10])
+        more = f" и ещё {len(result.unknown_teachers) - 10}" if len(result.unknown_teachers) > 10 else ""
+        text += (
+            f"\nУчитель не найден в {result.unknown_teacher_rows} строках "
+            f"(сохранены без учителя): {names}{more}"
+        )
+    if result.conflicts:
+        text += "\n" + format_conflicts(result.conflicts)
+    return text
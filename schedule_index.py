@@ -0,0 +1,207 @@
+# schedule_index.py
+import bisect
+import itertools
+import threading
+from datetime import timedelta
+from collections import defaultdict, namedtuple
+from init_db import SessionLocal, Schedule, User, DEFAULT_TENANT
+from schedule_calendar import load_calendar, weekday_ru, week_parity
+
+
+# Неизменяемый снимок строки расписания (те же поля, что и у модели Schedule)
+ScheduleRow = namedtuple(
+    "ScheduleRow",
+    ["id", "time_start", "time_end", "cabinet", "teacher", "class_name", "weekday", "subject", "week_parity"],
+)
+# None — вся неделя без учёта чередования (как в загруженном файле)
+PARITIES = (None, "odd", "even")
+
+
+def _row_sort_key(row):
+    return row.time_start  # минуты от полуночи
+
+
+def _override_row(o):
+    return ScheduleRow(o.id, o.time_start, o.time_end, o.cabinet, o.teacher, o.class_name,
+                       weekday_ru(o.date), o.subject, None)
+
+
+class ScheduleIndex:
+    """Индекс расписания одной школы в памяти. После создания не изменяется.
+       Недельная часть: (чётность, weekday, teacher/class_name) -> строки, отсортированные по time_start.
+       Календарь: праздники и готовые строки на даты, где есть изменения, — только для
+       затронутых учителей и классов; остальные берут недельные строки. Любой день — O(1)."""
+
+    def __init__(self, rows=(), generation=0, tenant=DEFAULT_TENANT, overrides=(), holidays=()):
+        # номер сборки: растёт при каждой перезагрузке (по нему сбрасываются кэши отрисовки)
+        self.generation = generation
+        self.tenant = tenant
+        by_teacher = defaultdict(list)
+        by_class = defaultdict(list)
+        count = 0
+        for r in rows:
+            count += 1
+            for parity in PARITIES:
+                if parity and r.week_parity and r.week_parity != parity:
+                    continue
+                if r.teacher:
+                    by_teacher[(parity, r.weekday, r.teacher)].append(r)
+                if r.class_name:
+                    by_class[(parity, r.weekday, r.class_name)].append(r)
+
+        self._by_teacher = {k: tuple(sorted(v, key=_row_sort_key)) for k, v in by_teacher.items()}
+        self._by_class = {k: tuple(sorted(v, key=_row_sort_key)) for k, v in by_class.items()}
+        self._teachers = sorted({k[2] for k in self._by_teacher})
+        self._classes = sorted({k[2] for k in self._by_class})
+        self.size = count
+        self._set_calendar(overrides, holidays)
+
+    def with_calendar(self, overrides, holidays, generation):
+        """Копия с тем же недельным расписанием и новым календарём — без перечитывания schedules."""
+        index = object.__new__(ScheduleIndex)
+        index.__dict__.update(self.__dict__)
+        index.generation = generation
+        index._set_calendar(overrides, holidays)
+        return index
+
+    def _set_calendar(self, overrides, holidays):
+        self._holidays = {}
+        for h in holidays:
+            d = h.date_start
+            while d <= h.date_end:
+                self._holidays[d] = h.title or ""
+                d += timedelta(days=1)
+
+        by_date = defaultdict(list)
+        for o in overrides:
+            by_date[o.date].append(o)
+        self._dated = {}
+        for d, items in by_date.items():
+            removed = {o.schedule_id for o in items if o.schedule_id}
+            added = [_override_row(o) for o in items if not o.schedule_id]
+            for role, owners, field in (
+                ("teacher", {o.teacher for o in items if o.teacher}, "teacher"),
+                ("student", {o.class_name for o in items if o.class_name}, "class_name"),
+            ):
+                for owner in owners:
+                    rows = [r for r in self._weekly(role, owner, d) if r.id not in removed]
+                    rows += [r for r in added if getattr(r, field) == owner]
+                    self._dated[(d, role, owner)] = tuple(sorted(rows, key=_row_sort_key))
+        self.overrides = len(overrides)
+
+    def _weekly(self, role, owner, date_obj):
+        weekday = weekday_ru(date_obj)
+        if weekday is None:
+            return ()
+        by_owner = self._by_teacher if role == "teacher" else self._by_class
+        return by_owner.get((week_parity(date_obj), weekday, owner), ())
+
+    def for_date(self, role: str, owner: str, date_obj):
+        """Действующие уроки учителя (role="teacher") или класса на дату: праздник,
+           изменения на этот день, иначе недельное расписание нужной чётности."""
+        if date_obj in self._holidays:
+            return ()
+        rows = self._dated.get((date_obj, role, owner))
+        if rows is None:
+            rows = self._weekly(role, owner, date_obj)
+        return rows
+
+    def lessons_at(self, role: str, owner: str, date_obj, minute: int):
+        """(идущий урок или None, следующий урок или None) на дату в момент minute
+           (минуты от полуночи). Строки дня отсортированы по time_start — поиск двоичный."""
+        rows = self.for_date(role, owner, date_obj)
+        i = bisect.bisect_right(rows, minute, key=_row_sort_key)
+        current = None
+        if i and rows[i - 1].time_end is not None and rows[i - 1].time_end > minute:
+            current = rows[i - 1]
+        return current, rows[i] if i < len(rows) else None
+
+    def holiday(self, date_obj):
+        """Название праздника ("" — без названия) или None, если день учебный."""
+        return self._holidays.get(date_obj)
+
+    def for_teacher(self, teacher_name: str, weekday_ru: str, parity=None):
+        return self._by_teacher.get((parity, weekday_ru, teacher_name), ())
+
+    def for_class(self, class_name: str, weekday_ru: str, parity=None):
+        return self._by_class.get((parity, weekday_ru, class_name), ())
+
+    def teachers(self):
+        return self._teachers
+
+    def classes(self):
+        return self._classes
+
+
+_generations = itertools.count(1)
+
+
+def build_schedule_index(tenant=DEFAULT_TENANT):
+    """Читает расписание школы одним запросом (и календарь — вторым) и строит новый индекс."""
+    s = SessionLocal()
+    try:
+        rows = s.query(
+            Schedule.id, Schedule.time_start, Schedule.time_end, Schedule.cabinet,
+            Schedule.teacher, Schedule.class_name, Schedule.weekday, Schedule.subject,
+            Schedule.week_parity,
+        ).filter(Schedule.tenant_id == tenant).all()
+    finally:
+        s.close()
+    overrides, holidays = load_calendar(tenant)
+    return ScheduleIndex((ScheduleRow(*r) for r in rows), next(_generations), tenant, overrides, holidays)
+
+
+def list_tenants():
+    """Все школы, у которых есть пользователи или расписание."""
+    s = SessionLocal()
+    try:
+        tenants = {t for (t,) in s.query(User.tenant_id).distinct()}
+        tenants.update(t for (t,) in s.query(Schedule.tenant_id).distinct())
+        return sorted(tenants)
+    finally:
+        s.close()
+
+
+# tenant -> ScheduleIndex. Словарь не меняется на месте, а подменяется целиком,
+# поэтому читателям из других потоков блокировка не нужна.
+_indexes = {}
+# полная пересборка и пересборка календаря не должны подменить результат друг друга
+_reload_lock = threading.Lock()
+
+
+def get_schedule_index(tenant=DEFAULT_TENANT):
+    index = _indexes.get(tenant)
+    if index is None:
+        # школа без загруженного расписания — пустой индекс
+        index = ScheduleIndex(tenant=tenant)
+    return index
+
+
+def reload_schedule_index(tenant=DEFAULT_TENANT):
+    """Перестраивает индекс школы из БД и атомарно подменяет текущий.
+       Читатели, уже получившие старый индекс, дорабатывают с ним."""
+    global _indexes
+    with _reload_lock:
+        new_index = build_schedule_index(tenant)
+        _indexes = {**_indexes, tenant: new_index}
+    return new_index
+
+
+def reload_schedule_calendar(tenant=DEFAULT_TENANT):
+    """После изменения урока или праздника: недельная часть берётся из текущего индекса,
+       из БД читаются только изменения и праздники."""
+    global _indexes
+    with _reload_lock:
+        overrides, holidays = load_calendar(tenant)
+        new_index = get_schedule_index(tenant).with_calendar(overrides, holidays, next(_generations))
+        _indexes = {**_indexes, tenant: new_index}
+    return new_index
+
+
+def reload_all_schedule_indexes():
+    return [reload_schedule_index(t) for t in list_tenants()]
+
+
+def index_stats():
+    return {t: {"rows": i.size, "overrides": i.overrides, "generation": i.generation}
+            for t, i in _indexes.items()}
@@ -0,0 +1,112 @@
+# schedule_reader.py
+# Потоковое чтение файла расписания: заголовок проверяется до чтения данных,
+# строки отдаются кусками по IMPORT_CHUNK_ROWS. Потоково только чтение: книга Excel
+# и сырые ячейки целиком не загружаются, но sync_schedule (schedule_import.py) собирает
+# нормализованные куски в один DataFrame — память импорта растёт с размером расписания.
+# pandas и openpyxl импортируются внутри функций: main.py берёт отсюда SUPPORTED_EXTENSIONS,
+# и бот не должен платить за их загрузку при старте.
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+SUPPORTED_EXTENSIONS = (".xlsx", ".csv")
+# старый .xls читается только через xlrd, которого нет в зависимостях, — просим пересохранить
+LEGACY_EXCEL_MESSAGE = "Формат .xls не поддерживается: пересохраните файл в Excel как .xlsx или .csv"
+
+
+def normalize_header(raw):
+    """Имена колонок как у pd.read_excel + нормализация handle_document:
+       пустые -> unnamed:_N, повторы -> имя.1, имя.2 ..."""
+    columns = []
+    seen = {}
+    for i, c in enumerate(raw):
+        name = f"Unnamed: {i}" if c is None or str(c).strip() == "" else str(c)
+        name = name.strip().lower().replace(" ", "_")
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _cell_value(value):
+    # как pandas при чтении xlsx: целые числа из Excel (9.0) приходят как int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_xlsx(path, chunk_rows):
+    import pandas as pd
+    from openpyxl import load_workbook
+    from schedule_import import check_columns
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Файл пустой")
+        columns = normalize_header(header)
+        check_columns(columns)
+    except Exception:
+        wb.close()
+        raise
+
+    width = len(columns)
+
+    # dtype=object: значения остаются как в ячейках. Иначе pandas выводит тип колонки
+    # по каждому куску отдельно, и кабинет 101 в куске с пустой ячейкой становится 101.0
+    def chunks():
+        try:
+            batch = []
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                values = [_cell_value(v) for v in row[:width]]
+                values.extend([None] * (width - len(values)))
+                batch.append(values)
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame(batch, columns=columns, dtype=object)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+        finally:
+            wb.close()
+
+    return chunks()
+
+
+def _iter_csv(path, chunk_rows):
+    import pandas as pd
+    from schedule_import import check_columns
+
+    # sep=None — разделитель (",", ";") определяется по файлу; dtype=str — значения как в файле
+    options = dict(sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+    columns = normalize_header(pd.read_csv(path, nrows=0, **options).columns)
+    check_columns(columns)
+
+    def chunks():
+        with pd.read_csv(path, chunksize=chunk_rows, **options) as reader:
+            for chunk in reader:
+                chunk.columns = columns
+                yield chunk
+
+    return chunks()
+
+
+def read_schedule_chunks(path, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Проверяет заголовок (ValueError, если нет обязательных колонок) и возвращает
+       итератор DataFrame-кусков с нормализованными именами колонок."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        return _iter_xlsx(path, chunk_rows)
+    if ext == ".csv":
+        return _iter_csv(path, chunk_rows)
+    if ext == ".xls":
+        raise ValueError(LEGACY_EXCEL_MESSAGE)
+    raise ValueError(f"Неподдерживаемый формат файла: {ext}. Нужен .xlsx или .csv")
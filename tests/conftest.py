@@ -0,0 +1,27 @@
+# tests/conftest.py
+# Тесты идут на временной SQLite-базе: DATABASE_URL задаётся до первого импорта init_db.
+import os
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="schedule_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from init_db import Base, engine
+from user_cache import user_cache
+import schedule_index
+
+
+@pytest.fixture
+def db():
+    """Все таблицы созданы и пусты на время теста; кэши процесса сбрасываются после него."""
+    Base.metadata.create_all(engine)
+    yield engine
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    user_cache.clear()
+    schedule_index._indexes.clear()
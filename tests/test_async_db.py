@@ -0,0 +1,47 @@
+import os
+import sys
+import asyncio
+import subprocess
+
+import async_db
+from init_db import SessionLocal, User
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_user_and_session_helpers(db):
+    s = SessionLocal()
+    s.add(User(id="u1", login="teacher1", password_hash="old", role="teacher", name_tuter="Учитель 1"))
+    s.commit()
+    s.close()
+
+    async def scenario():
+        try:
+            assert await async_db.create_user_session("u1", 100)
+            assert (await async_db.get_user_by_telegram(100)).login == "teacher1"
+            # повторная привязка того же telegram_id заменяет сессию, а не дублирует её
+            assert await async_db.create_user_session("u1", 100)
+            await async_db.update_password_hash("u1", "new")
+            assert (await async_db.get_user_by_login("teacher1")).password_hash == "new"
+            assert await async_db.clear_user_session(100)
+            assert not await async_db.clear_user_session(100)
+            assert await async_db.get_user_by_telegram(100) is None
+        finally:
+            await async_db.dispose_async_engine()
+
+    asyncio.run(scenario())
+
+
+def test_process_exits_after_shutdown_hook(db):
+    # без dispose потоки aiosqlite не дают интерпретатору завершиться
+    script = (
+        "import asyncio, async_db, main\n"
+        "async def run():\n"
+        "    await async_db.get_user_by_telegram(5)\n"
+        "    await main.close_db(None)\n"
+        "asyncio.run(run())\n"
+    )
+    env = dict(os.environ, DB_ASYNC="1")
+    proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, timeout=60,
+                          capture_output=True)
+    assert proc.returncode == 0, proc.stderr.decode()
@@ -0,0 +1,47 @@
+import asyncio
+
+from telegram.error import Forbidden
+
+from broadcast import Recipient, RateLimiter, SendQueue, broadcast
+
+
+class StubBot:
+    """send_message падает для чатов из fail: Forbidden — ошибка Telegram, остальные — любые другие."""
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id in self.fail:
+            raise self.fail[chat_id]
+        self.sent.append((chat_id, text))
+
+
+def _recipients(n):
+    return [Recipient(i, "default", "student", f"{i % 3}А") for i in range(n)]
+
+
+def test_unexpected_errors_do_not_kill_workers():
+    bot = StubBot({1: RuntimeError("formatter bug"), 2: ValueError("limiter"), 3: Forbidden("blocked")})
+    send_queue = SendQueue(bot, limiter=RateLimiter(rate=0, chat_interval=0), workers=2)
+
+    report = asyncio.run(asyncio.wait_for(
+        broadcast(bot, _recipients(10), lambda tenant, role, owner: f"Расписание {owner}", send_queue),
+        timeout=5,
+    ))
+
+    assert report.failed == 3
+    assert report.sent == 7
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [0, 4, 5, 6, 7, 8, 9]
+
+
+def test_every_worker_failing_still_finishes():
+    bot = StubBot({i: RuntimeError("boom") for i in range(6)})
+    send_queue = SendQueue(bot, limiter=RateLimiter(rate=0, chat_interval=0), workers=2)
+
+    report = asyncio.run(asyncio.wait_for(
+        broadcast(bot, _recipients(6), lambda tenant, role, owner: "текст", send_queue), timeout=5,
+    ))
+
+    assert (report.sent, report.failed) == (0, 6)
@@ -0,0 +1,72 @@
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+import main
+from fakes import FakeRequest, message_update, seed_school
+from schedule_calendar import add_holiday
+
+MONDAY = dt.date(2026, 10, 19)
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append(int(chat_id))
+
+
+class FixedDatetime(dt.datetime):
+    @classmethod
+    def today(cls):
+        return cls(MONDAY.year, MONDAY.month, MONDAY.day, 7, 30)
+
+
+def _run_job(monkeypatch):
+    monkeypatch.setattr(main, "datetime", FixedDatetime)
+    main.load_schedule()
+    bot = StubBot()
+    asyncio.run(asyncio.wait_for(main.daily_broadcast_job(SimpleNamespace(bot=bot)), timeout=30))
+    return sorted(bot.sent)
+
+
+def test_skips_empty_days_and_opted_out_chats(db, monkeypatch):
+    # в понедельник у учителей 6 и 13 уроков нет (см. fakes.school_sheet)
+    teachers, students = seed_school(2, 14)
+    assert main.set_daily_broadcast(students[0], False)
+
+    sent = _run_job(monkeypatch)
+
+    idle = {teachers[6], teachers[13]}
+    assert sent == sorted([t for t in teachers if t not in idle] + [students[1]])
+
+
+def test_holiday_sends_nothing(db, monkeypatch):
+    seed_school(2, 3)
+    add_holiday("default", MONDAY, MONDAY, "Праздник")
+
+    assert _run_job(monkeypatch) == []
+
+
+def test_notify_command_toggles_broadcast(db):
+    _, students = seed_school(1, 2)
+    request = FakeRequest()
+    app = ApplicationBuilder().token("1:test").request(request).get_updates_request(FakeRequest()).build()
+    main.add_handlers(app)
+
+    async def send(text):
+        async with app:
+            await app.process_update(Update.de_json(message_update(students[0], text), app.bot))
+
+    def subscribed():
+        return str(students[0]) in {r.telegram_id for r in main.load_recipients()}
+
+    asyncio.run(send("/notify off"))
+    assert not subscribed()
+    asyncio.run(send("/notify on"))
+    assert subscribed()
+    assert request.calls[-1][1]["text"] == "Утренняя рассылка включена."
@@ -0,0 +1,123 @@
+import time
+import asyncio
+
+import pytest
+from telegram.error import NetworkError, TimedOut
+
+import import_worker
+from import_worker import ImportLock, conflict_policy, run_import_job
+from schedule_import import ImportResult
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+class StubMessage:
+    """Сообщение о ходе импорта: edit_text падает, если fails(text)."""
+
+    def __init__(self, fails):
+        self.chat_id = 42
+        self.fails = fails
+        self.bot = StubBot()
+        self.edits = []
+
+    def get_bot(self):
+        return self.bot
+
+    async def edit_text(self, text):
+        if self.fails(text):
+            raise TimedOut() if "Ошибка" in text else NetworkError("connection reset")
+        self.edits.append(text)
+
+
+class StubLock:
+    released = False
+
+    def touch(self):
+        pass
+
+    def release(self):
+        self.released = True
+
+
+async def _noop():
+    pass
+
+
+def _result(progress):
+    return ImportResult(3, 1, 0, 10, 0, [], ())
+
+
+@pytest.mark.parametrize("fails", [
+    lambda text: text.startswith("Расписание обновлено"),  # падает только итоговая правка
+    lambda text: True,                                      # сеть недоступна с самого начала
+], ids=["final-edit", "every-edit"])
+def test_result_is_sent_when_final_edit_fails(fails):
+    message, lock = StubMessage(fails), StubLock()
+
+    asyncio.run(run_import_job(message, _noop, _result, lock))
+
+    assert lock.released
+    assert len(message.bot.sent) == 1
+    chat_id, text = message.bot.sent[0]
+    assert chat_id == 42 and text.startswith("Расписание обновлено: добавлено 3, изменено 1")
+
+
+def test_error_report_is_sent_when_edit_fails():
+    def broken_import(progress):
+        raise ValueError("битый файл")
+
+    message, lock = StubMessage(lambda text: "Ошибка" in text), StubLock()
+
+    asyncio.run(run_import_job(message, _noop, broken_import, lock))
+
+    assert lock.released
+    assert message.bot.sent == [(42, "Ошибка при загрузке: битый файл")]
+
+
+def test_long_import_keeps_lock(tmp_path, monkeypatch):
+    # импорт идёт дольше IMPORT_LOCK_TIMEOUT: второй администратор всё равно не должен его перебить
+    monkeypatch.setattr(import_worker, "IMPORT_LOCK_TIMEOUT", 0.3)
+    monkeypatch.setattr(import_worker, "IMPORT_PROGRESS_INTERVAL", 0.05)
+    path = str(tmp_path / "import.lock")
+    lock = ImportLock(path)
+    assert lock.acquire(owner="первый")
+    second = []
+
+    def slow_import(progress):
+        for _ in range(4):
+            time.sleep(0.25)
+            second.append(ImportLock(path).acquire(owner="второй"))
+        return _result(progress)
+
+    asyncio.run(run_import_job(StubMessage(lambda text: False), _noop, slow_import, lock))
+
+    assert second == [False] * 4
+    assert ImportLock(path).acquire(owner="второй")  # после импорта блокировка снята
+
+
+def test_abandoned_lock_expires(tmp_path, monkeypatch):
+    monkeypatch.setattr(import_worker, "IMPORT_LOCK_TIMEOUT", 0.1)
+    path = str(tmp_path / "import.lock")
+    assert ImportLock(path).acquire(owner="упавший")
+    time.sleep(0.2)
+    assert ImportLock(path).acquire(owner="второй")
+
+
+def test_conflicts_only_warn_by_default():
+    assert import_worker.IMPORT_CONFLICTS == "warn"
+    assert conflict_policy(None) == "warn"
+    assert conflict_policy("что угодно") == "warn"
+
+
+def test_ask_and_reject_are_opt_in(monkeypatch):
+    monkeypatch.setattr(import_worker, "IMPORT_CONFLICTS", "ask")
+    assert conflict_policy(None) == "reject"
+    assert conflict_policy(" Принять ") == "warn"
+    monkeypatch.setattr(import_worker, "IMPORT_CONFLICTS", "reject")
+    assert conflict_policy("принять") == "reject"
@@ -0,0 +1,17 @@
+import pytest
+
+from migrate_add_indexes import CHECKED_QUERIES, run_migration, query_uses_index
+
+
+@pytest.mark.parametrize("index_name, stmt", CHECKED_QUERIES, ids=[name for name, _ in CHECKED_QUERIES])
+def test_bot_query_uses_index(db, index_name, stmt):
+    run_migration()
+    with db.connect() as conn:
+        used, plan = query_uses_index(conn, index_name, stmt)
+    assert used, plan
+
+
+@pytest.mark.parametrize("index_name, stmt", CHECKED_QUERIES, ids=[name for name, _ in CHECKED_QUERIES])
+def test_checked_query_needs_no_calendar_migration(index_name, stmt):
+    # проверка должна работать на базе без migrate_add_calendar.py
+    assert "week_parity" not in str(stmt)
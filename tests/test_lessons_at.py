@@ -0,0 +1,46 @@
+import datetime as dt
+
+import pytest
+
+from schedule_index import ScheduleIndex, ScheduleRow
+
+MONDAY = dt.date(2026, 10, 19)
+
+# 08:30–09:15, 09:25–10:10 и урок без времени окончания в 11:40
+INDEX = ScheduleIndex([
+    ScheduleRow("b", 565, 610, "102", "Петров", "5А", "ПН", "Физика", None),
+    ScheduleRow("a", 510, 555, "101", "Иванов", "5А", "ПН", "Математика", None),
+    ScheduleRow("c", 700, None, "103", "Сидоров", "5А", "ПН", "Химия", None),
+])
+
+
+@pytest.mark.parametrize("minute, current, following", [
+    (0, None, "a"),       # до первого урока
+    (509, None, "a"),
+    (510, "a", "b"),      # минута начала — урок уже идёт
+    (554, "a", "b"),
+    (555, None, "b"),     # минута окончания — урок закончился
+    (560, None, "b"),     # перемена
+    (565, "b", "c"),
+    (611, None, "c"),
+    (700, None, None),    # урок без time_end не считается идущим, следующего нет
+    (701, None, None),
+    (1439, None, None),   # после последнего урока
+], ids=lambda v: str(v))
+def test_lessons_at_boundaries(minute, current, following):
+    cur, nxt = INDEX.lessons_at("student", "5А", MONDAY, minute)
+    assert (cur and cur.id, nxt and nxt.id) == (current, following)
+
+
+@pytest.mark.parametrize("role, owner, date_obj", [
+    ("student", "6Б", MONDAY),                          # нет такого класса
+    ("student", "5А", MONDAY + dt.timedelta(days=1)),   # во вторник уроков нет
+    ("student", "5А", MONDAY - dt.timedelta(days=1)),   # воскресенье
+])
+def test_lessons_at_empty_day(role, owner, date_obj):
+    assert INDEX.lessons_at(role, owner, date_obj, 600) == (None, None)
+
+
+def test_lessons_at_for_teacher():
+    cur, nxt = INDEX.lessons_at("teacher", "Петров", MONDAY, 500)
+    assert (cur, nxt.id) == (None, "b")
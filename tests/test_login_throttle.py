@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import main
+from login_throttle import LoginThrottle, LOGIN_FREE_ATTEMPTS
+from persistence import SQLStateStore
+
+
+def test_failures_do_not_write_file_in_handler_path(tmp_path, monkeypatch):
+    path = tmp_path / "throttle.json"
+    throttle = LoginThrottle(path=str(path))
+    monkeypatch.setattr(throttle, "save", lambda: (_ for _ in ()).throw(AssertionError("запись в обработчике")))
+    for _ in range(5):
+        throttle.failure(1, "teacher1", now=1000.0)
+    throttle.success(2, "teacher2")
+    assert not path.exists()
+
+
+def test_save_job_writes_only_dirty_counters(tmp_path, monkeypatch):
+    path = tmp_path / "throttle.json"
+    throttle = LoginThrottle(path=str(path))
+    monkeypatch.setattr(main, "login_throttle", throttle)
+    throttle.failure(1, "teacher1")
+    throttle.failure(1, "teacher1")
+
+    asyncio.run(main.save_login_throttle_job(None))
+    assert LoginThrottle(path=str(path))._data == throttle._data
+
+    path.unlink()
+    asyncio.run(main.save_login_throttle_job(None))  # ничего не менялось — файл не пишется
+    assert not path.exists()
+
+
+def test_workers_share_login_counters(tmp_path, monkeypatch):
+    # два воркера за router.py: попытки на один логин идут из разных чатов, то есть к разным воркерам
+    store = SQLStateStore(f"sqlite:///{tmp_path / 'state.db'}")
+    first, second = LoginThrottle(store=store), LoginThrottle(store=store)
+
+    monkeypatch.setattr(main, "login_throttle", first)
+    for chat in range(LOGIN_FREE_ATTEMPTS):
+        asyncio.run(main.record_login(chat, "Teacher1", ok=False))
+
+    monkeypatch.setattr(main, "login_throttle", second)
+    asyncio.run(main.pull_login_throttle(99, "teacher1"))
+    assert second.retry_after(99, "teacher1") > 0
+
+    asyncio.run(main.record_login(99, "teacher1", ok=True))
+    first.pull(1, "teacher1")
+    assert first.retry_after(1, "teacher1") == 0
+
+
+def test_sharded_worker_requires_sequential_updates(monkeypatch):
+    monkeypatch.setattr(main, "SHARDED", True)
+    monkeypatch.setattr(main, "CONCURRENT_UPDATES", 4)
+    with pytest.raises(SystemExit, match="CONCURRENT_UPDATES=1"):
+        main.build_app(token="1:test")
@@ -0,0 +1,49 @@
+import re
+
+from main import pack_messages, _tg_len
+
+TAG = re.compile(r"</?b>")
+
+
+def _balanced(message):
+    depth = 0
+    for tag in TAG.findall(message):
+        depth += -1 if tag.startswith("</") else 1
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def _text(messages):
+    return "".join(TAG.sub("", m).replace("\n", "") for m in messages)
+
+
+def test_days_are_packed_into_few_messages():
+    blocks = [f"<b>День {i}</b>\n" + "урок\n" * 50 for i in range(5)]
+    messages = pack_messages(blocks, limit=1000)
+    assert len(messages) < len(blocks)
+    assert all(_tg_len(m) <= 1000 for m in messages)
+
+
+def test_long_block_is_split_on_lines_by_utf16_length():
+    # эмодзи — 2 единицы UTF-16: по числу символов блок укладывается, по UTF-16 — нет
+    line = "🏫<b>Кабинет:</b> 101"
+    block = "\n".join([line] * 40)
+    limit = len(block) + 10
+    assert _tg_len(block) > limit
+    messages = pack_messages([block], limit=limit)
+    assert len(messages) == 2
+    assert all(_tg_len(m) <= limit and _balanced(m) for m in messages)
+    assert _text(messages) == _text([block])
+
+
+def test_single_huge_line_keeps_tags_and_entities_whole():
+    line = "<b>" + "Физика &amp; химия 🧪 " * 40 + "</b> | каб. &lt;1&gt;"
+    messages = pack_messages([line], limit=100)
+    assert len(messages) > 1
+    for m in messages:
+        assert _tg_len(m) <= 100
+        assert _balanced(m)
+        # ни одна сущность не разорвана
+        assert not re.search(r"&[#\w]*$", m) and not re.match(r"^[#\w]*;", m)
+    assert _text(messages) == _text([line])
@@ -0,0 +1,61 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+import main
+import passwords
+from fakes import FakeRequest, message_update, seed_school
+from init_db import SessionLocal, User
+from login_throttle import LoginThrottle
+
+PASSWORD = "secret-password"
+
+
+def _stored_hash(login):
+    s = SessionLocal()
+    try:
+        return s.query(User.password_hash).filter_by(login=login).scalar()
+    finally:
+        s.close()
+
+
+def _login(telegram_id, login, password):
+    request = FakeRequest()
+    app = ApplicationBuilder().token("1:test").request(request).get_updates_request(FakeRequest()).build()
+    main.add_handlers(app)
+
+    async def run():
+        async with app:
+            for text in ("/login", login, password):
+                await app.process_update(Update.de_json(message_update(telegram_id, text), app.bot))
+
+    asyncio.run(run())
+    return request.calls[-1][1]["text"]
+
+
+def _setup(monkeypatch):
+    # политика: bcrypt со стоимостью 6; в базе — хеш со стоимостью 4 (как до повышения PASSWORD_ROUNDS)
+    monkeypatch.setattr(passwords, "pwd_context", passwords.make_context("bcrypt", 6))
+    monkeypatch.setattr(main, "login_throttle", LoginThrottle())
+    old_hash = passwords.make_context("bcrypt", 4).hash(PASSWORD)
+    seed_school(1, 1, password_hash=old_hash)
+    return old_hash
+
+
+def test_login_replaces_weak_hash(db, monkeypatch):
+    old_hash = _setup(monkeypatch)
+
+    assert _login(555, "teacher0", PASSWORD).startswith("Успешно!")
+
+    new_hash = _stored_hash("teacher0")
+    assert new_hash != old_hash
+    assert new_hash.startswith("$2b$06$")
+    assert passwords.verify_and_update(PASSWORD, new_hash) == (True, None)
+
+
+def test_failed_login_keeps_hash(db, monkeypatch):
+    old_hash = _setup(monkeypatch)
+
+    assert _login(555, "teacher0", "wrong-password") == "Неверный пароль."
+    assert _stored_hash("teacher0") == old_hash
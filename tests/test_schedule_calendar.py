@@ -0,0 +1,130 @@
+import datetime as dt
+import functools
+
+import pytest
+
+import schedule_index
+from init_db import SessionLocal, Schedule, DEFAULT_TENANT, to_minutes
+from schedule_calendar import add_holiday, set_lesson_change, week_parity
+from schedule_index import reload_schedule_calendar, reload_schedule_index
+
+TODAY = dt.date.today()
+MONDAY = TODAY + dt.timedelta(days=7 - TODAY.weekday())  # ближайший понедельник после сегодня
+
+
+def _seed():
+    s = SessionLocal()
+    s.add_all([
+        Schedule(time_start=to_minutes("08:30"), time_end=to_minutes("09:15"), cabinet="101",
+                 teacher="Иванов", class_name="5А", weekday="ПН", subject="Математика"),
+        Schedule(time_start=to_minutes("09:25"), time_end=to_minutes("10:10"), cabinet="102",
+                 teacher="Петров", class_name="5А", weekday="ПН", subject="Физика"),
+        Schedule(time_start=to_minutes("10:30"), time_end=to_minutes("11:15"), cabinet="103",
+                 teacher="Сидоров", class_name="5А", weekday="ПН", subject="Химия", week_parity="odd"),
+    ])
+    s.commit()
+    s.close()
+    return reload_schedule_index(DEFAULT_TENANT)
+
+
+def _lessons(index, role, owner, date_obj):
+    return [(r.time_start, r.subject, r.teacher, r.cabinet) for r in index.for_date(role, owner, date_obj)]
+
+
+def _odd_monday():
+    return MONDAY if week_parity(MONDAY) == "odd" else MONDAY + dt.timedelta(days=7)
+
+
+def test_substitution_moves_lesson_between_teachers(db):
+    _seed()
+    day = _odd_monday()
+
+    found = set_lesson_change(DEFAULT_TENANT, day, "5А", to_minutes("08:30"), ("Информатика", "Петров", None))
+    index = reload_schedule_calendar(DEFAULT_TENANT)
+
+    assert found == 1
+    # пустой кабинет в замене берётся из недельного урока
+    assert _lessons(index, "student", "5А", day) == [
+        (510, "Информатика", "Петров", "101"), (565, "Физика", "Петров", "102"), (630, "Химия", "Сидоров", "103"),
+    ]
+    assert [r.time_start for r in index.for_date("teacher", "Петров", day)] == [510, 565]
+    assert index.for_date("teacher", "Иванов", day) == ()
+    # замена только на эту дату
+    next_week = day + dt.timedelta(days=7)
+    assert _lessons(index, "teacher", "Иванов", next_week) == [(510, "Математика", "Иванов", "101")]
+    assert [r.time_start for r in index.for_date("teacher", "Петров", next_week)] == [565]
+
+
+def test_cancel_and_reset(db):
+    _seed()
+    day = _odd_monday()
+
+    assert set_lesson_change(DEFAULT_TENANT, day, "5А", to_minutes("09:25"), cancel=True) == 1
+    index = reload_schedule_calendar(DEFAULT_TENANT)
+    assert [r.time_start for r in index.for_date("student", "5А", day)] == [510, 630]
+    assert index.for_date("teacher", "Петров", day) == ()
+
+    set_lesson_change(DEFAULT_TENANT, day, "5А", to_minutes("09:25"))
+    index = reload_schedule_calendar(DEFAULT_TENANT)
+    assert [r.time_start for r in index.for_date("student", "5А", day)] == [510, 565, 630]
+    assert [r.time_start for r in index.for_date("teacher", "Петров", day)] == [565]
+
+
+def test_extra_lesson_in_empty_slot(db):
+    _seed()
+
+    found = set_lesson_change(DEFAULT_TENANT, MONDAY, "5А", to_minutes("12:00"), ("ОБЖ", "Смирнов", "200"))
+    index = reload_schedule_calendar(DEFAULT_TENANT)
+
+    assert found == 0
+    assert _lessons(index, "teacher", "Смирнов", MONDAY) == [(720, "ОБЖ", "Смирнов", "200")]
+    assert index.for_date("student", "5А", MONDAY)[-1].subject == "ОБЖ"
+
+
+def test_multi_day_holiday(db):
+    _seed()
+    add_holiday(DEFAULT_TENANT, MONDAY - dt.timedelta(days=3), MONDAY + dt.timedelta(days=1), "Каникулы")
+    index = reload_schedule_calendar(DEFAULT_TENANT)
+
+    for offset in (-3, -2, -1, 0, 1):
+        day = MONDAY + dt.timedelta(days=offset)
+        assert index.holiday(day) == "Каникулы"
+        assert index.for_date("student", "5А", day) == ()
+    assert index.holiday(MONDAY + dt.timedelta(days=2)) is None
+    assert index.for_date("student", "5А", MONDAY + dt.timedelta(days=7)) != ()
+
+
+@pytest.mark.parametrize("day, parity", [
+    (dt.date(2026, 1, 1), "odd"),     # неделя ISO 1
+    (dt.date(2026, 1, 4), "odd"),     # воскресенье той же недели
+    (dt.date(2026, 1, 5), "even"),    # неделя ISO 2
+    (dt.date(2026, 12, 28), "odd"),   # неделя ISO 53
+    (dt.date(2027, 1, 4), "odd"),     # неделя ISO 1: после 53-й снова нечётная
+])
+def test_week_parity_without_anchor(day, parity):
+    assert week_parity(day, anchor=None) == parity
+
+
+@pytest.mark.parametrize("day, parity", [
+    (dt.date(2026, 9, 1), "odd"),     # сама опорная дата (вторник)
+    (dt.date(2026, 8, 31), "odd"),    # понедельник той же недели
+    (dt.date(2026, 9, 6), "odd"),     # воскресенье той же недели
+    (dt.date(2026, 9, 7), "even"),
+    (dt.date(2026, 9, 14), "odd"),
+    (dt.date(2026, 8, 30), "even"),   # неделя до опорной
+    (dt.date(2027, 1, 4), "odd"),     # через границу года: чередование не сбивается
+])
+def test_week_parity_with_anchor(day, parity):
+    assert week_parity(day, anchor="2026-09-01") == parity
+    assert week_parity(day, anchor=dt.date(2026, 9, 1)) == parity
+
+
+@pytest.mark.parametrize("anchor", [None, "2026-09-01"])
+def test_index_uses_week_parity(db, monkeypatch, anchor):
+    parity = functools.partial(week_parity, anchor=anchor)
+    monkeypatch.setattr(schedule_index, "week_parity", parity)
+    index = _seed()
+
+    for day in (MONDAY, MONDAY + dt.timedelta(days=7)):
+        subjects = [r.subject for r in index.for_date("student", "5А", day)]
+        assert ("Химия" in subjects) == (parity(day) == "odd")
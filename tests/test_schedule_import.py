@@ -0,0 +1,58 @@
+import pandas as pd
+
+from init_db import SessionLocal, Schedule
+from schedule_import import diff_schedule, normalize_schedule_frame, sync_schedule, to_stripped_str
+
+
+def _sheet(cabinets):
+    n = len(cabinets)
+    return pd.DataFrame({
+        "time_start": ["8:30"] * n,
+        "time_end": ["9:15"] * n,
+        "cabinet": cabinets,
+        "class_name": [f"{5 + i}А" for i in range(n)],
+        "weekday": ["ПН"] * n,
+        "subject": ["Математика"] * n,
+    })
+
+
+def _sync(sheet):
+    s = SessionLocal()
+    try:
+        result = sync_schedule(s, sheet)
+        s.commit()
+        return result
+    finally:
+        s.close()
+
+
+def test_to_stripped_str_drops_float_upcast():
+    assert to_stripped_str(101.0) == "101"
+    assert to_stripped_str(101) == "101"
+    assert to_stripped_str(" 2б ") == "2б"
+    assert to_stripped_str(1.5) == "1.5"
+    assert to_stripped_str(float("nan")) is None
+
+
+def test_diff_ignores_float_upcast_from_blank_cell():
+    with_blank = normalize_schedule_frame(_sheet([101, 102, 103, None]))
+    without_blank = normalize_schedule_frame(_sheet([101, 102, 103, 104]))
+    assert with_blank["cabinet"].tolist() == ["101", "102", "103", None]
+
+    current = without_blank.assign(id=[f"id{i}" for i in range(4)])
+    inserts, updates, deletes, unchanged = diff_schedule(current, with_blank)
+    assert (len(inserts), len(deletes), unchanged) == (0, 0, 3)
+    assert [u["id"] for u in updates] == ["id3"]
+
+
+def test_reupload_with_one_blank_changes_one_row(db):
+    cabinets = list(range(101, 121))
+    assert _sync(_sheet(cabinets)).inserted == 20
+
+    result = _sync(_sheet(cabinets[:-1] + [None]))
+    assert (result.inserted, result.updated, result.deleted, result.unchanged) == (0, 1, 0, 19)
+
+    result = _sync(_sheet(cabinets))
+    assert (result.updated, result.unchanged) == (1, 19)
+    stored = {c for (c,) in SessionLocal().query(Schedule.cabinet)}
+    assert stored == {str(c) for c in cabinets}
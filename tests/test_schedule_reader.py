@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from schedule_conflicts import find_conflicts
+from schedule_import import normalize_schedule_frame
+from schedule_reader import read_schedule_chunks, LEGACY_EXCEL_MESSAGE
+
+HEADER = ["time_start", "time_end", "cabinet", "class_name", "weekday", "subject"]
+
+
+def _write_xlsx(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _lesson(i, cabinet):
+    return [f"{8 + i // 12:02d}:{(i % 12) * 5:02d}", None, cabinet, f"{5 + i % 7}А", "ПН", "Математика"]
+
+
+def test_chunks_keep_cell_types_across_boundary(tmp_path):
+    # 60 строк кабинета 101 и одна пустая ячейка во втором куске (как 5501 из 6000)
+    rows = [_lesson(i, None if i == 55 else 101) for i in range(60)]
+    path = tmp_path / "schedule.xlsx"
+    _write_xlsx(path, rows)
+
+    chunks = list(read_schedule_chunks(str(path), chunk_rows=50))
+    assert [len(c) for c in chunks] == [50, 10]
+    raw = {type(v).__name__ for c in chunks for v in c["cabinet"]}
+    assert raw == {"int", "NoneType"}
+
+    streamed = pd.concat([normalize_schedule_frame(c) for c in chunks], ignore_index=True)
+    whole = pd.read_excel(path)
+    assert whole["cabinet"].dtype == "float64"
+    assert streamed["cabinet"].value_counts().to_dict() == {"101": 59}
+    assert streamed["cabinet"].tolist() == normalize_schedule_frame(whole)["cabinet"].tolist()
+
+
+def test_double_booking_across_chunks_is_found(tmp_path):
+    rows = [_lesson(i, 200 + i) for i in range(60)]
+    rows[10] = ["09:00", "09:45", 101, "5А", "ВТ", "Физика"]
+    rows[52] = ["09:00", "09:45", 101, "6Б", "ВТ", "Химия"]
+    rows[55][2] = None  # второй кусок с пустой ячейкой
+    path = tmp_path / "schedule.xlsx"
+    _write_xlsx(path, rows)
+
+    chunks = read_schedule_chunks(str(path), chunk_rows=50)
+    frame = pd.concat([normalize_schedule_frame(c) for c in chunks], ignore_index=True)
+    cabinets = [c for c in find_conflicts(frame) if c.resource == "cabinet"]
+    assert [(c.value, c.weekday) for c in cabinets] == [("101", "ВТ")]
+
+
+def test_legacy_xls_asks_to_resave(tmp_path):
+    path = tmp_path / "schedule.xls"
+    path.write_bytes(b"\xd0\xcf\x11\xe0")
+    with pytest.raises(ValueError, match="пересохраните"):
+        read_schedule_chunks(str(path))
+    assert ".xlsx" in LEGACY_EXCEL_MESSAGE
@@ -0,0 +1,67 @@
+import datetime as dt
+
+import pandas as pd
+
+import main
+from fakes import school_sheet, seed_school
+from init_db import SessionLocal, Schedule, DEFAULT_TENANT
+from render_cache import render_caches
+from schedule_index import get_schedule_index
+
+OTHER = "school2"
+WEEK = [dt.date(2026, 10, 19) + dt.timedelta(days=i) for i in range(5)]
+
+
+def _rows(tenant):
+    s = SessionLocal()
+    try:
+        return sorted(tuple(r) for r in s.query(
+            Schedule.id, Schedule.time_start, Schedule.time_end, Schedule.cabinet, Schedule.teacher,
+            Schedule.class_name, Schedule.weekday, Schedule.subject, Schedule.week_parity,
+        ).filter(Schedule.tenant_id == tenant).all())
+    finally:
+        s.close()
+
+
+def _render_week(tenant):
+    index = get_schedule_index(tenant)
+    for day in WEEK:
+        for class_name in index.classes():
+            main.render_schedule_day("student", class_name, day, index)
+        for teacher in index.teachers():
+            main.render_schedule_day("teacher", teacher, day, index)
+
+
+def test_import_for_one_school_leaves_other_untouched(db, tmp_path):
+    seed_school(3, 5)
+    seed_school(3, 5, tenant=OTHER, id_offset=1000)
+    render_caches.clear()
+    main.load_schedule()
+    _render_week(DEFAULT_TENANT)
+    _render_week(OTHER)
+
+    other_rows = _rows(OTHER)
+    other_index = get_schedule_index(OTHER)
+    other_cache = render_caches.for_tenant(OTHER)
+    other_texts = dict(other_cache._data)
+    own_rows = _rows(DEFAULT_TENANT)
+    own_generation = get_schedule_index(DEFAULT_TENANT).generation
+
+    # тот же состав школы, но все кабинеты другие — импорт меняет каждую строку
+    sheet = pd.DataFrame(school_sheet(3, 5))
+    sheet["cabinet"] = "Актовый зал"
+    path = tmp_path / "schedule.csv"
+    sheet.to_csv(path, index=False)
+    result = main.import_schedule_file(str(path), tenant=DEFAULT_TENANT)
+
+    assert result.updated == len(own_rows)
+    assert _rows(DEFAULT_TENANT) != own_rows
+    assert get_schedule_index(DEFAULT_TENANT).generation > own_generation
+
+    assert _rows(OTHER) == other_rows
+    assert get_schedule_index(OTHER) is other_index
+    assert get_schedule_index(OTHER).generation == other_index.generation
+    assert other_texts and dict(other_cache._data) == other_texts
+    hits = other_cache.hits
+    _render_week(OTHER)
+    assert other_cache.hits - hits == len(other_texts)  # тексты второй школы по-прежнему из кэша
@@ -0,0 +1,68 @@
+import json
+import socket
+import asyncio
+
+import aiohttp
+from telegram.ext import ApplicationBuilder
+
+import main
+from fakes import FakeRequest, message_update, seed_school
+from webhook import serve_webhook, SECRET_HEADER
+
+SECRET = "test-secret"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _exchange(app, request, posts):
+    """Поднимает webhook-сервер, отправляет posts [(тело, заголовки)] и ждёт ответов бота."""
+    port = _free_port()
+    stop = asyncio.Event()
+    server = asyncio.create_task(serve_webhook(app, listen="127.0.0.1", port=port, path="/telegram",
+                                               secret=SECRET, public_url=None, stop_event=stop))
+    url = f"http://127.0.0.1:{port}/telegram"
+    statuses = []
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/healthz"):
+                    break
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.05)
+        for body, headers in posts:
+            async with session.post(url, data=body, headers=headers) as resp:
+                statuses.append(resp.status)
+        for _ in range(100):
+            if app.update_queue.empty() and any(name == "sendMessage" for name, _ in request.calls):
+                break
+            await asyncio.sleep(0.05)
+    stop.set()
+    await server
+    return statuses
+
+
+def test_webhook_delivers_updates_and_checks_secret(db):
+    _, students = seed_school(2, 3)
+    request = FakeRequest()
+    app = ApplicationBuilder().token("1:test").request(request).get_updates_request(FakeRequest()).build()
+    main.add_handlers(app)
+    main.load_schedule()
+
+    good = json.dumps(message_update(students[0], "ПН"))
+    statuses = asyncio.run(_exchange(app, request, [
+        (good, {SECRET_HEADER: "wrong"}),
+        ("not json", {SECRET_HEADER: SECRET}),
+        ("[]", {SECRET_HEADER: SECRET}),
+        ("1", {SECRET_HEADER: SECRET}),
+        (good, {SECRET_HEADER: SECRET, "Content-Type": "application/json"}),
+    ]))
+
+    assert statuses == [403, 400, 400, 400, 200]
+    sent = [params for name, params in request.calls if name == "sendMessage"]
+    assert len(sent) == 1
+    assert sent[0]["chat_id"] == students[0]
+    assert "Понедельник" in sent[0]["text"]
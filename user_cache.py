@@ -0,0 +1,84 @@
+# user_cache.py
+# Кэш telegram_id -> пользователь, чтобы не ходить в user_sessions/users на каждое нажатие кнопки.
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Короткий TTL ограничивает устаревание, когда несколько процессов бота работают
+# с одной БД: вход/выход в другом процессе этот кэш не инвалидирует.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+# Неизменяемый снимок пользователя — всё, что нужно обработчикам
+UserSnapshot = namedtuple(
+    "UserSnapshot", ["id", "tenant_id", "login", "role", "name_tuter", "is_junior", "is_senior"],
+)
+
+
+def snapshot_user(user):
+    if user is None:
+        return None
+    return UserSnapshot(user.id, user.tenant_id, user.login, user.role, user.name_tuter,
+                        bool(user.is_junior), bool(user.is_senior))
+
+
+class UserCache:
+    """LRU + TTL. Хранит и отрицательные ответы (None): неавторизованный
+       пользователь, жмущий кнопки, тоже не должен бить в БД."""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # растёт при каждой инвалидации; put() с устаревшим поколением игнорируется,
+        # чтобы ответ БД, полученный до входа/выхода, не лёг в кэш после него
+        self.generation = 0
+
+    def get(self, telegram_id):
+        """Возвращает (найдено, снимок)."""
+        key = str(telegram_id)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, telegram_id, snapshot, generation=None):
+        key = str(telegram_id)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, snapshot)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(str(telegram_id), None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
@@ -0,0 +1,84 @@
+# webhook.py
+# Приём обновлений через webhook: встроенный aiohttp-сервер кладёт Update в очередь
+# Application, дальше они обрабатываются так же, как при run_polling().
+import os
+import signal
+import asyncio
+from aiohttp import web
+from dotenv import load_dotenv
+from telegram import Update
+
+load_dotenv()
+
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # X-Telegram-Bot-Api-Secret-Token
+# Публичный адрес (https://bot.example.com). Если задан — при старте вызывается setWebhook,
+# иначе вебхук считается уже настроенным (или сервер слушает записанные запросы локально).
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """aiohttp-приложение: POST {path} с JSON Update -> application.update_queue."""
+
+    async def handle_update(request):
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="bad json")
+        # [] или 1 — корректный JSON, но не Update: 400, иначе Telegram будет повторять 500 бесконечно
+        if not isinstance(data, dict):
+            return web.Response(status=400, text="bad update")
+        update = Update.de_json(data, application.bot)
+        if update is None:
+            return web.Response(status=400, text="bad update")
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def healthz(request):
+        return web.json_response({"ok": True, "queued": application.update_queue.qsize()})
+
+    webapp = web.Application()
+    webapp.router.add_post(path, handle_update)
+    webapp.router.add_get("/healthz", healthz)
+    return webapp
+
+
+async def serve_webhook(application, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                        path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, public_url=WEBHOOK_URL,
+                        stop_event=None):
+    """Запускает Application и HTTP-сервер; работает до stop_event (или SIGINT/SIGTERM)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows / не главный поток
+
+    async with application:
+        if public_url:
+            await application.bot.set_webhook(
+                url=public_url.rstrip("/") + path,
+                secret_token=secret,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        await application.start()
+        runner = web.AppRunner(build_webhook_app(application, path, secret))
+        await runner.setup()
+        site = web.TCPSite(runner, listen, port)
+        await site.start()
+        print(f"Webhook слушает http://{listen}:{port}{path}")
+        try:
+            await stop_event.wait()
+        finally:
+            await runner.cleanup()
+            await application.stop()
+    # run_polling вызывает post_shutdown сам, здесь — вручную после shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)